@@ -0,0 +1,273 @@
+"""Admission control for inference endpoints: per-client rate limits, bounded queues and request deadlines."""
+from __future__ import annotations
+import os, math, time, asyncio, threading, contextvars
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, Tuple
+
+from . import metrics
+
+ADMISSION_ENABLED = str(os.getenv("ADMISSION_ENABLED", "1")).lower() in {"1", "true", "yes"}
+# "path=concurrency:queue,..." overrides the defaults below
+ADMIT_LIMITS = os.getenv("ADMIT_LIMITS", "")
+# longest a request waits in an admission queue, deadline or not
+ADMIT_QUEUE_TIMEOUT_S = float(os.getenv("ADMIT_QUEUE_TIMEOUT_S", "10"))
+
+# per-client token bucket; 0 turns rate limiting off
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "0")) or max(1.0, 2 * RATE_LIMIT_RPS)
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+# X-Forwarded-For is only trusted behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = str(os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0")).lower() in {"1", "true", "yes"}
+
+# deadline when the caller doesn't send X-Deadline-Ms; 0 means none
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "30"))
+DEADLINE_HEADER = "x-deadline-ms"
+
+# most items one /batch_predict call may carry (413 above)
+BATCH_PREDICT_MAX_ITEMS = int(os.getenv("BATCH_PREDICT_MAX_ITEMS", "64"))
+
+_DEFAULT_LIMITS: Dict[str, Tuple[int, int]] = {
+    "/predict": (32, 128),
+    "/predict_url": (16, 64),
+    "/predict_url/stream": (16, 64),
+    "/batch_predict": (4, 8),
+    "/similar": (16, 64),
+}
+
+class Rejected(Exception):
+    """turned away before doing any work; maps to 429 + Retry-After"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+class DeadlineExceeded(Exception):
+    """the request's deadline passed before `stage` could start or finish; maps to 504"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded before {stage}")
+        self.stage = stage
+        metrics.inc("deadline_exceeded_total", stage=stage)
+
+# -------- deadlines ----------
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+def parse_deadline(header: Optional[str]) -> Optional[float]:
+    """monotonic deadline from X-Deadline-Ms (or the default); None when there isn't one"""
+    budget = None
+    if header:
+        try:
+            budget = max(0.0, float(header)) / 1000.0
+        except ValueError:
+            budget = None
+    if budget is None and REQUEST_DEADLINE_S > 0:
+        budget = REQUEST_DEADLINE_S
+    return None if budget is None else time.monotonic() + budget
+
+def set_deadline(deadline: Optional[float]) -> contextvars.Token:
+    return _deadline.set(deadline)
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+def remaining(deadline: Optional[float] = None) -> Optional[float]:
+    d = current_deadline() if deadline is None else deadline
+    return None if d is None else d - time.monotonic()
+
+def expired(deadline: Optional[float] = None) -> bool:
+    left = remaining(deadline)
+    return left is not None and left <= 0
+
+def check(stage: str, deadline: Optional[float] = None) -> None:
+    """raise DeadlineExceeded if the deadline has already passed"""
+    if expired(deadline):
+        raise DeadlineExceeded(stage)
+
+def clamp(timeout: float, stage: str) -> float:
+    """timeout cut down to what's left of the deadline; raises if nothing is left"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded(stage)
+    return min(timeout, left)
+
+# -------- per-client rate limit ----------
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def take(self, n: float = 1.0) -> float:
+        """0 if n tokens were taken, else seconds until they would be available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= n:
+            self.tokens -= n
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+class RateLimiter:
+    """one token bucket per client id, least recently seen clients dropped past max_clients"""
+
+    def __init__(self, rate: float = RATE_LIMIT_RPS, burst: float = RATE_LIMIT_BURST,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max(1, int(max_clients))
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, client: str, n: float = 1.0) -> None:
+        """charge n tokens to client; raises Rejected when it can't pay"""
+        if not self.enabled:
+            return
+        with self._lock:
+            b = self._buckets.get(client)
+            if b is None:
+                b = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            wait = b.take(min(n, self.burst))
+            if wait:
+                self.limited += 1
+        if wait:
+            raise Rejected("rate_limited", wait)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "rps": self.rate, "burst": self.burst,
+                "clients": len(self._buckets), "limited": self.limited}
+
+def client_id(headers, peer: Optional[str]) -> str:
+    """API key if the caller sent one, else the (optionally forwarded) client address"""
+    key = headers.get("x-api-key") or headers.get("x-client-id")
+    if key:
+        return "key:" + key
+    if RATE_LIMIT_TRUST_FORWARDED and headers.get("x-forwarded-for"):
+        return "ip:" + headers["x-forwarded-for"].split(",")[0].strip()
+    return "ip:" + (peer or "unknown")
+
+# -------- per-endpoint admission queue ----------
+class EndpointGate:
+    """
+    At most `concurrency` requests inside the handler and `queue` more waiting
+    in FIFO order; a released slot is handed straight to the oldest waiter.
+    Used from the event loop only.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue: int):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.queue = max(0, int(queue))
+        self.inflight = 0
+        self._waiters: deque = deque()
+        self._service_s = 0.0    # EWMA of time spent holding a slot
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def retry_after(self) -> float:
+        per_slot = self._service_s or 1.0
+        return per_slot * (len(self._waiters) + 1) / self.concurrency
+
+    async def acquire(self, timeout: Optional[float]) -> float:
+        """wait for a slot; returns the acquire time for release()"""
+        if self.inflight < self.concurrency and not self._waiters:
+            self.inflight += 1
+            self.admitted += 1
+            return time.monotonic()
+        if len(self._waiters) >= self.queue:
+            self.rejected += 1
+            raise Rejected("queue_full", self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            self.expired += 1
+            raise DeadlineExceeded("admission")
+        except BaseException:
+            # a slot handed over just as we gave up goes to the next waiter
+            if fut.done() and not fut.cancelled():
+                self.release(time.monotonic())
+            raise
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+            metrics.observe("stage_seconds", time.monotonic() - t0, stage="admission_queue")
+        self.admitted += 1
+        return time.monotonic()
+
+    def release(self, acquired_at: float) -> None:
+        held = time.monotonic() - acquired_at
+        self._service_s = held if not self._service_s else 0.8 * self._service_s + 0.2 * held
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)   # slot changes hands; inflight stays the same
+                return
+        self.inflight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency, "queue": self.queue,
+            "inflight": self.inflight, "waiting": len(self._waiters),
+            "admitted": self.admitted, "rejected": self.rejected, "expired_in_queue": self.expired,
+            "mean_service_ms": round(self._service_s * 1000.0, 1),
+        }
+
+def _limits() -> Dict[str, Tuple[int, int]]:
+    limits = dict(_DEFAULT_LIMITS)
+    for part in ADMIT_LIMITS.split(","):
+        if "=" not in part:
+            continue
+        path, spec = part.split("=", 1)
+        conc, _, q = spec.partition(":")
+        limits[path.strip()] = (int(conc), int(q or conc))
+    return limits
+
+gates: Dict[str, EndpointGate] = {p: EndpointGate(p, c, q) for p, (c, q) in _limits().items()}
+limiter = RateLimiter()
+
+def gate_for(path: str) -> Optional[EndpointGate]:
+    return gates.get(path.rstrip("/") or "/") if ADMISSION_ENABLED else None
+
+async def admit(gate: EndpointGate, client: str) -> float:
+    """rate limit, then queue for a slot; returns the acquire time to pass to gate.release()"""
+    try:
+        limiter.take(client)
+        left = remaining()
+        wait = ADMIT_QUEUE_TIMEOUT_S if left is None else max(0.0, min(ADMIT_QUEUE_TIMEOUT_S, left))
+        acquired = await gate.acquire(wait)
+    except Rejected as e:
+        metrics.inc("admission_total", endpoint=gate.name, result=e.reason)
+        raise
+    except DeadlineExceeded:
+        metrics.inc("admission_total", endpoint=gate.name, result="expired")
+        raise
+    metrics.inc("admission_total", endpoint=gate.name, result="admitted")
+    return acquired
+
+def stats() -> Dict[str, Any]:
+    return {
+        "enabled": ADMISSION_ENABLED,
+        "default_deadline_s": REQUEST_DEADLINE_S or None,
+        "batch_predict_max_items": BATCH_PREDICT_MAX_ITEMS,
+        "rate_limit": limiter.stats(),
+        "endpoints": {p: g.stats() for p, g in gates.items()},
+    }
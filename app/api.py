@@ -1,10 +1,12 @@
 from fastapi import FastAPI, Body, HTTPException
+from fastapi import Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Query
-from .news_fetch import extract_article
-from typing import List
+from .news_fetch import extract_article, aclose_client, _domain
+from typing import List, Optional
 from datetime import datetime
-import os, json, logging
+import os, json, time, asyncio, logging
 from dotenv import load_dotenv
 load_dotenv()  
 
@@ -12,8 +14,14 @@ from .schemas import (
     PredictRequest, PredictResponse,
     EnvResponse, BiasOut, ExplainOut, RationaleSpan
 )
-from .summarizer import summarize
-from .bias_model import classify
+from .summarizer import asummarize, llm_enabled, aclose_client as aclose_summarizer, USE_LLM as SUM_LLM, SUMMARY_MODEL as SUM_MODEL
+from . import batching, cache, executors, bias_model, metrics, cascade, dedup, admission, store, rollups, embeddings
+from .executors import run_inference
+from .lexicon import find_spans
+from .bias_model import (
+    classify_batch, classify_long, MAX_BATCH_TOKENS, LONG_MODE,
+    LONG_AGGREGATE, LONG_MAX_WINDOWS, LONG_STRIDE, TOKENIZER_ID,
+)
 
 log = logging.getLogger("uvicorn.error")
 
@@ -26,11 +34,79 @@ app.add_middleware(
     allow_methods=["*"], allow_headers=["*"],
 )
 
+def _overloaded(e: admission.Rejected) -> JSONResponse:
+    return JSONResponse(status_code=429, headers={"Retry-After": str(e.retry_after)},
+                        content={"detail": f"overloaded ({e.reason}), retry in {e.retry_after}s"})
+
+@app.middleware("http")
+async def _admission(request: Request, call_next):
+    """ rate limit + bounded per-endpoint queue + request deadline for the inference endpoints """
+    gate = admission.gate_for(request.url.path) if request.method == "POST" else None
+    if gate is None:
+        return await call_next(request)
+    token = admission.set_deadline(admission.parse_deadline(request.headers.get(admission.DEADLINE_HEADER)))
+    try:
+        client = admission.client_id(request.headers, request.client.host if request.client else None)
+        try:
+            acquired = await admission.admit(gate, client)
+        except admission.Rejected as e:
+            return _overloaded(e)
+        except admission.DeadlineExceeded as e:
+            return JSONResponse(status_code=504, content={"detail": str(e), "stage": e.stage})
+        try:
+            response = await call_next(request)
+        except BaseException:
+            gate.release(acquired)
+            raise
+        if gate.name == "/predict_url/stream":
+            # the work happens while the body streams; hold the slot until it's out
+            body = response.body_iterator
+
+            async def _release_after():
+                try:
+                    async for chunk in body:
+                        yield chunk
+                finally:
+                    gate.release(acquired)
+            response.body_iterator = _release_after()
+        else:
+            gate.release(acquired)
+        return response
+    finally:
+        admission.reset_deadline(token)
+
+@app.middleware("http")
+async def _instrument(request: Request, call_next):
+    """ request latency/status metrics, plus an optional Server-Timing header """
+    token = metrics.start_request()
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - t0
+        timings = metrics.end_request(token)
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", None) or (request.url.path if admission.gate_for(request.url.path) else "unmatched")
+        metrics.observe("request_seconds", elapsed, endpoint=endpoint)
+        metrics.inc("requests_total", endpoint=endpoint, status=status)
+    if metrics.SERVER_TIMING:
+        header = metrics.server_timing_header(timings)
+        response.headers["Server-Timing"] = (header + ", " if header else "") + f"total;dur={elapsed * 1000.0:.1f}"
+    return response
+
 # -------- Model  ----------
 CKPT_DIR  = os.getenv("BIAS_MODEL_NAME", "Halfbendy/qbias_model")
 TEMP_PATH = os.path.join(CKPT_DIR, "temperature.json")
 EVAL_PATH = os.path.join(CKPT_DIR, "eval_summary.json")
 
+# BIAS_EAGER_LOAD=0 defers loading the model to the first request
+MODEL_EAGER_LOAD = str(os.getenv("BIAS_EAGER_LOAD", "1")).lower() in {"1", "true", "yes"}
+
+# predict_url only scores this many characters unless chunked mode is on
+PREDICT_URL_MAX_CHARS = int(os.getenv("PREDICT_URL_MAX_CHARS", "8000"))
+
 MODEL_INFO = {
     "model_name": os.path.basename(CKPT_DIR.rstrip("/")),
     "labels": ["Left","Center","Right"],
@@ -38,9 +114,9 @@ MODEL_INFO = {
 }
 
 try:
-    from .priors import get_prior_for_source  
+    from .priors import get_prior_for_source, stats as priors_stats
 except Exception:
-    get_prior_for_source = None
+    get_prior_for_source = priors_stats = None
 
 if os.path.exists(TEMP_PATH):
     try:
@@ -53,8 +129,94 @@ if os.path.exists(EVAL_PATH):
     except Exception as e:
         log.warning(f"eval_summary.json parse error: {e}")
 
+def _use_chunked(flag: Optional[bool]) -> bool:
+    return LONG_MODE == "chunked" if flag is None else bool(flag)
+
+# -------- Result cache ----------
+def _classify_settings(chunked: bool) -> dict:
+    """everything besides the text that changes a classification"""
+    # temperature as read from temperature.json at startup; building a key must never load the model
+    settings = {"model": CKPT_DIR, "tokenizer": TOKENIZER_ID,
+                "temperature": MODEL_INFO["temperature"], "chunked": chunked}
+    if chunked:
+        settings.update(aggregate=LONG_AGGREGATE, max_windows=LONG_MAX_WINDOWS, stride=LONG_STRIDE)
+    elif cascade.CASCADE_ENABLED:
+        settings.update(cascade=cascade.signature())
+    return settings
+
+def _classify_key(text: str, chunked: bool) -> str:
+    return cache.make_key(text, **_classify_settings(chunked))
+
+async def _cached_classify(text: str, chunked: bool):
+    """(key, near-dup signature, cached result or None): exact cache first, then the near-duplicate index"""
+    key = res = sig = None
+    if cache.CACHE_ENABLED:
+        key = _classify_key(text, chunked)
+        res = await cache.classify_cache.aget(key)
+    if res is None and dedup.DEDUP_ENABLED:
+        sig, res = dedup.classify_index.lookup(text, **_classify_settings(chunked))
+        if res is not None:
+            # reuse the label/probs; spans are offsets, so they're found again in this copy
+            with metrics.timed("spans"):
+                res = dict(res, rationale_spans=find_spans(text, 6))
+            if key:
+                await cache.classify_cache.aset(key, res)
+            sig = None
+    return key, sig, res
+
+async def _remember_classify(key, sig, chunked: bool, res: dict) -> None:
+    # the vector is only wanted by the store, and only on the first prediction of a text
+    kept = {k: v for k, v in res.items() if k != "embedding"}
+    if key:
+        await cache.classify_cache.aset(key, kept)
+    if sig is not None:
+        # near-duplicates reuse the label, not the vector: the copy shouldn't be indexed again
+        dedup.classify_index.add(sig, {k: v for k, v in kept.items() if k != "rationale_spans"},
+                                 **_classify_settings(chunked))
+
+async def _classify(full_text: str, chunked: bool):
+    key, sig, res = await _cached_classify(full_text, chunked)
+    if res is not None:
+        return res
+    if not chunked:
+        # the linear stage answers confident items; everything else escalates to BERT
+        res = cascade.gate([full_text])[0]
+    if res is None:
+        with metrics.timed("classify"):
+            res = await run_inference(classify_long, full_text) if chunked else await batching.aclassify(full_text)
+    await _remember_classify(key, sig, chunked, res)
+    return res
+
+async def _summary(text: str) -> str:
+    settings = {"llm": llm_enabled(), "model": SUM_MODEL}
+    key = hit = sig = None
+    if cache.CACHE_ENABLED:
+        key = cache.make_key(text, **settings)
+        hit = await cache.summary_cache.aget(key)
+    if hit is None and dedup.DEDUP_ENABLED:
+        sig, hit = dedup.summary_index.lookup(text, **settings)
+        if hit is not None and key:
+            await cache.summary_cache.aset(key, hit)
+    if hit is not None:
+        return hit
+    out = await asummarize(text)
+    if not out.get("fallback"):
+        if key:
+            await cache.summary_cache.aset(key, out.get("text", ""))
+        dedup.summary_index.add(sig, out.get("text", ""), **settings)
+    return out.get("text", "")
+
+def _store(endpoint: str, text: str, res: dict, chunked: bool, url: Optional[str] = None,
+           source: Optional[str] = None, title: Optional[str] = None) -> None:
+    """hand the prediction to the store's writer thread; returns immediately"""
+    store.record(endpoint=endpoint, text=text, res=res, model=CKPT_DIR, chunked=chunked,
+                 url=url, source=source or (_domain(url) if url else None), title=title)
+
 # -------------------- Endpoints --------------------
-from .summarizer import USE_LLM as SUM_LLM, SUMMARY_MODEL as SUM_MODEL
+
+@app.exception_handler(admission.DeadlineExceeded)
+async def _deadline_exceeded(request: Request, exc: admission.DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc), "stage": exc.stage})
 
 @app.get("/env_debug")
 def env_debug():
@@ -64,12 +226,21 @@ def env_debug():
         "torch": torch.__version__,
         "summary_llm": SUM_LLM,
         "summary_model": SUM_MODEL,
+        "executors": executors.stats(),
+        "cascade": cascade.stats(),
+        "priors": priors_stats() if priors_stats else None,
     }
     
 @app.get("/healthz")
 def healthz():
     return {"ok": True, "time": datetime.utcnow().isoformat() + "Z"}
 
+@app.get("/readyz")
+def readyz():
+    """ 200 once the model is loaded and warmed up; 503 until then """
+    st = bias_model.status()
+    return JSONResponse(status_code=200 if st["ready"] else 503, content=st)
+
 @app.get("/env", response_model=EnvResponse)
 def env():
     import torch
@@ -83,7 +254,201 @@ def env():
 @app.get("/model")
 def model_info():
     """ Minimal model card for demo slides """
-    return MODEL_INFO
+    return {**MODEL_INFO, "startup": bias_model.status()}
+
+@app.get("/batching")
+def batching_stats():
+    """ Micro-batcher queue depth and batch-size stats """
+    return batching.stats()
+
+@app.get("/admission")
+def admission_stats():
+    """ Per-endpoint admission queues, rate limiter and deadline settings """
+    return admission.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """ Prometheus exposition: per-stage latency histograms + p50/p95/p99, token counts, batch sizes, errors """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache")
+def cache_stats():
+    """ Result cache and near-duplicate index hit/miss/eviction counters """
+    return {**cache.stats(), "near_dup": dedup.stats()}
+
+@app.delete("/cache")
+def cache_clear():
+    cache.clear()
+    dedup.clear()
+    return {**cache.stats(), "near_dup": dedup.stats()}
+
+@app.get("/store")
+def store_stats():
+    """ Prediction store writer queue and row counts, plus the article vector index """
+    return {**store.stats(), "embeddings": embeddings.stats(CKPT_DIR) if store.STORE_ENABLED else {"enabled": False}}
+
+@app.get("/predictions")
+def predictions(url: Optional[str] = Query(None), hash: Optional[str] = Query(None, description="content_hash of a stored prediction"),
+                source: Optional[str] = Query(None, description="domain, e.g. cnn.com"),
+                label: Optional[str] = Query(None), since: Optional[str] = Query(None, description="epoch seconds or ISO-8601"),
+                until: Optional[str] = Query(None), limit: int = Query(50, ge=1, le=store.STORE_MAX_PAGE),
+                cursor: Optional[str] = Query(None, description="next_cursor from the previous page")):
+    """ Stored predictions, newest first, filtered on indexed columns """
+    if not store.STORE_ENABLED:
+        raise HTTPException(status_code=404, detail="prediction store is disabled (STORE_ENABLED=0)")
+    try:
+        return store.store.query(url=url, content_hash=hash, source=source, label=label,
+                                 since=store.parse_time(since), until=store.parse_time(until),
+                                 limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/predictions/lookup")
+def predictions_lookup(payload: PredictRequest = Body(...), limit: int = Query(10, ge=1, le=store.STORE_MAX_PAGE)):
+    """ Earlier predictions for this exact title + text (by content hash), newest first """
+    if not store.STORE_ENABLED:
+        raise HTTPException(status_code=404, detail="prediction store is disabled (STORE_ENABLED=0)")
+    full_text = ((payload.title or "").strip() + "\n\n" + (payload.text or "").strip()).strip()
+    return store.store.query(content_hash=store.content_hash(full_text), limit=limit)
+
+def _prior_or_none(source: str) -> Optional[dict]:
+    try:
+        return get_prior_for_source(source) if get_prior_for_source else None
+    except Exception:
+        return None
+
+@app.get("/sources")
+def sources(min_n: int = Query(1, ge=1), sort: str = Query("n", description="n, disagreement, drift or source"),
+            limit: int = Query(100, ge=1, le=1000),
+            model: Optional[str] = Query(None, description="checkpoint whose predictions are rolled up; default the one serving")):
+    """ Per-outlet rollups (counts, mean/std probabilities, label histogram) against the AllSides prior """
+    if not store.STORE_ENABLED or not rollups.ROLLUPS_ENABLED:
+        raise HTTPException(status_code=404, detail="source rollups are disabled (STORE_ENABLED / ROLLUPS_ENABLED)")
+    try:
+        return store.store.sources(_prior_or_none, model=model or CKPT_DIR, min_n=min_n, sort=sort, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/sources/{source}")
+def source_rollup(source: str, since: Optional[str] = Query(None, description="epoch seconds or ISO-8601"),
+                  until: Optional[str] = Query(None),
+                  model: Optional[str] = Query(None, description="checkpoint whose predictions are rolled up; default the one serving")):
+    """ One outlet's rollup plus a per-bucket (default daily) series """
+    if not store.STORE_ENABLED or not rollups.ROLLUPS_ENABLED:
+        raise HTTPException(status_code=404, detail="source rollups are disabled (STORE_ENABLED / ROLLUPS_ENABLED)")
+    try:
+        out = store.store.source(source, _prior_or_none, model=model or CKPT_DIR,
+                                 since=store.parse_time(since), until=store.parse_time(until))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if out is None:
+        raise HTTPException(status_code=404, detail=f"no predictions stored for {source}")
+    return out
+
+def _similar(vec, k: int, by_label: bool, exclude_hash: Optional[str] = None,
+             exclude_source: Optional[str] = None, exact: Optional[bool] = None) -> List[dict]:
+    """nearest stored articles, one per text; with by_label, up to k for each label"""
+    # over-fetch: hits get dropped for duplicates and filters, and by_label wants every label covered
+    hits = embeddings.index_for(CKPT_DIR).search(vec, max(50, k * (20 if by_label else 4)), exact=exact)
+    meta = store.store.get_many([pid for pid, _ in hits])
+    out, seen, per_label = [], {exclude_hash}, {}
+    for pid, score in hits:
+        row = meta.get(pid)
+        if row is None or row["content_hash"] in seen or (exclude_source and row["source"] == exclude_source):
+            continue
+        seen.add(row["content_hash"])
+        if by_label:
+            if per_label.get(row["label"], 0) >= k:
+                continue
+            per_label[row["label"]] = per_label.get(row["label"], 0) + 1
+        elif len(out) >= k:
+            break
+        out.append({"id": pid, "score": round(score, 4),
+                    **{f: row[f] for f in ("url", "title", "source", "label", "confidence", "created_at")}})
+    return out
+
+def _stored_vector(content_hash: str):
+    ids = [r["id"] for r in store.store.query(content_hash=content_hash, limit=store.STORE_MAX_PAGE)["items"]]
+    return embeddings.index_for(CKPT_DIR).vector(ids) if ids else None
+
+def _similar_enabled() -> None:
+    if not (store.STORE_ENABLED and embeddings.EMBED_ENABLED):
+        raise HTTPException(status_code=404, detail="similar-article search is disabled (STORE_ENABLED / EMBED_ENABLED)")
+
+@app.get("/similar")
+def similar(id: Optional[int] = Query(None, description="stored prediction id"), url: Optional[str] = Query(None),
+            hash: Optional[str] = Query(None, description="content_hash of a stored prediction"),
+            k: int = Query(10, ge=1, le=100), by_label: bool = Query(False, description="up to k per label"),
+            other_sources: bool = Query(False, description="leave out the article's own outlet"),
+            exact: Optional[bool] = Query(None, description="force exact (true) or approximate (false) search")):
+    """ Stored articles closest to a stored one, from vectors saved at classify time; no model call """
+    _similar_enabled()
+    if id is not None:
+        row = store.store.get(id)
+    elif url or hash:
+        items = store.store.query(url=url, content_hash=hash, limit=1)["items"]
+        row = items[0] if items else None
+    else:
+        raise HTTPException(status_code=400, detail="pass id, url or hash")
+    if row is None:
+        raise HTTPException(status_code=404, detail="no stored prediction matches")
+    vec = _stored_vector(row["content_hash"])
+    if vec is None:
+        raise HTTPException(status_code=404, detail="no vector stored for this article (linear stage, or not written yet)")
+    try:
+        items = _similar(vec, k, by_label, row["content_hash"], row["source"] if other_sources else None, exact)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    query = {f: row[f] for f in ("id", "url", "title", "source", "label", "confidence", "content_hash")}
+    return {"query": query, "items": items}
+
+@app.post("/similar")
+async def similar_text(payload: PredictRequest = Body(...), k: int = Query(10, ge=1, le=100),
+                       by_label: bool = Query(False)):
+    """
+    Classify (or reuse) this article and return the stored articles closest to it.
+    A text seen before costs no model call; a new one costs its usual classify pass
+    """
+    _similar_enabled()
+    if not payload.text or len(payload.text) < 20:
+        raise HTTPException(status_code=400, detail="`text` must be at least 20 characters.")
+    full_text = ((payload.title or "").strip() + "\n\n" + (payload.text or "").strip()).strip()
+    chunked = _use_chunked(payload.chunked)
+    h = store.content_hash(full_text)
+    res = await _classify(full_text, chunked)
+    vec = embeddings.decode(res["embedding"]) if res.get("embedding") else await asyncio.to_thread(_stored_vector, h)
+    if vec is None and not chunked:
+        # the linear stage answered and the text isn't stored: one BERT pass for its vector
+        res = await batching.aclassify(full_text)
+        vec = embeddings.decode(res["embedding"]) if res.get("embedding") else None
+    if vec is None:
+        raise HTTPException(status_code=409, detail="this backend doesn't expose pooled vectors")
+    _store("/similar", full_text, res, chunked, url=payload.url, title=payload.title)
+    items = await asyncio.to_thread(_similar, vec, k, by_label, h)
+    return {"bias": _bias_out(res), "items": items}
+
+@app.get("/predictions/{pred_id}")
+def prediction(pred_id: int):
+    if not store.STORE_ENABLED:
+        raise HTTPException(status_code=404, detail="prediction store is disabled (STORE_ENABLED=0)")
+    row = store.store.get(pred_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"no prediction {pred_id}")
+    return row
+
+@app.on_event("startup")
+def _startup():
+    # load + warm the model in the background; /readyz flips once it's done
+    if MODEL_EAGER_LOAD:
+        bias_model.start_loading()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    batching.shutdown()
+    executors.shutdown()
+    store.shutdown()
+    await aclose_client()
+    await aclose_summarizer()
 
 @app.get("/fetch", tags=["ingest"], summary="Fetch & extract article content by URL")
 async def fetch(url: str = Query(..., description="Article URL")):
@@ -91,79 +456,205 @@ async def fetch(url: str = Query(..., description="Article URL")):
     return art
 
 @app.post("/predict", response_model=PredictResponse)
-def predict(payload: PredictRequest = Body(...)):
+async def predict(payload: PredictRequest = Body(...)):
     if not payload.text or len(payload.text) < 20:
         raise HTTPException(status_code=400, detail="`text` must be at least 20 characters.")
 
     full_text = ((payload.title or "").strip() + "\n\n" + (payload.text or "").strip()).strip()
-    summ = summarize(payload.text or "").get("text", "")
 
-    # bias model
+    # summary and bias model run concurrently; latency is the slower of the two
+    chunked = _use_chunked(payload.chunked)
     try:
-        res = classify(full_text)
+        summ, res = await asyncio.gather(
+            _summary(payload.text or ""),
+            _classify(full_text, chunked),
+        )
+    except admission.DeadlineExceeded:
+        raise
     except Exception as e:
         log.exception("classification error")
         raise HTTPException(status_code=500, detail=f"classifier failed: {e}")
+    _store("/predict", full_text, res, chunked, url=payload.url, title=payload.title)
 
     spans = [RationaleSpan(**s) for s in res.get("rationale_spans", [])]
     return PredictResponse(
         summary=summ,
-        bias=BiasOut(
-            label=res["label"],
-            confidence=float(res["confidence"]),
-            probs={k: round(v, 3) for k, v in (res.get("probs") or {}).items()}
-        ),
+        bias=_bias_out(res),
         explain=ExplainOut(spans=spans)
     )
 
-@app.post("/predict_url", response_model=PredictResponse)
-async def predict_url(url: str = Body(..., embed=True)):
-    art = await extract_article(url)    # {'url','source','title','text'}
-    text = (art.get("text") or "")[:8000]
+def _url_text(art: dict, chunked: bool) -> str:
+    text = art.get("text") or ""
+    if not chunked:
+        text = text[:PREDICT_URL_MAX_CHARS]
     if len(text) < 20:
         raise HTTPException(status_code=400, detail="Extracted text too short.")
+    return text
+
+def _source_prior(art: dict) -> Optional[dict]:
+    # source-level prior from AllSides mapping
+    if not get_prior_for_source:
+        return None
+    # extractor returns a domain like "cnn.com"; the index matches it (or any
+    # subdomain) against CSV domains and outlet names, then falls back to the URL
+    try:
+        for key in (art.get("source"), art.get("url")):
+            prior = get_prior_for_source(key or "")
+            if prior:
+                return prior
+    except Exception:
+        pass
+    return None
+
+def _bias_out(res: dict) -> BiasOut:
+    return BiasOut(
+        label=res["label"],
+        confidence=float(res["confidence"]),
+        probs={k: round(v, 3) for k, v in (res.get("probs") or {}).items()},
+        windows=res.get("windows"),
+        stage=res.get("stage", "bert"),
+    )
+
+@app.post("/predict_url", response_model=PredictResponse)
+async def predict_url(url: str = Body(..., embed=True), chunked: Optional[bool] = Body(None, embed=True)):
+    art = await extract_article(url)    # {'url','source','title','text'}
+    chunked = _use_chunked(chunked)
+    text = _url_text(art, chunked)
 
-    summ = summarize(text).get("text", "")
     full_text = ((art.get("title") or "").strip() + "\n\n" + text).strip()
-    res = classify(full_text)
+    summ, res = await asyncio.gather(_summary(text), _classify(full_text, chunked))
+    _store("/predict_url", full_text, res, chunked, url=art.get("url") or url,
+           source=art.get("source"), title=art.get("title"))
     spans = [RationaleSpan(**s) for s in res.get("rationale_spans", [])]
-    # source-level prior from AllSides mapping
-    prior = None
-    if get_prior_for_source:
-        # extractor returns domain like "cnn.com"; priors may be keyed by outlet name
-        # try domain first, then strip www., then title-based guess
-        key = (art.get("source") or "").lower()  # e.g., "cnn.com"
-        try:
-            prior = get_prior_for_source(key)  # implement domain to prior mapping in priors.py
-        except Exception:
-            prior = None
 
     return PredictResponse(
         summary=summ,
-        bias=BiasOut(
-            label=res["label"],
-            confidence=float(res["confidence"]),
-            probs={k: round(v, 3) for k, v in (res.get("probs") or {}).items()}
-        ),
+        bias=_bias_out(res),
         explain=ExplainOut(spans=spans),
-        source_prior=prior,
+        source_prior=_source_prior(art),
     )
 
+def _event(fmt: str, name: str, data: dict) -> bytes:
+    if fmt == "sse":
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+    return (json.dumps({"event": name, "data": data}) + "\n").encode("utf-8")
+
+@app.post("/predict_url/stream")
+async def predict_url_stream(request: Request,
+                             url: str = Body(..., embed=True),
+                             chunked: Optional[bool] = Body(None, embed=True),
+                             format: Optional[str] = Body(None, embed=True)):
+    """
+    /predict_url as a stream of events, in this order:
+    article -> source_prior -> bias (+ spans) -> summary -> final (a PredictResponse).
+    NDJSON by default; SSE with "format": "sse" or Accept: text/event-stream.
+    Summary and classification start together; the label goes out as soon as it's ready.
+    """
+    fmt = (format or "").lower() or ("sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson")
+    if fmt not in {"sse", "ndjson"}:
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+
+    # fetch/extract before the stream opens, so those failures keep their status codes
+    art = await extract_article(url)
+    chunked = _use_chunked(chunked)
+    text = _url_text(art, chunked)
+    full_text = ((art.get("title") or "").strip() + "\n\n" + text).strip()
+
+    async def events():
+        summary_task = asyncio.ensure_future(_summary(text))
+        classify_task = asyncio.ensure_future(_classify(full_text, chunked))
+        try:
+            yield _event(fmt, "article", {
+                "url": art.get("url") or url, "source": art.get("source"),
+                "title": art.get("title"), "chars": len(text), "chunked": chunked,
+            })
+            prior = _source_prior(art)
+            yield _event(fmt, "source_prior", {"source_prior": prior})
+
+            res = await classify_task
+            _store("/predict_url/stream", full_text, res, chunked, url=art.get("url") or url,
+                   source=art.get("source"), title=art.get("title"))
+            bias = _bias_out(res)
+            explain = ExplainOut(spans=[RationaleSpan(**s) for s in res.get("rationale_spans", [])])
+            yield _event(fmt, "bias", {"bias": bias.model_dump(), "explain": explain.model_dump()})
+
+            summ = await summary_task
+            yield _event(fmt, "summary", {"summary": summ})
+
+            final = PredictResponse(summary=summ, bias=bias, explain=explain, source_prior=prior)
+            yield _event(fmt, "final", final.model_dump())
+        except Exception as e:
+            # headers are already sent; report the failure in-band
+            log.exception("predict_url stream error")
+            yield _event(fmt, "error", {"detail": f"{type(e).__name__}: {e}"})
+        finally:
+            for t in (summary_task, classify_task):
+                t.cancel()
+
+    media = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    # no-transform / X-Accel-Buffering keep proxies from holding events back
+    return StreamingResponse(events(), media_type=media,
+                             headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
+
 @app.post("/batch_predict", response_model=List[PredictResponse])
-def batch_predict(items: List[PredictRequest] = Body(...)):
+async def batch_predict(request: Request, items: List[PredictRequest] = Body(...)):
+    if len(items) > admission.BATCH_PREDICT_MAX_ITEMS:
+        raise HTTPException(status_code=413,
+                            detail=f"at most {admission.BATCH_PREDICT_MAX_ITEMS} items per batch, got {len(items)}")
+    # one token was taken on admission; the rest of the batch pays too
+    try:
+        admission.limiter.take(admission.client_id(request.headers, request.client.host if request.client else None),
+                               max(0, len(items) - 1))
+    except admission.Rejected as e:
+        return _overloaded(e)
+    full_texts = [((item.title or "").strip() + "\n\n" + (item.text or "").strip()).strip() for item in items]
+    chunked = [_use_chunked(item.chunked) for item in items]
+    # summaries (bounded by SUMMARY_CONCURRENCY) proceed while the model runs
+    summaries_task = asyncio.ensure_future(asyncio.gather(*(_summary(item.text or "") for item in items)))
+
+    try:
+        # cache and near-duplicate index first; only misses reach the model
+        results = [None] * len(items)
+        keys = [None] * len(items)
+        sigs = [None] * len(items)
+        for i in range(len(items)):
+            keys[i], sigs[i], results[i] = await _cached_classify(full_texts[i], chunked[i])
+        misses = [i for i in range(len(items)) if results[i] is None]
+
+        # one tokenizer call + length-bucketed forward passes for the remaining list;
+        # items that asked for chunked scoring get their own windowed pass
+        short_idx = [i for i in range(len(items)) if results[i] is None and not chunked[i]]
+        if short_idx:
+            # confident items are answered by the linear stage; the rest escalate
+            for i, res in zip(short_idx, cascade.gate([full_texts[i] for i in short_idx])):
+                results[i] = res
+            short_idx = [i for i in short_idx if results[i] is None]
+        if short_idx:
+            with metrics.timed("classify"):
+                batched = await run_inference(classify_batch, [full_texts[i] for i in short_idx], MAX_BATCH_TOKENS)
+            for i, res in zip(short_idx, batched):
+                results[i] = res
+        long_idx = [i for i in range(len(items)) if results[i] is None]
+        if long_idx:
+            with metrics.timed("classify"):
+                long_res = await asyncio.gather(*(run_inference(classify_long, full_texts[i]) for i in long_idx))
+            for i, res in zip(long_idx, long_res):
+                results[i] = res
+        for i in misses:
+            await _remember_classify(keys[i], sigs[i], chunked[i], results[i])
+    except BaseException:
+        summaries_task.cancel()
+        raise
+    summaries = await summaries_task
+    for item, text, ch, res in zip(items, full_texts, chunked, results):
+        _store("/batch_predict", text, res, ch, url=item.url, title=item.title)
+
     outputs: List[PredictResponse] = []
-    for item in items:
-        full_text = ((item.title or "").strip() + "\n\n" + (item.text or "").strip()).strip()
-        summ = summarize(item.text or "").get("text", "")
-        res = classify(full_text)
+    for summ, res in zip(summaries, results):
         spans = [RationaleSpan(**s) for s in res.get("rationale_spans", [])]
         outputs.append(PredictResponse(
         summary=summ,
-        bias=BiasOut(
-            label=res["label"],
-            confidence=float(res["confidence"]),
-            probs={k: round(v, 3) for k, v in (res.get("probs") or {}).items()}
-        ),
+        bias=_bias_out(res),
         explain=ExplainOut(spans=spans)
     ))
     return outputs
@@ -0,0 +1,164 @@
+"""Compare every inference backend with fp32 torch on label agreement, probability drift and speed."""
+from __future__ import annotations
+import os, csv, sys, json, time, random, argparse
+from typing import Dict, Any, List, Optional, Tuple
+
+# the reference model has to be plain fp32 torch; other backends are built from it
+os.environ["BIAS_BACKEND"] = "torch"
+
+import torch
+
+from .backends import BACKENDS, load_backend
+from .bias_model import get_model, CKPT, MAX_BATCH_TOKENS, _chunks, _pad, _id2label
+
+_TEXT_COLS = ("text", "body", "content", "article", "heading", "title")
+_LABEL_COLS = ("bias_rating", "label", "bias", "rating")
+
+def _pick(header: List[str], wanted: Optional[str], candidates: Tuple[str, ...]) -> Optional[str]:
+    if wanted:
+        if wanted not in header:
+            raise SystemExit(f"column {wanted!r} not in {header}")
+        return wanted
+    lower = {h.lower(): h for h in header}
+    for c in candidates:
+        if c in lower:
+            return lower[c]
+    return None
+
+def load_sample(path: str, n: int, text_col: Optional[str] = None, label_col: Optional[str] = None,
+                seed: int = 0) -> Tuple[List[str], List[Optional[str]]]:
+    """reservoir sample of n rows, streamed so large CSVs never sit in memory"""
+    rng = random.Random(seed)
+    keep: List[Tuple[str, Optional[str]]] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        tcol = _pick(reader.fieldnames or [], text_col, _TEXT_COLS)
+        lcol = _pick(reader.fieldnames or [], label_col, _LABEL_COLS)
+        if not tcol:
+            raise SystemExit(f"no text column found in {path}; pass --text-col (header: {reader.fieldnames})")
+        seen = 0
+        for row in reader:
+            text = (row.get(tcol) or "").strip()
+            if not text:
+                continue
+            item = (text, ((row.get(lcol) or "").strip() or None) if lcol else None)
+            seen += 1
+            if len(keep) < n:
+                keep.append(item)
+            else:
+                j = rng.randrange(seen)
+                if j < n:
+                    keep[j] = item
+    return [t for t, _ in keep], [l for _, l in keep]
+
+def _pct(xs: List[float], q: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))]
+
+def run_backend(backend, m, enc: Dict[str, List[List[int]]], latency_n: int) -> Dict[str, Any]:
+    n = len(enc["input_ids"])
+    lengths = [len(ids) for ids in enc["input_ids"]]
+
+    # one untimed pass so lazy init (ORT allocators, quantized kernels) isn't billed
+    backend(_pad(m, {k: [enc[k][0]] for k in enc.keys()}))
+
+    # throughput: the same length-bucketed batching the API uses
+    logits = [None] * n
+    order = sorted(range(n), key=lambda i: lengths[i])
+    t0 = time.perf_counter()
+    for chunk in _chunks(order, lengths, MAX_BATCH_TOKENS):
+        out = backend(_pad(m, {k: [enc[k][i] for i in chunk] for k in enc.keys()}))
+        for row, i in enumerate(chunk):
+            logits[i] = out[row]
+    batched_s = time.perf_counter() - t0
+
+    # latency: one article per forward pass, like a lone /predict
+    lat = []
+    for i in range(min(latency_n, n)):
+        t1 = time.perf_counter()
+        backend(_pad(m, {k: [enc[k][i]] for k in enc.keys()}))
+        lat.append((time.perf_counter() - t1) * 1000.0)
+
+    probs = torch.softmax(torch.stack(logits).float() / m.T, dim=-1)
+    return {
+        "probs": probs,
+        "throughput_items_s": round(n / batched_s, 2) if batched_s else None,
+        "latency_ms_p50": round(_pct(lat, 0.50), 2),
+        "latency_ms_p95": round(_pct(lat, 0.95), 2),
+        "latency_ms_mean": round(sum(lat) / len(lat), 2) if lat else None,
+    }
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--csv", required=True, help="CSV with an article text column (+ optional label column)")
+    ap.add_argument("--text-col")
+    ap.add_argument("--label-col")
+    ap.add_argument("--n", type=int, default=200, help="articles to sample")
+    ap.add_argument("--latency-n", type=int, default=50, help="articles timed one at a time")
+    ap.add_argument("--backends", default=",".join(BACKENDS))
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="write the report as JSON here")
+    args = ap.parse_args(argv)
+
+    texts, gold = load_sample(args.csv, args.n, args.text_col, args.label_col, args.seed)
+    if not texts:
+        raise SystemExit("no rows with text in the sample")
+    m = get_model()
+    id2label = _id2label(m)
+    label2id = {v.lower(): k for k, v in id2label.items()}
+    enc = dict(m.tokenizer(texts, truncation=True, max_length=512))
+    enc.pop("offset_mapping", None)
+
+    names = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "torch" not in names:
+        names.insert(0, "torch")
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in names:
+        t0 = time.perf_counter()
+        backend = m.backend if name == "torch" else load_backend(name, m.model, CKPT)
+        load_s = time.perf_counter() - t0
+        res = run_backend(backend, m, enc, args.latency_n)
+        res["load_s"] = round(load_s, 3)
+        results[name] = res
+        print(f"[{name}] {res['throughput_items_s']} items/s, p50 {res['latency_ms_p50']} ms", file=sys.stderr)
+
+    ref = results["torch"]["probs"]
+    ref_labels = ref.argmax(dim=-1)
+    gold_ids = [label2id.get((g or "").lower()) for g in gold]
+    scored = [i for i, g in enumerate(gold_ids) if g is not None]
+
+    report: Dict[str, Any] = {
+        "checkpoint": CKPT,
+        "csv": args.csv,
+        "n": len(texts),
+        "max_batch_tokens": MAX_BATCH_TOKENS,
+        "torch_threads": torch.get_num_threads(),
+        "backends": {},
+    }
+    for name, res in results.items():
+        probs = res.pop("probs")
+        labels = probs.argmax(dim=-1)
+        drift = (probs - ref).abs()
+        row = dict(res)
+        row["label_agreement"] = round(float((labels == ref_labels).float().mean()), 4)
+        row["prob_drift_mean"] = round(float(drift.mean()), 6)
+        row["prob_drift_max"] = round(float(drift.max()), 6)
+        if scored:
+            hits = sum(int(labels[i]) == gold_ids[i] for i in scored)
+            row["accuracy"] = round(hits / len(scored), 4)
+        base = results["torch"]["throughput_items_s"] or 0
+        if base and res["throughput_items_s"]:
+            row["speedup_vs_torch"] = round(res["throughput_items_s"] / base, 2)
+        report["backends"][name] = row
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+    return report
+
+if __name__ == "__main__":
+    main()
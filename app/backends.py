@@ -0,0 +1,208 @@
+from __future__ import annotations
+import os, re, json, time, inspect, hashlib, logging, threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import torch
+
+from .config import TORCH_THREADS
+
+log = logging.getLogger("uvicorn.error")
+
+# which runtime executes the classifier: torch (fp32 eager), int8 (dynamic
+# quantization of the Linear layers) or onnx (exported graph on onnxruntime)
+BIAS_BACKEND = os.getenv("BIAS_BACKEND", "torch").lower()
+# where exported artifacts go when the checkpoint is a hub id rather than a local dir
+BACKEND_CACHE_DIR = os.getenv("BIAS_BACKEND_CACHE", os.path.join(Path.home(), ".cache", "newsbias"))
+
+BACKENDS = ("torch", "int8", "onnx")
+
+# input of the classification head from the last forward pass on this thread.
+# A plain function and a module-level local so the hook survives deepcopy (int8)
+_captured = threading.local()
+
+def _grab_pooled(module, args) -> None:
+    _captured.value = args[0]
+
+def _hook_head(model: torch.nn.Module) -> bool:
+    """
+    watch the classifier head's input: BERT's pooled [CLS] vector, DistilBERT's
+    pre-classifier output. False when the model has no `classifier` module
+    """
+    head = getattr(model, "classifier", None)
+    if not isinstance(head, torch.nn.Module):
+        return False
+    if _grab_pooled not in head._forward_pre_hooks.values():
+        head.register_forward_pre_hook(_grab_pooled)
+    return True
+
+def _take_pooled() -> Optional[torch.Tensor]:
+    p, _captured.value = getattr(_captured, "value", None), None
+    if p is None:
+        return None
+    # heads that take the whole sequence (RoBERTa-style) get the first token
+    return (p[:, 0] if p.dim() == 3 else p).float()
+
+class TorchBackend:
+    """plain PyTorch eager forward; every backend maps a padded batch to fp32 logits"""
+    name = "torch"
+
+    def __init__(self, model: torch.nn.Module):
+        self.model = model
+        self.has_pooled = _hook_head(model)
+
+    @torch.no_grad()
+    def __call__(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        return self.model(**batch).logits
+
+    @torch.no_grad()
+    def forward_pooled(self, batch: Dict[str, torch.Tensor]):
+        """(logits, pooled article vectors) from one forward pass"""
+        _captured.value = None
+        logits = self.model(**batch).logits
+        return logits, _take_pooled()
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+class Int8Backend(TorchBackend):
+    """dynamic int8 quantization of every nn.Linear; weights quantized once, activations per call"""
+    name = "int8"
+
+    def __init__(self, model: torch.nn.Module):
+        t0 = time.perf_counter()
+        qmodel = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        qmodel.eval()
+        super().__init__(qmodel)
+        self.quantize_s = round(time.perf_counter() - t0, 3)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name, "quantize_s": self.quantize_s}
+
+def _artifact_dir(ckpt: str, kind: str = "onnx") -> Path:
+    """next to a local checkpoint, otherwise under BACKEND_CACHE_DIR keyed by the hub id"""
+    p = Path(ckpt)
+    if p.is_dir():
+        return p / kind
+    return Path(BACKEND_CACHE_DIR) / re.sub(r"[^A-Za-z0-9_.-]+", "__", ckpt) / kind
+
+def _fingerprint(ckpt: str, config) -> str:
+    """changes whenever the checkpoint files or the exporting library versions change"""
+    import transformers
+    h = hashlib.sha256()
+    h.update(f"{torch.__version__}|{transformers.__version__}|{ckpt}".encode())
+    p = Path(ckpt)
+    if p.is_dir():
+        for f in sorted(p.glob("*.safetensors")) + sorted(p.glob("*.bin")) + [p / "config.json"]:
+            if f.exists():
+                st = f.stat()
+                h.update(f"{f.name}:{st.st_size}:{int(st.st_mtime)}".encode())
+    else:
+        h.update(json.dumps(config.to_dict(), sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+class OnnxBackend:
+    """
+    Exports the checkpoint to ONNX once (cached, keyed by a fingerprint of the
+    checkpoint) and runs it with onnxruntime on CPU.
+    """
+    name = "onnx"
+
+    def __init__(self, model: torch.nn.Module, ckpt: str):
+        import onnxruntime as ort
+
+        out_dir = _artifact_dir(ckpt)
+        fp = _fingerprint(ckpt, model.config)
+        path = out_dir / f"model-{fp}.onnx"
+        self.exported = False
+        t0 = time.perf_counter()
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = TORCH_THREADS
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = None
+        if path.exists():
+            session = ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+            if _hook_head(model) and "pooled" not in [o.name for o in session.get_outputs()]:
+                # exported before the graph had a pooled output
+                session = None
+                path.unlink()
+        if session is None:
+            out_dir.mkdir(parents=True, exist_ok=True)
+            _export(model, path)
+            self.exported = True
+            session = ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+        self.session = session
+        self.outputs = [o.name for o in session.get_outputs()]
+        self.export_s = round(time.perf_counter() - t0, 3)
+        self.path = str(path)
+        self.inputs = [i.name for i in self.session.get_inputs()]
+        self.has_pooled = "pooled" in self.outputs
+
+    def _feed(self, batch: Dict[str, torch.Tensor]) -> Dict[str, Any]:
+        ids = batch["input_ids"]
+        feed = {}
+        for name in self.inputs:
+            t = batch.get(name)
+            if t is None:
+                t = torch.zeros_like(ids)
+            feed[name] = t.cpu().numpy()
+        return feed
+
+    def __call__(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        logits = self.session.run(["logits"], self._feed(batch))[0]
+        return torch.from_numpy(logits)
+
+    def forward_pooled(self, batch: Dict[str, torch.Tensor]):
+        logits, pooled = self.session.run(["logits", "pooled"], self._feed(batch))
+        return torch.from_numpy(logits), torch.from_numpy(pooled)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name, "path": self.path, "exported": self.exported, "export_s": self.export_s}
+
+class _LogitsAndPooled(torch.nn.Module):
+    """export wrapper: the graph returns the classifier head's input next to the logits"""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, *args):
+        _captured.value = None
+        logits = self.model(*args).logits
+        return logits, _take_pooled()
+
+def _export(model: torch.nn.Module, path: Path) -> None:
+    ids = torch.ones((2, 16), dtype=torch.long)
+    names = ["input_ids", "attention_mask"]
+    args = (ids, torch.ones_like(ids))
+    # BERT takes segment ids, DistilBERT-style students don't
+    if "token_type_ids" in inspect.signature(model.forward).parameters:
+        names.append("token_type_ids")
+        args = args + (torch.zeros_like(ids),)
+    outputs = ["logits", "pooled"] if _hook_head(model) else ["logits"]
+    kwargs = dict(
+        input_names=names,
+        output_names=outputs,
+        dynamic_axes={n: {0: "batch", 1: "seq"} for n in names} | {o: {0: "batch"} for o in outputs},
+        opset_version=17,
+    )
+    module = _LogitsAndPooled(model) if len(outputs) == 2 else model
+    tmp = path.with_suffix(".onnx.tmp")
+    with torch.no_grad():
+        try:
+            torch.onnx.export(module, args, str(tmp), dynamo=False, **kwargs)
+        except TypeError:
+            # older torch without the dynamo switch
+            torch.onnx.export(module, args, str(tmp), **kwargs)
+    os.replace(tmp, path)
+    log.info(f"exported ONNX model to {path}")
+
+def load_backend(name: str, model: torch.nn.Module, ckpt: str):
+    name = (name or "torch").lower()
+    if name == "torch":
+        return TorchBackend(model)
+    if name == "int8":
+        return Int8Backend(model)
+    if name == "onnx":
+        return OnnxBackend(model, ckpt)
+    raise ValueError(f"unknown BIAS_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
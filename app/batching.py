@@ -0,0 +1,212 @@
+from __future__ import annotations
+import os, time, queue, asyncio, threading, logging
+from concurrent.futures import Future
+from typing import Dict, Any, List, Callable, Optional
+
+from . import metrics, admission, executors
+
+log = logging.getLogger("uvicorn.error")
+
+# micro-batching knobs; BATCH_ENABLED=0 sends every request straight to classify()
+BATCH_ENABLED = str(os.getenv("BATCH_ENABLED", "1")).lower() in {"1", "true", "yes"}
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+class MicroBatcher:
+    """
+    Collects concurrent classify calls into one padded forward pass.
+    A single background thread pulls texts off a queue, waits at most
+    `max_wait_ms` for more to arrive (up to `max_batch_size`), runs them
+    through `fn` together and hands each caller its own result.
+    """
+
+    def __init__(self, fn: Callable[[List[str]], List[Dict[str, Any]]],
+                 max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._q: "queue.Queue[tuple]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_size = 1
+
+        # stats
+        self._submitted = 0
+        self._completed = 0
+        self._errors = 0
+        self._dropped = 0
+        self._batches = 0
+        self._max_seen = 0
+        self._sizes: Dict[int, int] = {}
+        self._wait_total = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str, deadline: Optional[float] = None) -> Future:
+        """deadline (time.monotonic()) lets the batcher drop the item if it's still queued past it"""
+        self._ensure_started()
+        fut: Future = Future()
+        with self._lock:
+            self._submitted += 1
+        self._q.put((text, fut, time.monotonic(), deadline))
+        return fut
+
+    def classify(self, text: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        return self.submit(text, deadline).result()
+
+    async def aclassify(self, text: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        return await asyncio.wrap_future(self.submit(text, deadline))
+
+    def _collect(self, first: tuple) -> List[tuple]:
+        batch = [first]
+        # under light traffic (last batch was a lone request) don't hold a single
+        # request back; once requests start overlapping, wait briefly to fill up
+        deadline = time.monotonic() + (self.max_wait if self._last_size > 1 else 0.0)
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._q.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+            batch = self._collect(first)
+            stop = any(item is None for item in batch)
+            batch = [item for item in batch if item is not None]
+            if batch:
+                self._dispatch(batch)
+            if stop:
+                break
+
+    def _dispatch(self, batch: List[tuple]) -> None:
+        now = time.monotonic()
+        # items whose caller has already given up don't get a forward pass
+        live = []
+        for item in batch:
+            _, fut, _, deadline = item
+            if not fut.set_running_or_notify_cancel():
+                continue   # caller cancelled (client went away)
+            if deadline is not None and deadline <= now:
+                fut.set_exception(admission.DeadlineExceeded("batch_queue"))
+                with self._lock:
+                    self._dropped += 1
+                continue
+            live.append(item)
+        texts = [text for text, _, _, _ in live]
+        try:
+            results = self.fn(texts) if texts else []
+        except Exception as e:
+            log.exception("batched classification failed")
+            for _, fut, _, _ in live:
+                fut.set_exception(e)
+            ok = False
+        else:
+            for (_, fut, _, _), res in zip(live, results):
+                fut.set_result(res)
+            ok = True
+
+        # only items that went through fn count; cancelled and expired ones aren't a batch
+        n = len(live)
+        if not n:
+            return
+        self._last_size = n
+        with self._lock:
+            self._batches += 1
+            self._completed += n
+            if not ok:
+                self._errors += n
+            self._max_seen = max(self._max_seen, n)
+            self._sizes[n] = self._sizes.get(n, 0) + 1
+            self._wait_total += sum(now - t0 for _, _, t0, _ in live)
+        for _, _, t0, _ in live:
+            metrics.observe("stage_seconds", now - t0, stage="batch_queue")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = self._batches
+            return {
+                "enabled": True,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._q.qsize(),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "errors": self._errors,
+                "dropped_expired": self._dropped,
+                "batches": batches,
+                "mean_batch_size": round(self._completed / batches, 3) if batches else 0.0,
+                "max_batch_size_seen": self._max_seen,
+                "batch_size_hist": {str(k): v for k, v in sorted(self._sizes.items())},
+                "mean_queue_wait_ms": round(1000.0 * self._wait_total / self._completed, 3) if self._completed else 0.0,
+            }
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._q.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+_batcher: Optional[MicroBatcher] = None
+_batcher_lock = threading.Lock()
+
+def get_batcher() -> MicroBatcher:
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from .bias_model import classify_batch
+                _batcher = MicroBatcher(classify_batch)
+    return _batcher
+
+def classify(text: str) -> Dict[str, Any]:
+    """drop-in for bias_model.classify that goes through the shared batcher"""
+    if not BATCH_ENABLED:
+        from .bias_model import classify as _classify
+        admission.check("classify")
+        return _classify(text)
+    return get_batcher().classify(text, admission.current_deadline())
+
+async def aclassify(text: str) -> Dict[str, Any]:
+    if not BATCH_ENABLED:
+        from .bias_model import classify as _classify
+        admission.check("classify")
+        # never run a forward pass on the event loop
+        return await executors.run_inference(_classify, text)
+    return await get_batcher().aclassify(text, admission.current_deadline())
+
+def stats() -> Dict[str, Any]:
+    if not BATCH_ENABLED:
+        return {"enabled": False}
+    if _batcher is None:
+        return {"enabled": True, "max_batch_size": BATCH_MAX_SIZE,
+                "max_wait_ms": BATCH_MAX_WAIT_MS, "queue_depth": 0, "batches": 0}
+    return _batcher.stats()
+
+def shutdown() -> None:
+    if _batcher is not None:
+        _batcher.close()
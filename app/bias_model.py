@@ -1,124 +1,257 @@
-from typing import Dict, Any, List
-import os, json, re
+from typing import Dict, Any, List, Optional
+import os, json, time, logging, threading
 from pathlib import Path
 
 import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from .config import TORCH_THREADS
+from .backends import load_backend, BIAS_BACKEND
+from . import weights
+from .lexicon import find_spans
+from . import metrics, embeddings, store
+
+log = logging.getLogger("uvicorn.error")
 
 LABELS = ["Left", "Center", "Right"]
 
 BASE_DIR = Path(__file__).resolve().parent
 
 # HF repo id 
-CKPT = os.getenv("BIAS_MODEL_NAME")
+CKPT = os.getenv("BIAS_MODEL_NAME", "Halfbendy/qbias_model")
+
+# tokenizer from base model; local checkpoints that ship their own tokenizer
+# (model/model.py and model/distill.py outputs) use it unless overridden
+_CKPT_TOKENIZER = os.path.exists(os.path.join(CKPT, "tokenizer_config.json"))
+TOKENIZER_ID = os.getenv("BIAS_TOKENIZER_NAME", CKPT if _CKPT_TOKENIZER else "google-bert/bert-base-cased")
 
 DEVICE = "cpu"
 
+# upper bound on padded tokens (batch size x longest sequence) per forward pass
+MAX_BATCH_TOKENS = int(os.getenv("BATCH_MAX_TOKENS", "16384"))
+
+# long-article handling: "truncate" scores the first 512 tokens, "chunked" scores
+# overlapping 512-token windows over the whole article and combines them
+LONG_MODE = os.getenv("LONG_ARTICLE_MODE", "truncate").lower()
+LONG_STRIDE = int(os.getenv("LONG_STRIDE", "128"))          # tokens shared by neighbouring windows
+LONG_MAX_WINDOWS = int(os.getenv("LONG_MAX_WINDOWS", "16"))
+LONG_AGGREGATE = os.getenv("LONG_AGGREGATE", "mean").lower()  # mean | weighted | max
+AGGREGATES = ("mean", "weighted", "max")
+
+# pooled vectors ride along with results only when something will keep them
+EMBED = embeddings.EMBED_ENABLED and store.STORE_ENABLED
+
+# warmup forward passes run after loading, one per sequence length
+WARMUP_LENGTHS = [int(x) for x in os.getenv("WARMUP_LENGTHS", "32,128,512").split(",") if x.strip()]
+WARMUP_BATCH = int(os.getenv("WARMUP_BATCH", "1"))
+
+def _check_aggregate(how: str, name: str = "aggregate") -> None:
+    if how not in AGGREGATES:
+        raise ValueError(f"unknown {name} {how!r}; expected one of {', '.join(AGGREGATES)}")
+
+_check_aggregate(LONG_AGGREGATE, "LONG_AGGREGATE")
+
 try:
-    torch.set_num_threads(max(1, min(4, os.cpu_count() or 2)))
+    torch.set_num_threads(TORCH_THREADS)
 except Exception:
     pass
 
-# detect whether CKPT is a local directory with model files
-ckpt_path = Path(CKPT)
-is_local_dir = ckpt_path.is_dir()
-
-# if user explicitly points to a local path but it doesn't exist, fail with error
-if os.getenv("BIAS_MODEL_NAME", "Halfbendy/qbias_model") and ckpt_path.is_absolute() and not is_local_dir:
-    raise RuntimeError(f"Configured BIAS_MODEL_NAME points to a non-existent path: {CKPT}")
-
-# tokenizer from base model
-TOKENIZER_ID = os.getenv("BIAS_TOKENIZER_NAME", "google-bert/bert-base-cased")
-
-tokenizer = AutoTokenizer.from_pretrained(
-    TOKENIZER_ID,
-    use_fast=True
-)
-# trained model
-model = AutoModelForSequenceClassification.from_pretrained(
-    CKPT,
-    local_files_only=is_local_dir
-)
-# normalize label maps 
-id2label = getattr(model.config, "id2label", {})
-if id2label:
-    norm = {int(i): str(l).title() for i, l in id2label.items()}
-    model.config.id2label = norm
-    model.config.label2id = {v: k for k, v in norm.items()}
-else:
-    # fallback if model lacks mapping
-    model.config.id2label = {0: "Left", 1: "Center", 2: "Right"}
-    model.config.label2id = {"Left": 0, "Center": 1, "Right": 2}
-
-# move and eval
-model.to(DEVICE).eval()
-
-# temperature scaling
-T = 1.0
-temp_path = ckpt_path / "temperature.json" if is_local_dir else None
-if temp_path and temp_path.exists():
-    try:
-        T = float(json.load(open(temp_path)).get("temperature", 1.0))
-    except Exception:
-        T = 1.0
-
-_PATTERNS = [
-    r"\b(flood|surge|invasion|weaponize|radical|extremist|witch hunt)\b",
-    r"\b(soft on crime|open borders|tax-and-spend)\b",
-    r"\b(war on [a-z]+|fearmongering)\b",
-    r"\b(bipartisan|both parties|left[- ]wing|right[- ]wing|progressive|conservative|liberal)\b",
-    r"\b(regulation|tax(?:ation)?|immigration|abortion|gun control|climate)\b",
-]
+class _ModelHolder:
+    """
+    Loads tokenizer + checkpoint on first use (or in the background at startup)
+    so importing this module stays cheap. Thread-safe: concurrent callers wait
+    on the same load. `state` goes idle -> loading -> warming -> ready (or failed).
+    """
 
-def _spans(text: str, k: int = 6) -> List[Dict[str, Any]]:
-    """these print out politically salient words from the article. doesn't affect the model, just adds extra context"""
-    out: List[Dict[str, Any]] = []
-    if not text:
-        return out
-    for pat in _PATTERNS:
-        for m in re.finditer(pat, text, flags=re.IGNORECASE):
-            out.append({
-                "text": text[m.start():m.end()],
-                "start": m.start(),  
-                "end": m.end(),
-                "score": 0.15,
-            })
-    out.sort(key=lambda s: s["start"])
-    return out[:k]
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.tokenizer = None
+        self.model = None      # torch module when the backend has one (None for onnx)
+        self.config = None
+        self.backend = None    # callable: padded batch -> logits
+        self.T = 1.0
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.weights_file: Optional[str] = None   # mapped weights file when BIAS_SHARED_WEIGHTS is on
+        self.timings: Dict[str, float] = {}
 
-@torch.no_grad()
-def classify(text: str) -> Dict[str, Any]:
-    # Empty/short guard
-    if not text or not text.strip():
-        base_probs = {"Left": 0.33, "Center": 0.34, "Right": 0.33}
+    def get(self) -> "_ModelHolder":
+        if self._ready.is_set():
+            return self
+        with self._lock:
+            if not self._ready.is_set():
+                self._load()
+                self._warmup()
+                self.state = "ready"
+                self._ready.set()
+        return self
+
+    def _load(self) -> None:
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        self.state, self.error = "loading", None
+        t0 = time.perf_counter()
+        try:
+            # detect whether CKPT is a local directory with model files
+            ckpt_path = Path(CKPT)
+            is_local_dir = ckpt_path.is_dir()
+
+            # if user explicitly points to a local path but it doesn't exist, fail with error
+            if ckpt_path.is_absolute() and not is_local_dir:
+                raise RuntimeError(f"Configured BIAS_MODEL_NAME points to a non-existent path: {CKPT}")
+
+            tokenizer = AutoTokenizer.from_pretrained(
+                TOKENIZER_ID,
+                use_fast=True
+            )
+            t1 = time.perf_counter()
+            # trained model; with shared weights the tensors map one file every worker shares
+            if weights.SHARED_WEIGHTS and BIAS_BACKEND == "torch":
+                model = weights.load(CKPT, local_files_only=is_local_dir)
+                self.weights_file = str(weights.weights_path(CKPT, model.config))
+            else:
+                if weights.SHARED_WEIGHTS:
+                    log.warning(f"BIAS_SHARED_WEIGHTS only applies to the torch backend, not {BIAS_BACKEND}")
+                model = AutoModelForSequenceClassification.from_pretrained(
+                    CKPT,
+                    local_files_only=is_local_dir
+                )
+            # normalize label maps 
+            id2label = getattr(model.config, "id2label", {})
+            if id2label:
+                norm = {int(i): str(l).title() for i, l in id2label.items()}
+                model.config.id2label = norm
+                model.config.label2id = {v: k for k, v in norm.items()}
+            else:
+                # fallback if model lacks mapping
+                model.config.id2label = {0: "Left", 1: "Center", 2: "Right"}
+                model.config.label2id = {"Left": 0, "Center": 1, "Right": 2}
+
+            # move and eval
+            model.to(DEVICE).eval()
+            t2 = time.perf_counter()
+
+            # inference runtime (torch / int8 / onnx)
+            backend = load_backend(BIAS_BACKEND, model, CKPT)
+            t3 = time.perf_counter()
+
+            # temperature scaling
+            T = 1.0
+            temp_path = ckpt_path / "temperature.json" if is_local_dir else None
+            if temp_path and temp_path.exists():
+                try:
+                    T = float(json.load(open(temp_path)).get("temperature", 1.0))
+                except Exception:
+                    T = 1.0
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            raise
+
+        self.tokenizer, self.config, self.backend, self.T = tokenizer, model.config, backend, T
+        # the fp32 weights are only kept if the backend actually runs them
+        self.model = getattr(backend, "model", None)
+        self.timings.update(tokenizer_s=round(t1 - t0, 3), model_s=round(t2 - t1, 3),
+                            backend_s=round(t3 - t2, 3))
+
+    @torch.no_grad()
+    def _warmup(self) -> None:
+        """a few dummy forward passes so the first real request doesn't pay for cold caches"""
+        self.state = "warming"
+        t0 = time.perf_counter()
+        pad_id = self.tokenizer.pad_token_id or 0
+        vocab = int(getattr(self.config, "vocab_size", 0) or 1000)
+        for n in WARMUP_LENGTHS:
+            n = max(2, min(n, 512))
+            ids = torch.full((max(1, WARMUP_BATCH), n), min(pad_id + 100, vocab - 1), dtype=torch.long)
+            mask = torch.ones_like(ids)
+            batch = {"input_ids": ids.to(DEVICE), "attention_mask": mask.to(DEVICE)}
+            if "token_type_ids" in getattr(self.tokenizer, "model_input_names", ()):
+                batch["token_type_ids"] = torch.zeros_like(ids).to(DEVICE)
+            self.backend(batch)
+        self.timings["warmup_s"] = round(time.perf_counter() - t0, 3)
+        self.timings["total_s"] = round(sum(v for k, v in self.timings.items() if k != "total_s"), 3)
+
+    def start_background(self) -> threading.Thread:
+        """kick off load + warmup on a daemon thread; errors are kept in `error`"""
+        def run():
+            try:
+                self.get()
+            except Exception:
+                log.exception("bias model failed to load")
+        t = threading.Thread(target=run, name="model-loader", daemon=True)
+        t.start()
+        return t
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def status(self) -> Dict[str, Any]:
         return {
-            "label": "Center",
-            "confidence": 0.34,
-            "probs": base_probs,
-            "rationale_spans": [],
+            "state": self.state,
+            "ready": self.ready,
+            "error": self.error,
+            "checkpoint": CKPT,
+            "tokenizer": TOKENIZER_ID,
+            "backend": self.backend.info() if self.backend is not None else {"backend": BIAS_BACKEND},
+            "temperature": self.T if self.ready else None,
+            "shared_weights": self.weights_file,
+            "timings": dict(self.timings),
+            "warmup_lengths": WARMUP_LENGTHS,
         }
 
-    # encode
-    enc = tokenizer(text, truncation=True, max_length=512, return_tensors="pt")
-    enc = {k: v.to(DEVICE) for k, v in enc.items()}
+_holder = _ModelHolder()
+
+def get_model() -> _ModelHolder:
+    """loaded tokenizer/model/temperature; blocks until loading finishes"""
+    return _holder.get()
+
+def start_loading() -> threading.Thread:
+    return _holder.start_background()
+
+def is_ready() -> bool:
+    return _holder.ready
 
-    # forward
-    logits = model(**enc).logits.squeeze(0)  
+def status() -> Dict[str, Any]:
+    return _holder.status()
 
+def _spans(text: str, k: int = 6) -> List[Dict[str, Any]]:
+    """these print out politically salient words from the article. doesn't affect the model, just adds extra context"""
+    with metrics.timed("spans"):
+        return find_spans(text, k)
+
+def _empty_result() -> Dict[str, Any]:
+    base_probs = {"Left": 0.33, "Center": 0.34, "Right": 0.33}
+    return {
+        "label": "Center",
+        "confidence": 0.34,
+        "probs": base_probs,
+        "rationale_spans": [],
+    }
+
+def _id2label(m: _ModelHolder) -> Dict[int, str]:
+    cfg_id2label = getattr(m.config, "id2label", None)
+    if cfg_id2label:
+        return {int(k): str(v) for k, v in cfg_id2label.items()}
+    return {0: "Left", 1: "Center", 2: "Right"}
+
+def _forward(m: _ModelHolder, batch: Dict[str, torch.Tensor]):
+    """(logits, pooled vectors or None); the vectors come out of the same pass"""
+    if EMBED and getattr(m.backend, "has_pooled", False):
+        return m.backend.forward_pooled(batch)
+    return m.backend(batch), None
+
+def _result(m: _ModelHolder, text: str, logits: torch.Tensor, pooled: Optional[torch.Tensor] = None) -> Dict[str, Any]:
     # temperature scaling
-    z = logits / T
+    z = logits / m.T
     z = z - z.max()
 
     # probabilities
-    probs_tensor = torch.softmax(z, dim=-1)     
+    probs_tensor = torch.softmax(z, dim=-1)
     probs_list = probs_tensor.detach().cpu().tolist()
 
     # id2label mapping 
-    cfg_id2label = getattr(model.config, "id2label", None)
-    if cfg_id2label:
-        id2label = {int(k): str(v) for k, v in cfg_id2label.items()}
-    else:
-        id2label = {0: "Left", 1: "Center", 2: "Right"}
+    id2label = _id2label(m)
 
     # predicted label + confidence
     conf, idx = torch.max(probs_tensor, dim=-1)
@@ -130,10 +263,158 @@ def classify(text: str) -> Dict[str, Any]:
     # keyword spans 
     spans = _spans(text)
 
-    return {
+    out = {
         "label": label,
         "confidence": round(float(conf), 3),
         "probs": probs_by_label,
         "rationale_spans": spans,
     }
+    if pooled is not None:
+        out["embedding"] = embeddings.encode(pooled.cpu().numpy())
+    return out
+
+def _chunks(order: List[int], lengths: List[int], max_tokens: int) -> List[List[int]]:
+    """split length-sorted indices into chunks whose padded size stays under max_tokens"""
+    chunks: List[List[int]] = []
+    cur: List[int] = []
+    for i in order:
+        # sorted ascending, so the newest item sets the padded length of the chunk
+        if cur and (len(cur) + 1) * lengths[i] > max_tokens:
+            chunks.append(cur)
+            cur = []
+        cur.append(i)
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+def _pad(m: _ModelHolder, feats: Dict[str, List[List[int]]]) -> Dict[str, torch.Tensor]:
+    """right-pad already tokenized rows to the longest one in the chunk"""
+    width = max(len(ids) for ids in feats["input_ids"])
+    pad_id = m.tokenizer.pad_token_id or 0
+    out = {}
+    for k, rows in feats.items():
+        fill = pad_id if k == "input_ids" else 0
+        t = torch.full((len(rows), width), fill, dtype=torch.long)
+        for r, ids in enumerate(rows):
+            t[r, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        out[k] = t.to(DEVICE)
+    return out
+
+@torch.no_grad()
+def classify_batch(texts: List[str], max_batch_tokens: int = MAX_BATCH_TOKENS) -> List[Dict[str, Any]]:
+    """
+    classify many texts at once; results line up with `texts`.
+    one tokenizer call for the whole list, then items are sorted by length and
+    run in chunks of similar length so padding (and memory) stays bounded
+    """
+    out: List[Dict[str, Any]] = [None] * len(texts)
+    todo = []
+    for i, t in enumerate(texts):
+        # Empty/short guard
+        if not t or not t.strip():
+            out[i] = _empty_result()
+        else:
+            todo.append(i)
+    if not todo:
+        return out
+    m = get_model()
+
+    # encode everything in one fast-tokenizer call, unpadded
+    with metrics.timed("tokenize"):
+        enc = m.tokenizer([texts[i] for i in todo], truncation=True, max_length=512)
+    lengths = [len(ids) for ids in enc["input_ids"]]
+    for n in lengths:
+        metrics.observe("tokens", n)
+    order = sorted(range(len(todo)), key=lambda j: lengths[j])
+
+    for chunk in _chunks(order, lengths, max(1, int(max_batch_tokens))):
+        batch = _pad(m, {k: [enc[k][j] for j in chunk] for k in enc.keys()})
+
+        # forward
+        metrics.observe("batch_size", len(chunk))
+        with metrics.timed("forward"):
+            logits, pooled = _forward(m, batch)
+
+        for row, j in enumerate(chunk):
+            i = todo[j]
+            out[i] = _result(m, texts[i], logits[row], None if pooled is None else pooled[row])
+    return out
+
+def classify(text: str) -> Dict[str, Any]:
+    return classify_batch([text])[0]
+
+def _pick_windows(n: int, cap: int) -> List[int]:
+    """evenly spaced window indices so a capped article is still covered end to end"""
+    if n <= cap:
+        return list(range(n))
+    if cap <= 1:
+        return [0]
+    step = (n - 1) / (cap - 1)
+    return sorted({round(i * step) for i in range(cap)})
+
+def _aggregate(logits: torch.Tensor, tok_counts: torch.Tensor, how: str, T: float) -> torch.Tensor:
+    if how == "max":
+        # most confident window wins
+        conf = torch.softmax(logits / T, dim=-1).max(dim=-1).values
+        return logits[int(torch.argmax(conf))]
+    if how == "weighted":
+        # windows weighted by how many real tokens they hold
+        w = tok_counts / tok_counts.sum()
+        return (logits * w.unsqueeze(-1)).sum(dim=0)
+    return logits.mean(dim=0)
+
+@torch.no_grad()
+def classify_long(text: str, aggregate: str = LONG_AGGREGATE, max_windows: int = LONG_MAX_WINDOWS,
+                  stride: int = LONG_STRIDE) -> Dict[str, Any]:
+    """
+    sliding-window classify for articles longer than one 512-token window.
+    windows overlap by `stride` tokens and go through the model in batched forward
+    passes; window logits are combined (`mean`, `weighted` or `max`) before
+    temperature scaling. per-window probabilities come back under "windows"
+    """
+    _check_aggregate(aggregate)
+    if not text or not text.strip():
+        return _empty_result()
+    m = get_model()
+
+    with metrics.timed("tokenize"):
+        enc = m.tokenizer(text, truncation=True, max_length=512, stride=max(0, min(stride, 255)),
+                        return_overflowing_tokens=True, return_offsets_mapping=True)
+    metrics.observe("tokens", sum(len(ids) for ids in enc["input_ids"]))
+    keep = _pick_windows(len(enc["input_ids"]), max(1, int(max_windows)))
+    feats = {k: [enc[k][i] for i in keep] for k in ("input_ids", "token_type_ids", "attention_mask") if k in enc}
+
+    # all windows are the same width except the last, so chunking is by count
+    per_pass = max(1, MAX_BATCH_TOKENS // 512)
+    parts, pooled_parts = [], []
+    for lo in range(0, len(keep), per_pass):
+        batch = _pad(m, {k: rows[lo:lo + per_pass] for k, rows in feats.items()})
+        metrics.observe("batch_size", len(batch["input_ids"]))
+        with metrics.timed("forward"):
+            logits_part, pooled_part = _forward(m, batch)
+        parts.append(logits_part)
+        pooled_parts.append(pooled_part)
+    logits = torch.cat(parts, dim=0)
+
+    tok_counts = torch.tensor([float(sum(mask)) for mask in feats["attention_mask"]])
+    # the article vector is the token-weighted mean of its window vectors
+    pooled = None
+    if all(p is not None for p in pooled_parts):
+        pooled = (torch.cat(pooled_parts, dim=0) * (tok_counts / tok_counts.sum()).unsqueeze(-1)).sum(dim=0)
+    out = _result(m, text, _aggregate(logits, tok_counts, aggregate, m.T), pooled)
 
+    id2label = _id2label(m)
+    window_probs = torch.softmax(logits / m.T, dim=-1).tolist()
+    windows = []
+    for row, i in enumerate(keep):
+        spans = [o for o in enc["offset_mapping"][i] if o[1] > o[0]]
+        windows.append({
+            "start": spans[0][0] if spans else 0,
+            "end": spans[-1][1] if spans else 0,
+            "tokens": int(tok_counts[row]),
+            "probs": {id2label[c]: round(float(p), 4) for c, p in enumerate(window_probs[row])},
+        })
+    out["windows"] = windows
+    out["n_windows"] = len(enc["input_ids"])
+    out["aggregate"] = aggregate
+    return out
@@ -0,0 +1,272 @@
+"""Offline bulk scorer: re-score a CSV/JSONL archive with worker processes, resumable from a checkpoint."""
+from __future__ import annotations
+import os, io, csv, sys, json, time, argparse, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+# nothing heavy at import time: spawned workers re-import this module, and
+# TORCH_THREADS has to be set before app.bias_model is imported
+
+_TEXT_COLS = ("text", "body", "content", "article")
+_TITLE_COLS = ("title", "heading", "headline")
+_ID_COLS = ("id", "url", "link", "request_id")
+
+# (row number, id, title, text)
+Row = Tuple[int, Optional[str], str, str]
+
+# -------- input ----------
+def _pick(keys: List[str], wanted: Optional[str], candidates: Tuple[str, ...]) -> Optional[str]:
+    if wanted:
+        return wanted
+    lower = {k.lower(): k for k in keys}
+    for c in candidates:
+        if c in lower:
+            return lower[c]
+    return None
+
+def _input_format(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith((".csv", ".tsv")) else "jsonl"
+
+def read_rows(path: str, fmt: str, text_col: Optional[str] = None, title_col: Optional[str] = None,
+              id_col: Optional[str] = None, skip: int = 0) -> Iterator[Row]:
+    """yields rows one at a time; the first `skip` rows are read past without parsing text"""
+    cols: Dict[str, Optional[str]] = {}
+
+    def row_of(n: int, rec: Dict[str, Any]) -> Row:
+        if not cols:
+            keys = list(rec.keys())
+            cols["text"] = _pick(keys, text_col, _TEXT_COLS)
+            cols["title"] = _pick(keys, title_col, _TITLE_COLS)
+            cols["id"] = _pick(keys, id_col, _ID_COLS)
+        get = lambda c: "" if not c or rec.get(c) is None else str(rec.get(c))
+        return n, (get(cols["id"]) or None), get(cols["title"]).strip(), get(cols["text"]).strip()
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            reader = csv.DictReader(f, delimiter="\t" if path.lower().endswith(".tsv") else ",")
+            for n, rec in enumerate(reader):
+                if n >= skip:
+                    yield row_of(n, rec)
+        else:
+            for n, line in enumerate(f):
+                if n < skip:
+                    continue
+                try:
+                    rec = json.loads(line) if line.strip() else {}
+                except json.JSONDecodeError:
+                    rec = {}
+                yield row_of(n, rec if isinstance(rec, dict) else {})
+
+def _chunked(rows: Iterator[Row], size: int) -> Iterator[List[Row]]:
+    buf: List[Row] = []
+    for r in rows:
+        buf.append(r)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+# -------- workers ----------
+_worker_opts: Dict[str, Any] = {}
+
+def _init_worker(threads: int, opts: Dict[str, Any]) -> None:
+    os.environ["TORCH_THREADS"] = str(threads)
+    _worker_opts.update(opts)
+    from . import bias_model
+    bias_model.get_model()
+
+def score_chunk(rows: List[Row]) -> List[Dict[str, Any]]:
+    """classify a chunk in the current process; one output record per input row"""
+    from .bias_model import classify_batch, classify_long
+    chunked = _worker_opts.get("chunked", False)
+    spans = _worker_opts.get("spans", False)
+
+    texts = [((title + "\n\n" + text).strip() if text else "") for _, _, title, text in rows]
+    todo = [i for i, t in enumerate(texts) if t]
+    if chunked:
+        results = [classify_long(texts[i]) for i in todo]
+    else:
+        results = classify_batch([texts[i] for i in todo], _worker_opts.get("max_batch_tokens") or 16384)
+
+    out: List[Dict[str, Any]] = []
+    by_row = dict(zip(todo, results))
+    for i, (n, rid, _, _) in enumerate(rows):
+        res = by_row.get(i)
+        rec: Dict[str, Any] = {"row": n, "id": rid}
+        if res is None:
+            rec["error"] = "no text"
+        else:
+            rec.update(label=res["label"], confidence=float(res["confidence"]),
+                       probs={k: round(v, 4) for k, v in (res.get("probs") or {}).items()})
+            if chunked:
+                rec["n_windows"] = res.get("n_windows")
+            if spans:
+                rec["spans"] = res.get("rationale_spans", [])
+        out.append(rec)
+    return out
+
+# -------- output + checkpoint ----------
+_CSV_FIELDS = ["row", "id", "label", "confidence", "p_left", "p_center", "p_right", "error"]
+
+def _csv_line(rec: Dict[str, Any]) -> str:
+    probs = {k.lower(): v for k, v in (rec.get("probs") or {}).items()}
+    buf = io.StringIO()
+    csv.writer(buf).writerow([rec.get("row"), rec.get("id") or "", rec.get("label", ""), rec.get("confidence", ""),
+                              probs.get("left", ""), probs.get("center", ""), probs.get("right", ""),
+                              rec.get("error", "")])
+    return buf.getvalue()
+
+def _ckpt_path(output: str) -> str:
+    return output + ".ckpt.json"
+
+def _load_ckpt(output: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_ckpt_path(output)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_ckpt(output: str, state: Dict[str, Any]) -> None:
+    tmp = _ckpt_path(output) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, _ckpt_path(output))
+
+def _signature(args, in_fmt: str, out_fmt: str) -> Dict[str, Any]:
+    # a checkpoint only resumes the same job
+    from .bias_model import CKPT, TOKENIZER_ID
+    st = os.stat(args.input)
+    return {"input": os.path.abspath(args.input), "input_size": st.st_size, "input_mtime": int(st.st_mtime),
+            "in_format": in_fmt, "out_format": out_fmt, "model": CKPT, "tokenizer": TOKENIZER_ID,
+            "chunked": args.chunked, "spans": args.spans}
+
+# -------- driver ----------
+class _Progress:
+    def __init__(self, done: int, every_s: float):
+        self.t0 = time.perf_counter()
+        self.start = done
+        self.done = done
+        self.every_s = every_s
+        self.last = (self.t0, done)
+
+    def update(self, n: int, final: bool = False) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if not final and now - self.last[0] < self.every_s:
+            return
+        recent = (self.done - self.last[1]) / max(1e-9, now - self.last[0])
+        print(f"{self.done} rows  {self.rate():.1f} rows/s overall  {recent:.1f} rows/s recent", file=sys.stderr)
+        self.last = (now, self.done)
+
+    def rate(self) -> float:
+        return (self.done - self.start) / max(1e-9, time.perf_counter() - self.t0)
+
+def run(args) -> Dict[str, Any]:
+    in_fmt = _input_format(args.input, args.input_format)
+    out_fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    workers = args.workers if args.workers is not None else max(1, (os.cpu_count() or 2) // 2)
+    threads = args.threads or max(1, (os.cpu_count() or 2) // max(1, workers))
+    if workers == 0:
+        os.environ.setdefault("TORCH_THREADS", str(threads))
+    sig = _signature(args, in_fmt, out_fmt)
+
+    ckpt = None if args.restart else _load_ckpt(args.output)
+    if ckpt and ckpt.get("signature") != sig:
+        raise SystemExit(f"{_ckpt_path(args.output)} belongs to a different job (input, model or options changed); "
+                         f"pass --restart to overwrite {args.output}")
+    if ckpt is None and not args.restart and os.path.exists(args.output) and os.path.getsize(args.output):
+        raise SystemExit(f"{args.output} exists without a checkpoint; pass --restart to overwrite it")
+    rows_done = ckpt["rows_done"] if ckpt else 0
+    skipped = ckpt.get("skipped", 0) if ckpt else 0
+
+    out = open(args.output, "r+" if ckpt else "w", encoding="utf-8", newline="")
+    if ckpt:
+        # drop anything written after the last checkpoint
+        out.truncate(ckpt["output_bytes"])
+        out.seek(ckpt["output_bytes"])
+        print(f"resuming at row {rows_done}", file=sys.stderr)
+    elif out_fmt == "csv":
+        csv.writer(out).writerow(_CSV_FIELDS)
+
+    opts = {"chunked": args.chunked, "spans": args.spans, "max_batch_tokens": args.max_batch_tokens}
+    chunks = _chunked(read_rows(args.input, in_fmt, args.text_col, args.title_col, args.id_col, skip=rows_done),
+                      args.chunk_size)
+    progress = _Progress(rows_done, args.progress_s)
+
+    def flush(recs: List[Dict[str, Any]]) -> None:
+        nonlocal rows_done, skipped
+        for rec in recs:
+            out.write(_csv_line(rec) if out_fmt == "csv" else json.dumps(rec) + "\n")
+            skipped += "error" in rec
+        out.flush()
+        os.fsync(out.fileno())
+        rows_done = recs[-1]["row"] + 1
+        _save_ckpt(args.output, {"signature": sig, "rows_done": rows_done, "skipped": skipped,
+                                 "output_bytes": out.tell()})
+        progress.update(len(recs))
+
+    try:
+        if workers == 0:
+            _init_worker(threads, opts)
+            for chunk in chunks:
+                flush(score_chunk(chunk))
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_init_worker, initargs=(threads, opts)) as pool:
+                # bounded look-ahead keeps memory flat; results are written in input order
+                pending: List[Future] = []
+                try:
+                    for chunk in chunks:
+                        pending.append(pool.submit(score_chunk, chunk))
+                        while len(pending) >= workers * 2 or (pending and pending[0].done()):
+                            flush(pending.pop(0).result())
+                    for fut in pending:
+                        flush(fut.result())
+                except BaseException:
+                    # Ctrl-C etc.: don't wait for queued chunks, the checkpoint has what's written
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+    finally:
+        out.close()
+
+    progress.update(0, final=True)
+    report = {"output": args.output, "rows": rows_done, "skipped": skipped,
+              "rows_scored_this_run": progress.done - progress.start,
+              "seconds": round(time.perf_counter() - progress.t0, 2), "rows_per_s": round(progress.rate(), 2),
+              "workers": workers, "threads_per_worker": threads}
+    ckpt_state = _load_ckpt(args.output) or {"signature": sig, "rows_done": rows_done, "skipped": skipped,
+                                             "output_bytes": os.path.getsize(args.output)}
+    ckpt_state["complete"] = True
+    _save_ckpt(args.output, ckpt_state)
+    return report
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--input", required=True, help="CSV/TSV or JSONL")
+    ap.add_argument("--output", required=True, help=".jsonl or .csv (see --format)")
+    ap.add_argument("--input-format", choices=["csv", "jsonl"])
+    ap.add_argument("--format", choices=["jsonl", "csv"], help="output format (default: from --output suffix)")
+    ap.add_argument("--text-col")
+    ap.add_argument("--title-col")
+    ap.add_argument("--id-col")
+    ap.add_argument("--workers", type=int, help="worker processes, each with its own model; 0 = in-process")
+    ap.add_argument("--threads", type=int, help="torch threads per worker (default cpus / workers)")
+    ap.add_argument("--chunk-size", type=int, default=128, help="rows per worker task / checkpoint")
+    ap.add_argument("--max-batch-tokens", type=int, default=16384, help="padded tokens per forward pass")
+    ap.add_argument("--chunked", action="store_true", help="score long articles over sliding windows")
+    ap.add_argument("--spans", action="store_true", help="include rationale spans (JSONL only)")
+    ap.add_argument("--restart", action="store_true", help="ignore any checkpoint and overwrite the output")
+    ap.add_argument("--progress-s", type=float, default=10.0, help="seconds between progress lines")
+    args = ap.parse_args(argv)
+
+    report = run(args)
+    print(json.dumps(report))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+from __future__ import annotations
+import os, re, json, time, sqlite3, asyncio, hashlib, threading, unicodedata, logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+log = logging.getLogger("uvicorn.error")
+
+# result cache knobs; CACHE_DB_PATH adds an on-disk tier that survives restarts
+CACHE_ENABLED = str(os.getenv("CACHE_ENABLED", "1")).lower() in {"1", "true", "yes"}
+CACHE_MAX_ITEMS = int(os.getenv("CACHE_MAX_ITEMS", "4096"))
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "86400"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+
+def normalize_text(text: str) -> str:
+    """same article pasted twice should hash the same: NFC, collapsed whitespace"""
+    s = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", s).strip()
+
+def make_key(text: str, **settings: Any) -> str:
+    """content hash of the normalized text plus whatever settings change the result"""
+    h = hashlib.sha256()
+    h.update(normalize_text(text).encode("utf-8"))
+    h.update(b"\x00")
+    h.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+class _DiskTier:
+    """sqlite-backed second tier shared by every namespace"""
+
+    def __init__(self, path: str):
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL,"
+            " PRIMARY KEY (ns, key))"
+        )
+
+    def get(self, ns: str, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires FROM result_cache WHERE ns=? AND key=?", (ns, key)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._db.execute("DELETE FROM result_cache WHERE ns=? AND key=?", (ns, key))
+                return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, ns: str, key: str, value: Any, expires: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO result_cache (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+                (ns, key, json.dumps(value), expires),
+            )
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._db.execute("DELETE FROM result_cache WHERE expires < ?", (time.time(),)).rowcount
+
+    def clear(self, ns: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM result_cache WHERE ns=?", (ns,))
+
+    def count(self, ns: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM result_cache WHERE ns=?", (ns,)).fetchone()[0]
+
+_disk: Optional[_DiskTier] = None
+_disk_lock = threading.Lock()
+
+def _get_disk(path: str) -> Optional[_DiskTier]:
+    global _disk
+    if not path:
+        return None
+    with _disk_lock:
+        if _disk is None:
+            try:
+                _disk = _DiskTier(path)
+            except Exception as e:
+                log.warning(f"result cache disk tier disabled: {e}")
+                return None
+    return _disk
+
+class ResultCache:
+    """
+    In-memory LRU with a TTL, optionally backed by the sqlite tier.
+    Memory misses fall through to disk and disk hits are promoted.
+    """
+
+    def __init__(self, ns: str, max_items: int = CACHE_MAX_ITEMS, ttl_s: float = CACHE_TTL_S,
+                 db_path: str = CACHE_DB_PATH):
+        self.ns = ns
+        self.max_items = max(1, int(max_items))
+        self.ttl_s = float(ttl_s)
+        self._db_path = db_path
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _memory_get(self, key: str) -> tuple:
+        """(found, value) from the in-memory tier"""
+        now = time.time()
+        with self._lock:
+            item = self._lru.get(key)
+            if item is not None:
+                expires, value = item
+                if expires >= now:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._lru[key]
+                self.expirations += 1
+        return False, None
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        disk = _get_disk(self._db_path)
+        found = disk.get(self.ns, key) if disk else None
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put(key, found[0], found[1])
+        return found[0]
+
+    def _disk_set(self, key: str, value: Any, expires: float) -> None:
+        disk = _get_disk(self._db_path)
+        if disk:
+            try:
+                disk.set(self.ns, key, value, expires)
+            except Exception as e:
+                log.warning(f"result cache write failed: {e}")
+
+    def get(self, key: str) -> Optional[Any]:
+        found, value = self._memory_get(key)
+        return value if found else self._disk_get(key)
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl_s
+        with self._lock:
+            self._put(key, value, expires)
+        self._disk_set(key, value, expires)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() for the event loop: the memory tier inline, the sqlite tier on a worker thread"""
+        found, value = self._memory_get(key)
+        if found:
+            return value
+        if not self._db_path:
+            return self._disk_get(key)
+        return await asyncio.to_thread(self._disk_get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl_s
+        with self._lock:
+            self._put(key, value, expires)
+        if self._db_path:
+            await asyncio.to_thread(self._disk_set, key, value, expires)
+
+    def _put(self, key: str, value: Any, expires: float) -> None:
+        self._lru[key] = (expires, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+        disk = _get_disk(self._db_path)
+        if disk:
+            disk.clear(self.ns)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            out = {
+                "size": len(self._lru),
+                "max_items": self.max_items,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+        disk = _get_disk(self._db_path)
+        if disk:
+            out["disk_size"] = disk.count(self.ns)
+        return out
+
+classify_cache = ResultCache("classify")
+summary_cache = ResultCache("summary")
+
+def stats() -> Dict[str, Any]:
+    if not CACHE_ENABLED:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "disk_path": CACHE_DB_PATH or None,
+        "classify": classify_cache.stats(),
+        "summary": summary_cache.stats(),
+    }
+
+def clear() -> None:
+    classify_cache.clear()
+    summary_cache.clear()
+    disk = _get_disk(CACHE_DB_PATH)
+    if disk:
+        disk.purge_expired()
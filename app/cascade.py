@@ -0,0 +1,387 @@
+"""Confidence-gated cascade: a hashed n-gram linear model answers confident articles before BERT."""
+from __future__ import annotations
+import os, re, csv, sys, json, math, time, zlib, random, logging, argparse, threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from .config import DATA_DIR
+from .lexicon import find_spans
+from . import metrics
+
+log = logging.getLogger("uvicorn.error")
+
+CASCADE_ENABLED = str(os.getenv("CASCADE_ENABLED", "0")).lower() in {"1", "true", "yes"}
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH", os.path.join(DATA_DIR, "cascade.npz"))
+# calibrated confidence the linear model needs before it may answer
+CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.9"))
+
+LABELS = ["Left", "Center", "Right"]
+_MAX_CHARS = 20000
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# -------- features ----------
+def _hash(tok: str) -> int:
+    return zlib.crc32(tok.encode("utf-8"))
+
+def featurize(text: str, bits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    signed hashed unigrams + bigrams, sublinear tf, L2-normalised, plus a
+    constant bias feature (so no row is ever empty)
+    """
+    words = _WORD.findall((text or "")[:_MAX_CHARS].lower())
+    counts: Dict[int, float] = {}
+    mask = (1 << bits) - 1
+    for tok in words + [a + " " + b for a, b in zip(words, words[1:])]:
+        h = _hash(tok)
+        idx = h & mask
+        counts[idx] = counts.get(idx, 0.0) + (1.0 if (h >> 31) & 1 else -1.0)
+    idx = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    val = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    val = np.sign(val) * (1.0 + np.log(np.abs(val) + (val == 0)))   # sublinear tf
+    norm = float(np.sqrt((val * val).sum()))
+    if norm > 0:
+        val /= norm
+    return np.append(idx, 0), np.append(val, np.float32(1.0))   # slot 0 doubles as the bias
+
+def featurize_many(texts: List[str], bits: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR arrays (indptr, indices, data) for a list of texts"""
+    rows = [featurize(t, bits) for t in texts]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(i) for i, _ in rows])
+    if not rows:
+        return indptr, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return indptr, np.concatenate([i for i, _ in rows]), np.concatenate([v for _, v in rows])
+
+def _logits(W: np.ndarray, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray) -> np.ndarray:
+    contrib = W[indices] * data[:, None]
+    return np.add.reduceat(contrib, indptr[:-1] - indptr[0], axis=0)
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+# -------- model ----------
+class LinearModel:
+    """multinomial logistic regression over hashed features, with a calibration temperature"""
+
+    def __init__(self, W: np.ndarray, bits: int, T: float = 1.0, meta: Optional[Dict[str, Any]] = None):
+        self.W = W.astype(np.float32, copy=False)
+        self.bits = bits
+        self.T = float(T)
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: str) -> "LinearModel":
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            return cls(z["W"], int(meta["bits"]), float(meta["temperature"]), meta)
+
+    def save(self, path: str) -> None:
+        meta = dict(self.meta, bits=self.bits, temperature=self.T, labels=LABELS)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, W=self.W, meta=np.array(json.dumps(meta)))
+        os.replace(tmp, path)
+
+    def logits(self, texts: List[str]) -> np.ndarray:
+        return _logits(self.W, *featurize_many(texts, self.bits))
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        return _softmax(self.logits(texts) / self.T)
+
+def train(texts: List[str], labels: List[int], bits: int = 18, epochs: int = 8, lr: float = 0.5,
+          l2: float = 1e-6, batch_size: int = 256, seed: int = 0) -> LinearModel:
+    """sparse AdaGrad on softmax cross-entropy; only touched rows of W are updated"""
+    rng = np.random.default_rng(seed)
+    indptr, indices, data = featurize_many(texts, bits)
+    y = np.asarray(labels, dtype=np.int64)
+    n = len(y)
+    W = np.zeros((1 << bits, len(LABELS)), dtype=np.float32)
+    H = np.full_like(W, 1e-8)
+    for _ in range(epochs):
+        order = rng.permutation(n)
+        for s in range(0, n, batch_size):
+            rows = order[s:s + batch_size]
+            starts, ends = indptr[rows], indptr[rows + 1]
+            take = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+            lens = ends - starts
+            sub_ptr = np.concatenate([[0], np.cumsum(lens)])
+            idx, val = indices[take], data[take]
+            G = _softmax(_logits(W, sub_ptr, idx, val))
+            G[np.arange(len(rows)), y[rows]] -= 1.0
+            G /= len(rows)
+            contrib = np.repeat(G, lens, axis=0) * val[:, None]
+            u, inv = np.unique(idx, return_inverse=True)
+            g = np.stack([np.bincount(inv, weights=contrib[:, k], minlength=len(u))
+                          for k in range(W.shape[1])], axis=1).astype(np.float32)
+            g += l2 * W[u]
+            H[u] += g * g
+            W[u] -= lr * g / np.sqrt(H[u])
+    return LinearModel(W, bits)
+
+def fit_temperature(logits: np.ndarray, labels: List[int]) -> float:
+    """golden-section search for the T minimising held-out NLL"""
+    y = np.asarray(labels)
+
+    def nll(log_t: float) -> float:
+        p = _softmax(logits / math.exp(log_t))
+        return float(-np.log(p[np.arange(len(y)), y] + 1e-12).mean())
+
+    lo, hi = -3.0, 3.0
+    g = (math.sqrt(5) - 1) / 2
+    a, b = hi - g * (hi - lo), lo + g * (hi - lo)
+    for _ in range(60):
+        if nll(a) < nll(b):
+            hi = b
+        else:
+            lo = a
+        a, b = hi - g * (hi - lo), lo + g * (hi - lo)
+    return math.exp((lo + hi) / 2)
+
+# -------- serving ----------
+_model: Optional[LinearModel] = None
+_model_error: Optional[str] = None
+_lock = threading.Lock()
+
+def get_model() -> Optional[LinearModel]:
+    """the linear model, or None when the cascade is off or the file can't be loaded"""
+    global _model, _model_error
+    if not CASCADE_ENABLED:
+        return None
+    if _model is None and _model_error is None:
+        with _lock:
+            if _model is None and _model_error is None:
+                try:
+                    t0 = time.perf_counter()
+                    _model = LinearModel.load(CASCADE_MODEL_PATH)
+                    log.info(f"cascade model loaded in {(time.perf_counter() - t0) * 1000:.1f} ms")
+                except Exception as e:
+                    _model_error = str(e)
+                    log.warning(f"cascade disabled, can't load {CASCADE_MODEL_PATH}: {e}")
+    return _model
+
+def signature() -> Optional[Dict[str, Any]]:
+    """what a cascade answer depends on (for result cache keys); None when off"""
+    m = get_model()
+    if m is None:
+        return None
+    return {"path": CASCADE_MODEL_PATH, "trained": m.meta.get("trained_at"), "threshold": CASCADE_THRESHOLD}
+
+def gate(texts: List[str], threshold: Optional[float] = None) -> List[Optional[Dict[str, Any]]]:
+    """
+    linear-model results for the texts it is confident about, None for the
+    rest (those escalate to BERT). Same shape as bias_model results plus "stage".
+    """
+    m = get_model()
+    if m is None or not texts:
+        return [None] * len(texts)
+    thr = CASCADE_THRESHOLD if threshold is None else threshold
+    with metrics.timed("cascade"):
+        probs = m.predict_proba(texts)
+    out: List[Optional[Dict[str, Any]]] = []
+    for text, p in zip(texts, probs):
+        k = int(p.argmax())
+        if not text or not text.strip() or p[k] < thr:
+            metrics.inc("cascade_total", stage="bert")
+            out.append(None)
+            continue
+        metrics.inc("cascade_total", stage="linear")
+        with metrics.timed("spans"):
+            spans = find_spans(text, 6)
+        out.append({
+            "label": LABELS[k],
+            "confidence": round(float(p[k]), 3),
+            "probs": {LABELS[i]: float(p[i]) for i in range(len(LABELS))},
+            "rationale_spans": spans,
+            "stage": "linear",
+        })
+    return out
+
+def stats() -> Dict[str, Any]:
+    m = get_model()
+    return {
+        "enabled": CASCADE_ENABLED,
+        "loaded": m is not None,
+        "error": _model_error,
+        "path": CASCADE_MODEL_PATH,
+        "threshold": CASCADE_THRESHOLD,
+        "meta": {k: v for k, v in (m.meta if m else {}).items() if k != "labels"},
+    }
+
+# -------- CLI ----------
+_TEXT_COLS = ("text", "body", "content", "article")
+_TITLE_COLS = ("title", "heading", "headline")
+_LABEL_COLS = ("bias_rating", "label", "bias", "rating")
+
+def _pick(keys: List[str], wanted: Optional[str], candidates: Tuple[str, ...]) -> Optional[str]:
+    if wanted:
+        return wanted
+    lower = {k.lower(): k for k in keys}
+    return next((lower[c] for c in candidates if c in lower), None)
+
+def load_labelled(path: str, text_col: Optional[str] = None, label_col: Optional[str] = None,
+                  title_col: Optional[str] = None, limit: Optional[int] = None) -> Tuple[List[str], List[Optional[int]]]:
+    """(title + text, label id or None) from CSV or JSONL, rows without text dropped"""
+    ids = {l.lower(): i for i, l in enumerate(LABELS)}
+    texts: List[str] = []
+    labels: List[Optional[int]] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        cols = None
+        for rec in records:
+            if cols is None:
+                keys = list(rec.keys())
+                cols = (_pick(keys, text_col, _TEXT_COLS), _pick(keys, title_col, _TITLE_COLS),
+                        _pick(keys, label_col, _LABEL_COLS))
+                if not cols[0]:
+                    raise SystemExit(f"no text column in {path}; pass --text-col (columns: {keys})")
+            tcol, hcol, lcol = cols
+            text = str(rec.get(tcol) or "").strip()
+            if not text:
+                continue
+            title = str(rec.get(hcol) or "").strip() if hcol else ""
+            texts.append((title + "\n\n" + text).strip())
+            labels.append(ids.get(str(rec.get(lcol) or "").strip().lower()) if lcol else None)
+            if limit and len(texts) >= limit:
+                break
+    return texts, labels
+
+def _ece(probs: np.ndarray, y: np.ndarray, bins: int = 15) -> float:
+    conf, pred = probs.max(axis=1), probs.argmax(axis=1)
+    ece = 0.0
+    for lo, hi in zip(np.linspace(0, 1, bins + 1)[:-1], np.linspace(0, 1, bins + 1)[1:]):
+        m = (conf > lo) & (conf <= hi)
+        if m.any():
+            ece += m.mean() * abs(conf[m].mean() - (pred[m] == y[m]).mean())
+    return float(ece)
+
+def cmd_train(args) -> Dict[str, Any]:
+    texts, labels = load_labelled(args.csv, args.text_col, args.label_col, args.title_col)
+    keep = [i for i, l in enumerate(labels) if l is not None]
+    if not keep:
+        raise SystemExit("no labelled rows (labels must be left/center/right)")
+    random.Random(args.seed).shuffle(keep)
+    n_val = max(1, int(len(keep) * args.val_frac))
+    val, tr = keep[:n_val], keep[n_val:]
+
+    t0 = time.perf_counter()
+    model = train([texts[i] for i in tr], [labels[i] for i in tr], bits=args.bits, epochs=args.epochs,
+                  lr=args.lr, l2=args.l2, seed=args.seed)
+    train_s = time.perf_counter() - t0
+    val_logits = model.logits([texts[i] for i in val])
+    y_val = np.asarray([labels[i] for i in val])
+    model.T = fit_temperature(val_logits, y_val)
+    probs = _softmax(val_logits / model.T)
+
+    report = {
+        "n_train": len(tr), "n_val": len(val), "bits": args.bits, "epochs": args.epochs,
+        "val_accuracy": round(float((probs.argmax(1) == y_val).mean()), 4),
+        "val_ece_raw": round(_ece(_softmax(val_logits), y_val), 4),
+        "val_ece": round(_ece(probs, y_val), 4),
+        "temperature": round(model.T, 4),
+        "train_s": round(train_s, 2),
+        # share of validation rows above each threshold, and accuracy on them
+        "coverage": {str(t): {"answered": round(float((probs.max(1) >= t).mean()), 4),
+                              "accuracy": round(float((probs.argmax(1) == y_val)[probs.max(1) >= t].mean()), 4)
+                              if (probs.max(1) >= t).any() else None}
+                     for t in (0.6, 0.7, 0.8, 0.9, 0.95)},
+    }
+    model.meta = {"trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "source": args.csv,
+                  **{k: report[k] for k in ("n_train", "val_accuracy", "val_ece")}}
+    model.save(args.out)
+    report["out"] = args.out
+    return report
+
+def cmd_sweep(args) -> Dict[str, Any]:
+    """
+    run both stages over every row once, then work out per threshold how many
+    rows the linear model would answer, the resulting accuracy (or agreement
+    with BERT when there are no labels) and the throughput of the mix
+    """
+    texts, labels = load_labelled(args.csv, args.text_col, args.label_col, args.title_col, args.limit)
+    if not texts:
+        raise SystemExit("no rows with text")
+    model = LinearModel.load(args.model)
+
+    t0 = time.perf_counter()
+    lin = model.predict_proba(texts)
+    lin_s = time.perf_counter() - t0
+
+    from .bias_model import classify_batch, get_model as get_bert
+    get_bert()
+    t0 = time.perf_counter()
+    bert = classify_batch(texts)
+    bert_s = time.perf_counter() - t0
+    bert_pred = np.asarray([LABELS.index(r["label"].title()) if r["label"].title() in LABELS else -1 for r in bert])
+
+    lin_pred, lin_conf = lin.argmax(1), lin.max(1)
+    labelled = np.asarray([l is not None for l in labels])
+    y = np.asarray([-1 if l is None else l for l in labels])
+    ref, ref_name = (y, "accuracy") if labelled.all() else (bert_pred, "agreement_with_bert")
+
+    n = len(texts)
+    per_lin, per_bert = lin_s / n, bert_s / n
+    rows = []
+    for t in [float(x) for x in args.thresholds.split(",")]:
+        ans = lin_conf >= t
+        final = np.where(ans, lin_pred, bert_pred)
+        cost = n * per_lin + (~ans).sum() * per_bert
+        rows.append({
+            "threshold": t,
+            "linear_share": round(float(ans.mean()), 4),
+            ref_name: round(float((final == ref).mean()), 4),
+            "linear_" + ref_name: round(float((lin_pred[ans] == ref[ans]).mean()), 4) if ans.any() else None,
+            "items_per_s": round(n / cost, 1) if cost else None,
+            "speedup_vs_bert": round(bert_s / cost, 2) if cost else None,
+        })
+    report = {
+        "n": n, "metric": ref_name,
+        "bert_" + ref_name: round(float((bert_pred == ref).mean()), 4),
+        "bert_items_per_s": round(n / bert_s, 1), "linear_items_per_s": round(n / lin_s, 1),
+        "sweep": rows,
+    }
+    for r in rows:
+        print(f"t={r['threshold']:<5} linear {r['linear_share']:>6.1%}  {ref_name} {r[ref_name]:.4f}  "
+              f"{r['items_per_s']:>8} items/s  x{r['speedup_vs_bert']}", file=sys.stderr)
+    return report
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("train", "sweep"):
+        p = sub.add_parser(name)
+        p.add_argument("--csv", required=True, help="CSV or JSONL with text (+ title) and label columns")
+        p.add_argument("--text-col")
+        p.add_argument("--title-col")
+        p.add_argument("--label-col")
+        p.add_argument("--json-out", help="write the report here too")
+    t = sub.choices["train"]
+    t.add_argument("--out", default=CASCADE_MODEL_PATH)
+    t.add_argument("--bits", type=int, default=18, help="hash space is 2**bits features")
+    t.add_argument("--epochs", type=int, default=8)
+    t.add_argument("--lr", type=float, default=0.5)
+    t.add_argument("--l2", type=float, default=1e-6)
+    t.add_argument("--val-frac", type=float, default=0.15, help="held out for calibration")
+    t.add_argument("--seed", type=int, default=0)
+    s = sub.choices["sweep"]
+    s.add_argument("--model", default=CASCADE_MODEL_PATH)
+    s.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.85,0.9,0.95,0.99")
+    s.add_argument("--limit", type=int, help="only the first N rows")
+    args = ap.parse_args(argv)
+
+    report = cmd_train(args) if args.cmd == "train" else cmd_sweep(args)
+    out = json.dumps(report, indent=2)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            f.write(out)
+    print(out)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -12,3 +12,6 @@ QBIAS_CSV = os.path.join(DATA_DIR, "./data/qbias_articles.csv")
 
 SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "1") == "1"
 HF_ENABLED = os.getenv("HF_ENABLED", "0") == "1"
+
+# intra-op threads per torch forward pass; executor pool sizes are derived from it
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0")) or max(1, min(4, os.cpu_count() or 2))
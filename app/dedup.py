@@ -0,0 +1,171 @@
+"""MinHash/LSH near-duplicate index so syndicated copies reuse an earlier result."""
+from __future__ import annotations
+import os, re, json, time, zlib, hashlib, threading, unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import CACHE_TTL_S
+from . import metrics
+
+DEDUP_ENABLED = str(os.getenv("DEDUP_ENABLED", "1")).lower() in {"1", "true", "yes"}
+# estimated Jaccard similarity of word shingles needed to reuse a result
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "128"))
+DEDUP_SHINGLE = int(os.getenv("DEDUP_SHINGLE", "5"))
+DEDUP_MAX_ITEMS = int(os.getenv("DEDUP_MAX_ITEMS", "20000"))
+# texts shorter than this aren't indexed: a few shared words say little
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "50"))
+
+_PRIME = np.uint64(4294967311)   # smallest prime above 2**32
+_WORD = re.compile(r"\w+")
+
+def _band_shape(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows == num_perm whose LSH S-curve midpoint
+    (1/b)^(1/r) is the highest one not above the threshold, so near-duplicates
+    become candidates and the signature comparison does the final filtering
+    """
+    best = (num_perm, 1)
+    for r in range(1, num_perm + 1):
+        if num_perm % r:
+            continue
+        b = num_perm // r
+        if (1.0 / b) ** (1.0 / r) <= threshold:
+            best = (b, r)
+    return best
+
+def _settings_key(settings: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+class NearDupIndex:
+    """MinHash + LSH over word shingles, bounded LRU of (signature, value)"""
+
+    def __init__(self, ns: str, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 shingle: int = DEDUP_SHINGLE, max_items: int = DEDUP_MAX_ITEMS,
+                 ttl_s: float = CACHE_TTL_S, min_words: int = DEDUP_MIN_WORDS, seed: int = 1):
+        self.ns = ns
+        self.threshold = float(threshold)
+        self.shingle = max(1, int(shingle))
+        self.max_items = max(1, int(max_items))
+        self.ttl_s = float(ttl_s)
+        self.min_words = int(min_words)
+        self.bands, self.rows = _band_shape(int(num_perm), self.threshold)
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and hashes < 2**32 keep a*x + b inside uint64
+        self._a = rng.integers(1, 2 ** 31, size=self.bands * self.rows, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=self.bands * self.rows, dtype=np.uint64)
+        self._items: "OrderedDict[int, tuple]" = OrderedDict()   # id -> (expires, sig, band keys, value)
+        self._buckets: Dict[tuple, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature, or None when the text is too short to index"""
+        words = _WORD.findall(unicodedata.normalize("NFKC", text or "").lower())
+        if len(words) < max(self.min_words, self.shingle):
+            return None
+        k = self.shingle
+        shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+        hv = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(hv, self._a) + self._b) % _PRIME).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray, skey: str) -> List[tuple]:
+        r = self.rows
+        return [(skey, i, sig[i * r:(i + 1) * r].tobytes()) for i in range(self.bands)]
+
+    def lookup(self, text: str, **settings: Any) -> Tuple[Optional[np.ndarray], Optional[Any]]:
+        """
+        (signature, value of the most similar live entry or None).
+        pass the signature back to add() after computing a fresh result.
+        """
+        with metrics.timed("dedup"):
+            sig = self.signature(text)
+        if sig is None:
+            with self._lock:
+                self.skipped += 1
+            return None, None
+        keys = self._band_keys(sig, _settings_key(settings))
+        now = time.time()
+        best, best_sim = None, self.threshold - 1e-9
+        with self._lock:
+            candidates = set()
+            for bk in keys:
+                candidates |= self._buckets.get(bk, set())
+            for item_id in candidates:
+                expires, other, _, value = self._items[item_id]
+                if expires < now:
+                    continue
+                sim = float((other == sig).mean())
+                if sim >= best_sim:
+                    best, best_sim = item_id, sim
+            if best is None:
+                self.misses += 1
+                metrics.inc("dedup_total", index=self.ns, result="miss")
+                return sig, None
+            self._items.move_to_end(best)
+            self.hits += 1
+            value = self._items[best][3]
+        metrics.inc("dedup_total", index=self.ns, result="hit")
+        return sig, value
+
+    def add(self, sig: Optional[np.ndarray], value: Any, **settings: Any) -> None:
+        if sig is None:
+            return
+        keys = self._band_keys(sig, _settings_key(settings))
+        with self._lock:
+            item_id = self._next_id
+            self._next_id += 1
+            self._items[item_id] = (time.time() + self.ttl_s, sig, keys, value)
+            for bk in keys:
+                self._buckets.setdefault(bk, set()).add(item_id)
+            while len(self._items) > self.max_items:
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def _drop(self, item_id: int) -> None:
+        _, _, keys, _ = self._items.pop(item_id)
+        for bk in keys:
+            bucket = self._buckets.get(bk)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del self._buckets[bk]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_items": self.max_items,
+                "threshold": self.threshold,
+                "bands": self.bands,
+                "rows": self.rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped_short": self.skipped,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+classify_index = NearDupIndex("classify")
+summary_index = NearDupIndex("summary")
+
+def stats() -> Dict[str, Any]:
+    if not DEDUP_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, "classify": classify_index.stats(), "summary": summary_index.stats()}
+
+def clear() -> None:
+    classify_index.clear()
+    summary_index.clear()
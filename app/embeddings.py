@@ -0,0 +1,276 @@
+"""Article vectors captured from the classify pass, stored per model, with exact and IVF similarity search."""
+from __future__ import annotations
+import os, json, time, base64, hashlib, threading, logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:   # Windows: one process per store
+    fcntl = None
+
+from .config import DATA_DIR
+
+log = logging.getLogger("uvicorn.error")
+
+# vectors are only kept for stored predictions, so this also needs STORE_ENABLED
+EMBED_ENABLED = str(os.getenv("EMBED_ENABLED", "1")).lower() in {"1", "true", "yes"}
+EMBED_DIR = os.getenv("EMBED_DIR", os.path.join(DATA_DIR, "embeddings"))
+# float16 (2 bytes/dim) or int8 (1 byte/dim plus a per-row scale)
+EMBED_DTYPE = os.getenv("EMBED_DTYPE", "float16").lower()
+# exact search up to this many rows, IVF above
+EMBED_EXACT_MAX = int(os.getenv("EMBED_EXACT_MAX", "20000"))
+# IVF buckets scanned per query
+EMBED_NPROBE = int(os.getenv("EMBED_NPROBE", "8"))
+
+_CHUNK_ROWS = 32768
+
+def encode(vec) -> str:
+    """1-D float vector -> base64 of the L2-normalised float16 vector (JSON-safe, ~2.7 bytes/dim)"""
+    v = np.asarray(vec, dtype=np.float32).reshape(-1)
+    v = v / (np.linalg.norm(v) or 1.0)
+    return base64.b64encode(v.astype(np.float16).tobytes()).decode("ascii")
+
+def decode(s: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(s), dtype=np.float16).astype(np.float32)
+
+def _top(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k)[:k]
+        scores, rows = scores[keep], rows[keep]
+    order = np.argsort(-scores, kind="stable")
+    return scores[order], rows[order]
+
+class _Ivf:
+    """inverted lists over rows [0, n) of a matrix"""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, n: int):
+        self.centroids = centroids   # nlist x D, unit rows
+        self.order = order           # row numbers grouped by list
+        self.offsets = offsets       # list i is order[offsets[i]:offsets[i + 1]]
+        self.n = n
+
+    @classmethod
+    def build(cls, rows_f32, n: int, seed: int = 0, iters: int = 10) -> "_Ivf":
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = rows_f32(np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False)))
+        cent = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ cent.T, axis=1)
+            sums = np.zeros_like(cent)
+            np.add.at(sums, assign, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            cent = np.where(empty[:, None], cent, sums / np.where(norms == 0, 1, norms))
+        assign = np.empty(n, dtype=np.int32)
+        for lo in range(0, n, _CHUNK_ROWS):
+            hi = min(n, lo + _CHUNK_ROWS)
+            assign[lo:hi] = np.argmax(rows_f32(slice(lo, hi)) @ cent.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+        return cls(cent.astype(np.float32), order, offsets, n)
+
+    def candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        near = np.argsort(-(self.centroids @ q))[:max(1, nprobe)]
+        return np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in near])
+
+class VectorIndex:
+    def __init__(self, model: str, root: str = EMBED_DIR, dtype: str = EMBED_DTYPE):
+        self.model = model
+        self.dtype = "int8" if dtype == "int8" else "float16"
+        self.dir = Path(root) / hashlib.sha1(model.encode()).hexdigest()[:12]
+        self._np = np.int8 if self.dtype == "int8" else np.float16
+        self._vec_path = self.dir / ("vectors.i8" if self.dtype == "int8" else "vectors.f16")
+        self._scale_path = self.dir / "scales.f32"
+        self._ids_path = self.dir / "ids.i64"
+        self.dim: Optional[int] = None
+        self._lock = threading.Lock()
+        self._view: Optional[tuple] = None   # (n, vectors, scales, ids)
+        self._ivf: Optional[_Ivf] = None
+        self._ivf_building = False
+        # prediction ids sorted, with the row each sits in; extended as rows are appended
+        self._by_id: Tuple[np.ndarray, np.ndarray] = (np.empty(0, np.int64), np.empty(0, np.int64))
+        self.appended = 0
+        self.searches = 0
+
+    # -------- writes ----------
+    def _meta(self, dim: int) -> None:
+        meta = self.dir / "meta.json"
+        if meta.exists():
+            have = json.loads(meta.read_text())
+            if have["dim"] != dim or have["dtype"] != self.dtype:
+                raise ValueError(f"{self.dir} holds dim={have['dim']} {have['dtype']} vectors, got dim={dim} {self.dtype}")
+        else:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            meta.write_text(json.dumps({"model": self.model, "dim": dim, "dtype": self.dtype}))
+        self.dim = dim
+
+    def append(self, ids: Sequence[int], vecs: np.ndarray) -> None:
+        """add rows (already L2-normalised) for these prediction ids"""
+        if not len(ids):
+            return
+        vecs = np.asarray(vecs, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self._meta(vecs.shape[1])
+            with open(self.dir / "append.lock", "a") as lf:
+                if fcntl:
+                    fcntl.flock(lf, fcntl.LOCK_EX)
+                # a writer that died between files leaves vectors longer than ids; cut back first
+                n = os.path.getsize(self._ids_path) // 8 if self._ids_path.exists() else 0
+                self._truncate(self._vec_path, n * self.dim * np.dtype(self._np).itemsize)
+                if self.dtype == "int8":
+                    self._truncate(self._scale_path, n * 4)
+                    scale = np.maximum(np.abs(vecs).max(axis=1), 1e-12) / 127.0
+                    q = np.round(vecs / scale[:, None]).astype(np.int8)
+                    with open(self._scale_path, "ab") as f:
+                        f.write(scale.astype(np.float32).tobytes())
+                else:
+                    q = vecs.astype(np.float16)
+                with open(self._vec_path, "ab") as f:
+                    f.write(q.tobytes())
+                with open(self._ids_path, "ab") as f:
+                    f.write(np.asarray(ids, dtype=np.int64).tobytes())
+            self.appended += len(ids)
+
+    @staticmethod
+    def _truncate(path: Path, size: int) -> None:
+        if path.exists() and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    # -------- reads ----------
+    def _current(self) -> Optional[tuple]:
+        """(n, vectors, scales, ids) memory maps, re-mapped when another writer grew the files"""
+        if not self._ids_path.exists():
+            return None
+        n = os.path.getsize(self._ids_path) // 8
+        view = self._view
+        if view is not None and view[0] == n:
+            return view
+        if self.dim is None:
+            self.dim = json.loads((self.dir / "meta.json").read_text())["dim"]
+        if n == 0:
+            return None
+        vecs = np.memmap(self._vec_path, dtype=self._np, mode="r", shape=(n, self.dim))
+        scales = np.memmap(self._scale_path, dtype=np.float32, mode="r", shape=(n,)) if self.dtype == "int8" else None
+        ids = np.memmap(self._ids_path, dtype=np.int64, mode="r", shape=(n,))
+        self._view = view = (n, vecs, scales, ids)
+        if self._ivf is None and n > EMBED_EXACT_MAX or self._ivf is not None and n > 2 * self._ivf.n:
+            self._start_ivf(view)
+        return view
+
+    @staticmethod
+    def _rows(view: tuple):
+        _, vecs, scales, _ = view
+
+        def rows_f32(idx) -> np.ndarray:
+            out = np.asarray(vecs[idx], dtype=np.float32)
+            return out * scales[idx][:, None] if scales is not None else out
+        return rows_f32
+
+    def _start_ivf(self, view: tuple) -> None:
+        with self._lock:
+            if self._ivf_building:
+                return
+            self._ivf_building = True
+
+        def run():
+            t0 = time.perf_counter()
+            try:
+                self._ivf = _Ivf.build(self._rows(view), view[0])
+                log.info(f"embedding IVF index: {view[0]} rows, {len(self._ivf.centroids)} lists "
+                         f"in {time.perf_counter() - t0:.1f}s")
+            except Exception as e:
+                log.warning(f"embedding IVF build failed: {e}")
+            finally:
+                self._ivf_building = False
+        threading.Thread(target=run, name="embedding-ivf", daemon=True).start()
+
+    def _rows_of(self, view: tuple, pred_ids: np.ndarray) -> np.ndarray:
+        """row of each prediction id, -1 where it has none"""
+        n, _, _, ids = view
+        with self._lock:
+            keys, rows = self._by_id
+            if len(keys) < n:
+                # workers append in commit order, not id order, so new rows are merged in rather than assumed last
+                new_rows = np.arange(len(keys), n)
+                new_keys = np.asarray(ids[len(keys):n])
+                order = np.argsort(new_keys, kind="stable")
+                at = np.searchsorted(keys, new_keys[order])
+                keys, rows = np.insert(keys, at, new_keys[order]), np.insert(rows, at, new_rows[order])
+                self._by_id = (keys, rows)
+        pos = np.minimum(np.searchsorted(keys, pred_ids), len(keys) - 1)
+        # another thread may have merged rows past this view
+        return np.where((keys[pos] == pred_ids) & (rows[pos] < n), rows[pos], -1)
+
+    def vector(self, pred_ids: Sequence[int]) -> Optional[np.ndarray]:
+        """the stored vector of the first of these prediction ids that has one"""
+        view = self._current()
+        if view is None or not len(pred_ids):
+            return None
+        hit = [r for r in self._rows_of(view, np.asarray(pred_ids, dtype=np.int64)) if r >= 0]
+        return self._rows(view)(np.asarray(hit[:1]))[0] if hit else None
+
+    def search(self, q: np.ndarray, k: int, exact: Optional[bool] = None) -> List[Tuple[int, float]]:
+        """(prediction id, cosine) of the k nearest rows, best first"""
+        view = self._current()
+        if view is None or k <= 0:
+            return []
+        n, _, _, ids = view
+        q = np.asarray(q, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        rows_f32 = self._rows(view)
+        ivf = self._ivf
+        best_s, best_r = np.empty(0, np.float32), np.empty(0, np.int64)
+        if exact is False or (exact is None and ivf is not None):
+            if ivf is None:
+                raise ValueError("approximate index isn't built yet")
+            # probed lists, plus everything appended since the build
+            cand = np.concatenate([np.sort(ivf.candidates(q, EMBED_NPROBE)), np.arange(ivf.n, n)])
+            for lo in range(0, len(cand), _CHUNK_ROWS):
+                rows = cand[lo:lo + _CHUNK_ROWS]
+                best_s, best_r = _top(np.concatenate([best_s, rows_f32(rows) @ q]),
+                                      np.concatenate([best_r, rows]), k)
+        else:
+            for lo in range(0, n, _CHUNK_ROWS):
+                hi = min(n, lo + _CHUNK_ROWS)
+                # slices read the memmap sequentially, no gather copy
+                best_s, best_r = _top(np.concatenate([best_s, rows_f32(slice(lo, hi)) @ q]),
+                                      np.concatenate([best_r, np.arange(lo, hi)]), k)
+        self.searches += 1
+        # float16 rounding can put a self-match a hair over 1
+        return [(int(ids[r]), min(1.0, float(s))) for s, r in zip(best_s, best_r)]
+
+    def stats(self) -> Dict[str, Any]:
+        view = self._current()
+        n = view[0] if view else 0
+        return {
+            "dir": str(self.dir), "dtype": self.dtype, "dim": self.dim, "rows": n,
+            "bytes": n * (self.dim or 0) * np.dtype(self._np).itemsize,
+            "mode": "ivf" if self._ivf is not None else "exact",
+            "ivf_lists": len(self._ivf.centroids) if self._ivf is not None else None,
+            "ivf_rows": self._ivf.n if self._ivf is not None else None,
+            "appended": self.appended, "searches": self.searches,
+        }
+
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+def index_for(model: str) -> VectorIndex:
+    with _indexes_lock:
+        idx = _indexes.get(model)
+        if idx is None:
+            idx = _indexes[model] = VectorIndex(model)
+        return idx
+
+def append(model: str, ids: Sequence[int], encoded: Sequence[str]) -> None:
+    if EMBED_ENABLED and ids:
+        index_for(model).append(ids, np.stack([decode(e) for e in encoded]))
+
+def stats(model: str) -> Dict[str, Any]:
+    if not EMBED_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **index_for(model).stats()}
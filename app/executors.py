@@ -0,0 +1,89 @@
+from __future__ import annotations
+import os, asyncio, threading, logging, contextvars, multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from .config import TORCH_THREADS
+from . import admission
+
+log = logging.getLogger("uvicorn.error")
+
+_CPUS = os.cpu_count() or 2
+
+# torch inference runs on threads; each forward pass already uses TORCH_THREADS
+# intra-op threads, so by default only enough workers to cover the cores
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0")) or max(1, _CPUS // TORCH_THREADS)
+# HTML parsing/extraction runs in worker processes on whatever cores torch isn't using
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0")) or max(1, _CPUS - TORCH_THREADS)
+# EXTRACT_PROCESSES=0 keeps extraction on threads (debugging, or platforms where spawn is costly)
+EXTRACT_PROCESSES = str(os.getenv("EXTRACT_PROCESSES", "1")).lower() in {"1", "true", "yes"}
+
+_lock = threading.Lock()
+_inference: Optional[ThreadPoolExecutor] = None
+_extract: Optional[Any] = None
+
+def _inference_pool() -> ThreadPoolExecutor:
+    global _inference
+    if _inference is None:
+        with _lock:
+            if _inference is None:
+                _inference = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+    return _inference
+
+def _extract_pool():
+    global _extract
+    if _extract is None:
+        with _lock:
+            if _extract is None:
+                if EXTRACT_PROCESSES:
+                    # spawn, not fork: the parent may hold torch threads and open sockets
+                    _extract = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    _extract = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
+    return _extract
+
+def _if_in_time(fn: Callable[..., Any], *args: Any) -> Any:
+    # a job that waited in the pool past its request's deadline is dropped unrun
+    admission.check("inference")
+    return fn(*args)
+
+async def run_inference(fn: Callable[..., Any], *args: Any) -> Any:
+    """run a torch call on the inference thread pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    # carry the caller's context over so per-request stage timings (and the deadline) come along
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_inference_pool(), ctx.run, _if_in_time, fn, *args)
+
+async def run_extraction(fn: Callable[..., Any], *args: Any) -> Any:
+    """run CPU-bound parsing in the extraction pool; `fn` must be a picklable top-level function"""
+    global _extract
+    loop = asyncio.get_running_loop()
+    pool = _extract_pool()
+    try:
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # a worker died (OOM, segfault in a parser); replace the pool and retry once
+        log.warning("extraction pool broke; restarting it")
+        with _lock:
+            if _extract is pool:
+                _extract = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(_extract_pool(), fn, *args)
+
+def stats() -> dict:
+    return {
+        "torch_threads": TORCH_THREADS,
+        "inference_workers": INFERENCE_WORKERS,
+        "extract_workers": EXTRACT_WORKERS,
+        "extract_processes": EXTRACT_PROCESSES,
+    }
+
+def shutdown() -> None:
+    global _inference, _extract
+    with _lock:
+        pools, _inference, _extract = (_inference, _extract), None, None
+    for p in pools:
+        if p is not None:
+            p.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,585 @@
+"""Feed ingestion: poll RSS/Atom feeds and news sitemaps and score every new article."""
+from __future__ import annotations
+import os, sys, gzip, json, time, heapq, signal, asyncio, sqlite3, argparse, logging
+import xml.etree.ElementTree as ET
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urljoin
+from typing import Dict, Any, List, Optional, Tuple
+
+from .config import DATA_DIR
+from .news_fetch import extract_article, get_client, aclose_client, _host_slot
+from .executors import run_inference
+from . import metrics, cascade, executors, store
+from .bias_model import classify_batch, classify_long, CKPT, MAX_BATCH_TOKENS, LONG_MODE
+
+log = logging.getLogger("uvicorn.error")
+
+INGEST_STATE_PATH = os.getenv("INGEST_STATE_PATH", os.path.join(DATA_DIR, "ingest.db"))
+INGEST_INTERVAL_S = float(os.getenv("INGEST_INTERVAL_S", "300"))
+INGEST_FEED_CONCURRENCY = int(os.getenv("INGEST_FEED_CONCURRENCY", "4"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "8"))
+INGEST_DOMAIN_DELAY_S = float(os.getenv("INGEST_DOMAIN_DELAY_S", "1"))
+# URLs waiting to be fetched; feed polling waits when the frontier is full
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "1000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+INGEST_BATCH_WAIT_MS = float(os.getenv("INGEST_BATCH_WAIT_MS", "2000"))
+# items dated further back than this are ignored (0 = keep everything); undated items are kept
+INGEST_MAX_AGE_H = float(os.getenv("INGEST_MAX_AGE_H", "72"))
+INGEST_MAX_ITEMS = int(os.getenv("INGEST_MAX_ITEMS", "500"))          # newest items taken per feed poll
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_MIN_CHARS = int(os.getenv("INGEST_MIN_CHARS", "300"))          # shorter extractions aren't scored
+INGEST_SITEMAP_CHILDREN = int(os.getenv("INGEST_SITEMAP_CHILDREN", "5"))  # newest sitemaps read from an index
+INGEST_MAX_FEED_BYTES = int(os.getenv("INGEST_MAX_FEED_BYTES", str(20 * 1024 * 1024)))
+# same cut as /predict_url, so a page scored either way gets the same content hash
+INGEST_MAX_CHARS = int(os.getenv("PREDICT_URL_MAX_CHARS", "8000"))
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS feeds ("
+    " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT,"
+    " checked REAL, changed REAL, status INTEGER, errors INTEGER NOT NULL DEFAULT 0, error TEXT,"
+    " children TEXT)",
+    "CREATE TABLE IF NOT EXISTS seen ("
+    " url TEXT PRIMARY KEY, feed TEXT, first_seen REAL NOT NULL, updated REAL NOT NULL,"
+    " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT)",
+    "CREATE INDEX IF NOT EXISTS seen_feed ON seen (feed, status)",
+)
+
+# (url, feed, title from the feed)
+Item = Tuple[str, str, Optional[str]]
+
+# -------- parsing ----------
+def _local(tag: Any) -> str:
+    return tag.rsplit("}", 1)[-1].lower() if isinstance(tag, str) else ""
+
+def _child(el: ET.Element, name: str) -> Optional[ET.Element]:
+    for c in el:
+        if _local(c.tag) == name:
+            return c
+    return None
+
+def _text(el: Optional[ET.Element]) -> Optional[str]:
+    if el is None or el.text is None:
+        return None
+    return el.text.strip() or None
+
+def _when(value: Optional[str]) -> Optional[float]:
+    """epoch seconds from an RFC 822 (RSS) or ISO-8601 (Atom, sitemaps) date"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        return store.parse_time(value)
+    except ValueError:
+        return None
+
+def _atom_link(entry: ET.Element) -> Optional[str]:
+    links = [c for c in entry if _local(c.tag) == "link" and c.get("href")]
+    for c in links:
+        if c.get("rel", "alternate") == "alternate":
+            return c.get("href")
+    return links[0].get("href") if links else None
+
+def parse_feed(body: bytes, base_url: str) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    (kind, items, child sitemaps) from an RSS, RSS 1.0, Atom, sitemap or
+    sitemap index document. Items and children are {"url", "title", "published"}
+    """
+    root = ET.fromstring(body)
+    kind = _local(root.tag)
+    items: List[Dict[str, Any]] = []
+    children: List[Dict[str, Any]] = []
+    if kind == "sitemapindex":
+        for sm in root:
+            if _local(sm.tag) == "sitemap" and _text(_child(sm, "loc")):
+                children.append({"url": urljoin(base_url, _text(_child(sm, "loc"))), "title": None,
+                                 "published": _when(_text(_child(sm, "lastmod")))})
+    elif kind == "urlset":
+        for u in root:
+            loc = _text(_child(u, "loc")) if _local(u.tag) == "url" else None
+            if not loc:
+                continue
+            news = _child(u, "news")
+            title = _text(_child(news, "title")) if news is not None else None
+            published = _when(_text(_child(news, "publication_date"))) if news is not None else None
+            items.append({"url": urljoin(base_url, loc), "title": title,
+                          "published": published or _when(_text(_child(u, "lastmod")))})
+    elif kind == "feed":
+        for e in root:
+            if _local(e.tag) != "entry":
+                continue
+            link = _atom_link(e)
+            if link:
+                items.append({"url": urljoin(base_url, link), "title": _text(_child(e, "title")),
+                              "published": _when(_text(_child(e, "published")) or _text(_child(e, "updated")))})
+    elif kind in ("rss", "rdf"):
+        for it in root.iter():
+            if _local(it.tag) != "item":
+                continue
+            # skip atom:link self-references, which carry an href but no text
+            link = next((_text(c) for c in it if _local(c.tag) == "link" and _text(c)), None)
+            guid = _child(it, "guid")
+            if not link and guid is not None and guid.get("isPermaLink", "true") != "false":
+                link = _text(guid)
+            if link:
+                items.append({"url": urljoin(base_url, link), "title": _text(_child(it, "title")),
+                              "published": _when(_text(_child(it, "pubdate")) or _text(_child(it, "date")))})
+    else:
+        raise ValueError(f"not a feed or sitemap: <{kind}>")
+    return kind, items, children
+
+def _recent(entries: List[Dict[str, Any]], limit: int, now: float) -> List[Dict[str, Any]]:
+    """newest first, dropping anything older than INGEST_MAX_AGE_H; undated entries lead, in feed order"""
+    if INGEST_MAX_AGE_H > 0:
+        cutoff = now - INGEST_MAX_AGE_H * 3600
+        entries = [e for e in entries if e["published"] is None or e["published"] >= cutoff]
+    entries = sorted(entries, key=lambda e: -(e["published"] or float("inf")))
+    return entries[:limit]
+
+def _canonical(url: str) -> str:
+    # fragments never change the page
+    return url.split("#", 1)[0].strip()
+
+# -------- state ----------
+class State:
+    """feed validators and seen URLs; only touched from the event loop thread"""
+
+    def __init__(self, path: str = INGEST_STATE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = store._connect(path)
+        self.db.row_factory = sqlite3.Row
+        for stmt in _SCHEMA:
+            self.db.execute(stmt)
+
+    def feed(self, url: str) -> Optional[sqlite3.Row]:
+        return self.db.execute("SELECT * FROM feeds WHERE url = ?", (url,)).fetchone()
+
+    def feed_polled(self, url: str, status: int, etag: Optional[str] = None,
+                    last_modified: Optional[str] = None, changed: bool = False) -> None:
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO feeds (url, etag, last_modified, checked, changed, status, errors)"
+            " VALUES (?, ?, ?, ?, ?, ?, 0) ON CONFLICT (url) DO UPDATE SET"
+            " checked = excluded.checked, status = excluded.status, errors = 0, error = NULL,"
+            " etag = CASE WHEN ? THEN excluded.etag ELSE etag END,"
+            " last_modified = CASE WHEN ? THEN excluded.last_modified ELSE last_modified END,"
+            " changed = CASE WHEN ? THEN excluded.changed ELSE changed END",
+            (url, etag, last_modified, now, now if changed else None, status, changed, changed, changed))
+
+    def feed_failed(self, url: str, error: str, status: Optional[int] = None) -> None:
+        self.db.execute(
+            "INSERT INTO feeds (url, checked, status, errors, error) VALUES (?, ?, ?, 1, ?)"
+            " ON CONFLICT (url) DO UPDATE SET checked = excluded.checked, status = excluded.status,"
+            " errors = errors + 1, error = excluded.error",
+            (url, time.time(), status, error[:500]))
+
+    def children(self, url: str) -> List[str]:
+        row = self.feed(url)
+        return json.loads(row["children"]) if row is not None and row["children"] else []
+
+    def set_children(self, url: str, children: List[str]) -> None:
+        self.db.execute("UPDATE feeds SET children = ? WHERE url = ?", (json.dumps(children), url))
+
+    def retries(self, feed: str) -> List[str]:
+        """URLs from this feed that failed (or were cut off by a stop) and have attempts left"""
+        return [r[0] for r in self.db.execute(
+            "SELECT url FROM seen WHERE feed = ? AND status IN ('queued', 'error') AND attempts < ?",
+            (feed, INGEST_MAX_ATTEMPTS))]
+
+    def due_at(self, url: str, interval: float) -> float:
+        row = self.feed(url)
+        if row is None or row["checked"] is None:
+            return 0.0
+        # failing feeds back off, up to 16x the interval
+        return row["checked"] + interval * 2 ** min(row["errors"], 4)
+
+    def claim(self, items: List[Item], inflight: set) -> List[Item]:
+        """the items that should be fetched now, recorded as queued"""
+        now = time.time()
+        out: List[Item] = []
+        known: Dict[str, sqlite3.Row] = {}
+        urls = [u for u, _, _ in items]
+        for i in range(0, len(urls), 500):
+            part = urls[i:i + 500]
+            q = f"SELECT url, status, attempts FROM seen WHERE url IN ({','.join('?' * len(part))})"
+            known.update((r["url"], r) for r in self.db.execute(q, part))
+        self.db.execute("BEGIN")
+        try:
+            for url, feed, title in items:
+                if url in inflight:
+                    continue
+                r = known.get(url)
+                if r is None:
+                    self.db.execute("INSERT OR IGNORE INTO seen (url, feed, first_seen, updated, status)"
+                                    " VALUES (?, ?, ?, ?, 'queued')", (url, feed, now, now))
+                elif r["status"] in ("done", "skipped") or r["attempts"] >= INGEST_MAX_ATTEMPTS:
+                    continue
+                out.append((url, feed, title))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return out
+
+    def finish(self, url: str, status: str, error: Optional[str] = None) -> None:
+        self.db.execute("UPDATE seen SET status = ?, attempts = attempts + 1, updated = ?, error = ? WHERE url = ?",
+                        (status, time.time(), error[:500] if error else None, url))
+
+    def counts(self) -> Dict[str, int]:
+        return {r[0]: r[1] for r in self.db.execute("SELECT status, COUNT(*) FROM seen GROUP BY status")}
+
+    def close(self) -> None:
+        self.db.close()
+
+# -------- frontier ----------
+class Frontier:
+    """
+    URLs waiting to be fetched, one line per host. get() hands out the host
+    whose next request is allowed soonest, so a sitemap with 500 links to one
+    site never holds up other sites behind the politeness delay
+    """
+
+    def __init__(self, delay: float = INGEST_DOMAIN_DELAY_S, maxsize: int = INGEST_QUEUE_MAX):
+        self.delay, self.maxsize = delay, max(1, maxsize)
+        self._lines: Dict[str, deque] = {}
+        self._ready: List[Tuple[float, str]] = []   # (earliest start, host) for every host with URLs waiting
+        self._next: Dict[str, float] = {}            # host -> earliest next request
+        self._size = 0
+        self._cond = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    async def put(self, item: Item) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._size < self.maxsize)
+            h = self.host(item[0])
+            line = self._lines.get(h)
+            if line is None:
+                line = self._lines[h] = deque()
+                heapq.heappush(self._ready, (self._next.get(h, 0.0), h))
+            line.append(item)
+            self._size += 1
+            self._cond.notify_all()
+
+    async def get(self) -> Item:
+        async with self._cond:
+            while True:
+                await self._cond.wait_for(lambda: bool(self._ready))
+                at, h = self._ready[0]
+                now = time.monotonic()
+                if self._next.get(h, 0.0) > at:
+                    # a feed request to this host moved its slot since it was queued
+                    heapq.heapreplace(self._ready, (self._next[h], h))
+                    continue
+                if at > now:
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), at - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                heapq.heappop(self._ready)
+                line = self._lines[h]
+                item = line.popleft()
+                self._size -= 1
+                self._next[h] = now + self.delay
+                if line:
+                    heapq.heappush(self._ready, (self._next[h], h))
+                else:
+                    del self._lines[h]
+                self._cond.notify_all()
+                return item
+
+    async def reserve(self, url: str) -> None:
+        """wait for a request slot on url's host outside the queue (feed fetches)"""
+        h = self.host(url)
+        now = time.monotonic()
+        at = max(now, self._next.get(h, 0.0))
+        self._next[h] = at + self.delay
+        if at > now:
+            await asyncio.sleep(at - now)
+
+# -------- pipeline ----------
+class Ingester:
+    def __init__(self, feeds: List[str], state: State, chunked: bool = False,
+                 concurrency: int = INGEST_CONCURRENCY, feed_concurrency: int = INGEST_FEED_CONCURRENCY,
+                 interval: float = INGEST_INTERVAL_S, batch_size: int = INGEST_BATCH_SIZE,
+                 domain_delay: float = INGEST_DOMAIN_DELAY_S, out: Optional[Any] = None):
+        self.feeds = feeds
+        self.state = state
+        self.chunked = chunked
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.out = out
+        self.frontier = Frontier(delay=domain_delay)
+        self._feed_slots = asyncio.Semaphore(max(1, feed_concurrency))
+        self._articles: asyncio.Queue = asyncio.Queue(maxsize=2 * self.batch_size)
+        self._inflight: set = set()     # claimed URLs not yet finished
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.counts: Dict[str, int] = {}
+
+    def _count(self, result: str, n: int = 1) -> None:
+        if not n:
+            return
+        self.counts[result] = self.counts.get(result, 0) + n
+        metrics.inc("ingest_total", n, result=result)
+
+    def _done(self, url: str, status: str, error: Optional[str] = None) -> None:
+        self.state.finish(url, status, error)
+        self._inflight.discard(url)
+        if not self._inflight:
+            self._idle.set()
+
+    # feeds
+    async def _get_feed(self, url: str) -> Optional[bytes]:
+        """the feed body, or None when the server says it hasn't changed"""
+        row = self.state.feed(url)
+        headers = {}
+        if row is not None:
+            if row["etag"]:
+                headers["If-None-Match"] = row["etag"]
+            if row["last_modified"]:
+                headers["If-Modified-Since"] = row["last_modified"]
+        await self.frontier.reserve(url)
+        with metrics.timed("ingest_feed"):
+            async with _host_slot(url):
+                async with get_client().stream("GET", url, headers=headers) as r:
+                    if r.status_code == 304:
+                        self.state.feed_polled(url, 304)
+                        return None
+                    r.raise_for_status()
+                    body = bytearray()
+                    async for part in r.aiter_bytes():
+                        body += part
+                        if len(body) > INGEST_MAX_FEED_BYTES:
+                            raise ValueError(f"feed larger than {INGEST_MAX_FEED_BYTES} bytes")
+        body = bytes(body)
+        if body[:2] == b"\x1f\x8b":
+            # .xml.gz sitemaps arrive compressed without Content-Encoding
+            body = gzip.decompress(body)
+        self.state.feed_polled(url, r.status_code, r.headers.get("etag"), r.headers.get("last-modified"), changed=True)
+        return body
+
+    async def poll(self, url: str, depth: int = 0) -> int:
+        """fetch one feed and queue its new articles; returns how many were queued"""
+        async with self._feed_slots:
+            try:
+                body = await self._get_feed(url)
+                parsed = parse_feed(body, url) if body is not None else None
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                self.state.feed_failed(url, f"{type(e).__name__}: {e}", status)
+                self._count("feed_error")
+                log.warning(f"ingest: feed {url} failed: {type(e).__name__}: {e}")
+                return 0
+        now = time.time()
+        if parsed is None:
+            self._count("feed_not_modified")
+            # an unchanged sitemap index can still point at sitemaps that did change
+            entries, subs = [], self.state.children(url)
+        else:
+            self._count("feed_polled")
+            _, entries, children = parsed
+            subs = [c["url"] for c in _recent(children, INGEST_SITEMAP_CHILDREN, now)]
+            if children:
+                self.state.set_children(url, subs)
+        queued = 0
+        if subs and depth == 0:
+            # a sitemap index: its newest sitemaps are polled with their own validators
+            queued += sum(await asyncio.gather(*(self.poll(c, depth + 1) for c in subs)))
+        items = [(_canonical(e["url"]), url, e["title"]) for e in _recent(entries, INGEST_MAX_ITEMS, now)]
+        # earlier failures from this feed get another go even when it hasn't changed
+        items += [(u, url, None) for u in self.state.retries(url)]
+        uniq: Dict[str, Item] = {}
+        for it in items:
+            if it[0].startswith(("http://", "https://")):
+                uniq.setdefault(it[0], it)
+        fresh = self.state.claim(list(uniq.values()), self._inflight)
+        self._count("queued", len(fresh))
+        for it in fresh:
+            self._inflight.add(it[0])
+            self._idle.clear()
+        for it in fresh:
+            await self.frontier.put(it)
+        return queued + len(fresh)
+
+    # articles
+    async def _extract_worker(self) -> None:
+        while True:
+            url, feed, title = await self.frontier.get()
+            try:
+                art = await extract_article(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._count("extract_error")
+                self._done(url, "error", f"{type(e).__name__}: {e}")
+                continue
+            text = (art.get("text") or "").strip()
+            if len(text) < INGEST_MIN_CHARS:
+                self._count("skipped")
+                self._done(url, "skipped", f"{len(text)} chars extracted")
+                continue
+            if not art.get("title") and title:
+                art = dict(art, title=title)
+            self._count("extracted")
+            await self._articles.put((url, art))
+
+    async def _next_batch(self) -> List[Tuple[str, Dict[str, str]]]:
+        batch = [await self._articles.get()]
+        deadline = time.monotonic() + INGEST_BATCH_WAIT_MS / 1000
+        while len(batch) < self.batch_size:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._articles.get(), left))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _score(self, texts: List[str]) -> List[Dict[str, Any]]:
+        if self.chunked:
+            with metrics.timed("classify"):
+                return list(await asyncio.gather(*(run_inference(classify_long, t) for t in texts)))
+        # confident items are answered by the cascade's linear stage, like /batch_predict
+        results = cascade.gate(texts)
+        todo = [i for i, r in enumerate(results) if r is None]
+        if todo:
+            with metrics.timed("classify"):
+                scored = await run_inference(classify_batch, [texts[i] for i in todo], MAX_BATCH_TOKENS)
+            for i, r in zip(todo, scored):
+                results[i] = r
+        return results
+
+    async def _scorer(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            texts = []
+            for url, art in batch:
+                text = art["text"] if self.chunked else art["text"][:INGEST_MAX_CHARS]
+                texts.append(((art.get("title") or "").strip() + "\n\n" + text).strip())
+            try:
+                results = await self._score(texts)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"ingest: scoring {len(batch)} articles failed: {type(e).__name__}: {e}")
+                self._count("classify_error", len(batch))
+                for url, _ in batch:
+                    self._done(url, "error", f"{type(e).__name__}: {e}")
+                continue
+            for (url, art), text, res in zip(batch, texts, results):
+                store.record(endpoint="ingest", text=text, res=res, model=CKPT, chunked=self.chunked,
+                             url=art.get("url") or url, source=art.get("source"), title=art.get("title"))
+                if self.out is not None:
+                    self.out.write(json.dumps({
+                        "url": art.get("url") or url, "source": art.get("source"), "title": art.get("title"),
+                        "label": res["label"], "confidence": round(float(res["confidence"]), 4),
+                        "probs": {k: round(float(v), 4) for k, v in (res.get("probs") or {}).items()},
+                        "stage": res.get("stage", "bert"),
+                    }) + "\n")
+                self._done(url, "done")
+            if self.out is not None:
+                self.out.flush()
+            self._count("scored", len(batch))
+
+    # schedule
+    async def run(self, once: bool = False, progress_s: float = 30.0) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        tasks = [asyncio.create_task(self._extract_worker()) for _ in range(self.concurrency)]
+        tasks.append(asyncio.create_task(self._scorer()))
+        last = time.monotonic()
+        try:
+            while True:
+                now = time.time()
+                due = [f for f in self.feeds if self.state.due_at(f, self.interval) <= now]
+                if due:
+                    await asyncio.gather(*(self.poll(f) for f in due))
+                if once:
+                    await self._idle.wait()
+                    break
+                if time.monotonic() - last >= progress_s:
+                    last = time.monotonic()
+                    print(f"ingest: {json.dumps(self.counts)} frontier={len(self.frontier)}", file=sys.stderr)
+                nxt = min(self.state.due_at(f, self.interval) for f in self.feeds)
+                await asyncio.sleep(min(max(0.5, nxt - time.time()), progress_s))
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return {"feeds": len(self.feeds), **self.counts, "frontier": len(self.frontier),
+                "seen": self.state.counts(), "seconds": round(time.perf_counter() - t0, 2)}
+
+# -------- CLI ----------
+def _read_feeds(paths: List[str], urls: List[str]) -> List[str]:
+    feeds = list(urls)
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            feeds += [ln.split("#", 1)[0].strip() for ln in f]
+    return list(dict.fromkeys(u for u in feeds if u))
+
+async def _main(args: argparse.Namespace, feeds: List[str]) -> Dict[str, Any]:
+    state = State(args.state)
+    out = open(args.output, "a", encoding="utf-8") if args.output else None
+    ing = Ingester(feeds, state, chunked=args.chunked, concurrency=args.concurrency,
+                   feed_concurrency=args.feed_concurrency, interval=args.interval,
+                   batch_size=args.batch_size, domain_delay=args.domain_delay, out=out)
+    main_task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, main_task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass   # Windows: Ctrl-C still raises KeyboardInterrupt
+    try:
+        return await ing.run(once=args.once, progress_s=args.progress_s)
+    except asyncio.CancelledError:
+        # stopped: unfinished URLs stay queued in the state file and are picked up next run
+        return {"stopped": True, "feeds": len(feeds), **ing.counts, "seen": state.counts()}
+    finally:
+        await aclose_client()
+        store.shutdown()
+        executors.shutdown()
+        state.close()
+        if out is not None:
+            out.close()
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--feeds", action="append", default=[], help="file with one feed or sitemap URL per line")
+    ap.add_argument("--feed", action="append", default=[], help="feed or sitemap URL (repeatable)")
+    ap.add_argument("--once", action="store_true", help="poll every feed once, wait for its articles, exit")
+    ap.add_argument("--interval", type=float, default=INGEST_INTERVAL_S, help="seconds between polls of a feed")
+    ap.add_argument("--concurrency", type=int, default=INGEST_CONCURRENCY, help="articles fetched at once")
+    ap.add_argument("--feed-concurrency", type=int, default=INGEST_FEED_CONCURRENCY, help="feeds fetched at once")
+    ap.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="articles per classify call")
+    ap.add_argument("--domain-delay", type=float, default=INGEST_DOMAIN_DELAY_S,
+                    help="least seconds between two requests to one host")
+    ap.add_argument("--chunked", action="store_true", default=LONG_MODE == "chunked",
+                    help="score long articles over sliding windows")
+    ap.add_argument("--state", default=INGEST_STATE_PATH, help="SQLite file with feed validators and seen URLs")
+    ap.add_argument("--output", help="also append each scored article to this JSONL file")
+    ap.add_argument("--progress-s", type=float, default=30.0, help="seconds between progress lines")
+    args = ap.parse_args(argv)
+
+    feeds = _read_feeds(args.feeds, args.feed)
+    if not feeds:
+        ap.error("no feeds: pass --feeds FILE or --feed URL")
+    if not store.STORE_ENABLED and not args.output:
+        ap.error("STORE_ENABLED=0 and no --output: scores would go nowhere")
+    report = asyncio.run(_main(args, feeds))
+    print(json.dumps(report))
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+import os, re, csv, threading, logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from .config import DATA_DIR
+
+log = logging.getLogger("uvicorn.error")
+
+# politically salient phrases with per-term scores (term,score[,case_sensitive])
+LEXICON_PATH = os.getenv("LEXICON_PATH", os.path.join(DATA_DIR, "lexicon.csv"))
+
+# used when the lexicon file is missing
+_DEFAULT_TERMS = [
+    "flood", "surge", "invasion", "weaponize", "radical", "extremist", "witch hunt",
+    "soft on crime", "open borders", "tax-and-spend",
+    "war on *", "fearmongering",
+    "bipartisan", "both parties", "left-wing", "left wing", "right-wing", "right wing",
+    "progressive", "conservative", "liberal",
+    "regulation", "tax", "taxation", "immigration", "abortion", "gun control", "climate",
+]
+_DEFAULT_SCORE = 0.15
+
+_WS = re.compile(r"\s+")
+
+def _norm(s: str) -> str:
+    return _WS.sub(" ", s.strip().lower())
+
+def _tokens(term: str) -> List[str]:
+    """chars of the term, with runs of whitespace as ' ' and '*' as a one-word wildcard"""
+    return list(_WS.sub(" ", term.strip()))
+
+def _tok_regex(tok: str) -> str:
+    if tok == " ":
+        return r"\s+"
+    if tok == "*":
+        return r"[^\W\d_]+"
+    return re.escape(tok)
+
+def _trie_regex(node: Dict[str, Any]) -> str:
+    """
+    collapse a character trie into one regex, so matching branches on the next
+    character instead of trying every phrase in turn at each position
+    """
+    alts = [_tok_regex(tok) + _trie_regex(child) for tok, child in sorted(node.items()) if tok]
+    end = "" in node
+    if not alts:
+        return ""
+    if len(alts) == 1 and not end:
+        return alts[0]
+    body = "(?:" + "|".join(alts) + ")"
+    return body + "?" if end else body
+
+def _build_trie(terms: List[str], fold: bool) -> Dict[str, Any]:
+    root: Dict[str, Any] = {}
+    for t in terms:
+        node = root
+        for tok in _tokens(t.lower() if fold else t):
+            node = node.setdefault(tok, {})
+        node[""] = {}
+    return root
+
+class Lexicon:
+    """
+    Compiles every term into a single regex (two character tries: one
+    case-insensitive, one case-sensitive) once, then finds all whole-word
+    matches in a single left-to-right pass. Overlapping phrases resolve to the
+    longest match starting at a position.
+    """
+
+    def __init__(self, entries: List[Tuple[str, float, bool]]):
+        self.size = len(entries)
+        self._scores: Dict[str, float] = {}        # case-folded literal -> score
+        self._exact: Dict[str, float] = {}         # case-sensitive literal -> score
+        self._wild: List[Tuple[re.Pattern, float]] = []
+
+        folded, exact = [], []
+        for term, score, case in entries:
+            term = term.strip()
+            if not term:
+                continue
+            (exact if case else folded).append(term)
+            if "*" in term:
+                pat = "".join(_tok_regex(tok) for tok in _tokens(term))
+                self._wild.append((re.compile(pat, 0 if case else re.IGNORECASE), score))
+            elif case:
+                self._exact[_WS.sub(" ", term)] = score
+            else:
+                self._scores[_norm(term)] = score
+
+        parts = []
+        if folded:
+            parts.append(_trie_regex(_build_trie(folded, fold=True)))
+        if exact:
+            parts.append("(?-i:" + _trie_regex(_build_trie(exact, fold=False)) + ")")
+        self._rx: Optional[re.Pattern] = None
+        if parts:
+            self._rx = re.compile(r"(?<!\w)(?:" + "|".join(parts) + r")(?!\w)", re.IGNORECASE)
+
+    def score(self, matched: str) -> float:
+        s = self._exact.get(_WS.sub(" ", matched))
+        if s is not None:
+            return s
+        s = self._scores.get(_norm(matched))
+        if s is not None:
+            return s
+        for rx, sc in self._wild:
+            if rx.fullmatch(matched):
+                return sc
+        return _DEFAULT_SCORE
+
+    def find(self, text: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        if not text or self._rx is None:
+            return out
+        for m in self._rx.finditer(text):
+            out.append({
+                "text": m.group(0),
+                "start": m.start(),
+                "end": m.end(),
+                "score": self.score(m.group(0)),
+            })
+            if k is not None and len(out) >= k:
+                break
+        return out
+
+def load_entries(path: str) -> List[Tuple[str, float, bool]]:
+    """rows of term,score[,case_sensitive]; a header row is optional"""
+    entries: List[Tuple[str, float, bool]] = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            if row[0].strip().lower() == "term":
+                continue
+            try:
+                score = float(row[1]) if len(row) > 1 and row[1].strip() else _DEFAULT_SCORE
+            except ValueError:
+                continue
+            case = len(row) > 2 and row[2].strip().lower() in {"1", "true", "yes"}
+            entries.append((row[0], score, case))
+    return entries
+
+_lexicon: Optional[Lexicon] = None
+_lock = threading.Lock()
+
+def get_lexicon() -> Lexicon:
+    global _lexicon
+    if _lexicon is None:
+        with _lock:
+            if _lexicon is None:
+                entries = []
+                if LEXICON_PATH and os.path.exists(LEXICON_PATH):
+                    try:
+                        entries = load_entries(LEXICON_PATH)
+                    except Exception as e:
+                        log.warning(f"lexicon load failed ({LEXICON_PATH}): {e}")
+                if not entries:
+                    entries = [(t, _DEFAULT_SCORE, False) for t in _DEFAULT_TERMS]
+                _lexicon = Lexicon(entries)
+    return _lexicon
+
+def find_spans(text: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+    return get_lexicon().find(text, k)
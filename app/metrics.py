@@ -0,0 +1,180 @@
+from __future__ import annotations
+import os, time, bisect, threading, contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+# METRICS_ENABLED=0 turns every observe/inc into a no-op
+METRICS_ENABLED = str(os.getenv("METRICS_ENABLED", "1")).lower() in {"1", "true", "yes"}
+# SERVER_TIMING=1 adds a per-request Server-Timing header with the stages it went through
+SERVER_TIMING = str(os.getenv("SERVER_TIMING", "0")).lower() in {"1", "true", "yes"}
+# recent samples kept per series for p50/p95/p99
+METRICS_RESERVOIR = int(os.getenv("METRICS_RESERVOIR", "2048"))
+
+PREFIX = "newsbias"
+QUANTILES = (0.5, 0.95, 0.99)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 384, 512, 1024, 2048, 4096, 8192)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# name -> (type, help, buckets)
+_DEFS: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {
+    "stage_seconds": ("histogram", "Time spent in each pipeline stage", LATENCY_BUCKETS),
+    "request_seconds": ("histogram", "End-to-end request latency by endpoint", LATENCY_BUCKETS),
+    "tokens": ("histogram", "Tokens per text sent to the model", TOKEN_BUCKETS),
+    "batch_size": ("histogram", "Rows per model forward pass", BATCH_BUCKETS),
+    "requests_total": ("counter", "Requests by endpoint and status", ()),
+    "errors_total": ("counter", "Errors by stage", ()),
+    "cascade_total": ("counter", "Items answered per cascade stage", ()),
+    "dedup_total": ("counter", "Near-duplicate index lookups by index and result", ()),
+    "admission_total": ("counter", "Admission decisions by endpoint and result", ()),
+    "deadline_exceeded_total": ("counter", "Work dropped because the request deadline passed, by stage", ()),
+    "store_rows_total": ("counter", "Prediction store rows by result (written, dropped, failed)", ()),
+    "ingest_total": ("counter", "Feed ingestion events by result (feed_polled, discovered, scored, ...)", ()),
+}
+
+class _Series:
+    __slots__ = ("counts", "sum", "count", "recent")
+
+    def __init__(self, nbuckets: int):
+        self.counts = [0] * (nbuckets + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent: deque = deque(maxlen=METRICS_RESERVOIR)
+
+_lock = threading.Lock()
+_hist: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Series] = {}
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+# stages seen by the current request, for Server-Timing
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar("request_timings", default=None)
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if not METRICS_ENABLED:
+        return
+    buckets = _DEFS[name][2]
+    k = _key(name, labels)
+    with _lock:
+        s = _hist.get(k)
+        if s is None:
+            s = _hist[k] = _Series(len(buckets))
+        s.counts[bisect.bisect_left(buckets, value)] += 1
+        s.sum += value
+        s.count += 1
+        s.recent.append(value)
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    if not METRICS_ENABLED:
+        return
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0.0) + value
+
+def record_timing(stage: str, seconds: float) -> None:
+    observe("stage_seconds", seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+@contextmanager
+def timed(stage: str):
+    """time a block as `stage`; exceptions bump errors_total{stage} and propagate"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("errors_total", stage=stage)
+        raise
+    finally:
+        record_timing(stage, time.perf_counter() - t0)
+
+def start_request() -> contextvars.Token:
+    return _request_timings.set([])
+
+def end_request(token: contextvars.Token) -> List[Tuple[str, float]]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    # repeated stages (e.g. several forward passes) are summed
+    total: Dict[str, float] = {}
+    for stage, s in timings:
+        total[stage] = total.get(stage, 0.0) + s
+    return ", ".join(f"{stage};dur={s * 1000.0:.1f}" for stage, s in total.items())
+
+def _quantile(sorted_xs: List[float], q: float) -> float:
+    if not sorted_xs:
+        return 0.0
+    return sorted_xs[min(len(sorted_xs) - 1, int(round(q * (len(sorted_xs) - 1))))]
+
+def _fmt_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def _fmt_num(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if not float(x).is_integer() else str(int(x))
+
+def render() -> str:
+    """Prometheus text exposition: histograms, a summary with p50/p95/p99 per histogram, counters"""
+    with _lock:
+        hist = {k: (list(s.counts), s.sum, s.count, sorted(s.recent)) for k, s in _hist.items()}
+        counters = dict(_counters)
+
+    lines: List[str] = []
+    for name, (typ, help_, buckets) in _DEFS.items():
+        full = f"{PREFIX}_{name}"
+        if typ == "counter":
+            series = [(k[1], v) for k, v in counters.items() if k[0] == name]
+            lines.append(f"# HELP {full} {help_}")
+            lines.append(f"# TYPE {full} counter")
+            for labels, v in sorted(series):
+                lines.append(f"{full}{_fmt_labels(labels)} {_fmt_num(v)}")
+            continue
+
+        series = sorted((k[1], v) for k, v in hist.items() if k[0] == name)
+        lines.append(f"# HELP {full} {help_}")
+        lines.append(f"# TYPE {full} histogram")
+        for labels, (counts, total, count, _) in series:
+            cum = 0
+            for le, c in zip(list(buckets) + [float("inf")], counts):
+                cum += c
+                lines.append(f"{full}_bucket{_fmt_labels(labels, (('le', _fmt_num(le)),))} {cum}")
+            lines.append(f"{full}_sum{_fmt_labels(labels)} {_fmt_num(total)}")
+            lines.append(f"{full}_count{_fmt_labels(labels)} {count}")
+
+        # recent-window quantiles as a separate summary family
+        qname = f"{full}_recent"
+        lines.append(f"# HELP {qname} {help_} (quantiles over the last {METRICS_RESERVOIR} samples)")
+        lines.append(f"# TYPE {qname} summary")
+        for labels, (_, total, count, recent) in series:
+            for q in QUANTILES:
+                lines.append(f"{qname}{_fmt_labels(labels, (('quantile', str(q)),))} {_fmt_num(_quantile(recent, q))}")
+            lines.append(f"{qname}_sum{_fmt_labels(labels)} {_fmt_num(sum(recent))}")
+            lines.append(f"{qname}_count{_fmt_labels(labels)} {len(recent)}")
+    return "\n".join(lines) + "\n"
+
+def snapshot() -> Dict[str, Any]:
+    """p50/p95/p99 per stage as JSON, for quick looks without a Prometheus server"""
+    with _lock:
+        hist = {k: (s.count, sorted(s.recent)) for k, s in _hist.items()}
+    out: Dict[str, Any] = {}
+    for (name, labels), (count, recent) in hist.items():
+        key = name + ("" if not labels else "{" + ",".join(f"{k}={v}" for k, v in labels) + "}")
+        out[key] = {"count": count, **{f"p{int(q * 100)}": _quantile(recent, q) for q in QUANTILES}}
+    return out
+
+def reset() -> None:
+    with _lock:
+        _hist.clear()
+        _counters.clear()
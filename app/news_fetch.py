@@ -1,15 +1,214 @@
-from typing import Dict, Optional
-import re, httpx, trafilatura
+from typing import Dict, List, Optional, Tuple, Any
+import os, re, json, time, asyncio, hashlib, logging, threading, httpx, trafilatura
+from urllib.parse import urlsplit
 from readability import Document
 import tldextract
 
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    _HAS_H2 = True
+except Exception:
+    _HAS_H2 = False
+
+from .config import DATA_DIR
+from .executors import run_extraction
+from . import metrics, admission
+
+log = logging.getLogger("uvicorn.error")
+
 UA = "Mozilla/5.0 (compatible; BiasDemo/1.0)"
 
-async def fetch_html(url: str, timeout: float = 12.0) -> str:
-    async with httpx.AsyncClient(follow_redirects=True, headers={"User-Agent": UA}, timeout=timeout) as c:
-        r = await c.get(url)
-        r.raise_for_status()
-        return r.text
+# shared client knobs
+FETCH_TIMEOUT_S = float(os.getenv("FETCH_TIMEOUT_S", "12"))
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "64"))
+FETCH_MAX_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", "6"))
+FETCH_KEEPALIVE_S = float(os.getenv("FETCH_KEEPALIVE_S", "30"))
+FETCH_HTTP2 = _HAS_H2 and str(os.getenv("FETCH_HTTP2", "1")).lower() in {"1", "true", "yes"}
+
+# on-disk page cache; empty FETCH_CACHE_DIR turns it off
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", os.path.join(DATA_DIR, "page_cache"))
+FETCH_CACHE_FRESH_S = float(os.getenv("FETCH_CACHE_FRESH_S", "300"))   # skip revalidation this long
+# entries untouched this long are dropped, and the oldest go once the cache outgrows FETCH_CACHE_MAX_MB
+FETCH_CACHE_MAX_AGE_S = float(os.getenv("FETCH_CACHE_MAX_AGE_S", str(7 * 86400)))
+FETCH_CACHE_MAX_MB = float(os.getenv("FETCH_CACHE_MAX_MB", "512"))
+FETCH_CACHE_PRUNE_S = float(os.getenv("FETCH_CACHE_PRUNE_S", "600"))   # least time between two prune passes
+
+# -------- shared client ----------
+# httpx clients and asyncio semaphores belong to one event loop, so both are
+# rebuilt if we're called from a different loop (e.g. a test client)
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+def get_client() -> httpx.AsyncClient:
+    global _client, _client_loop, _host_slots
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            headers={"User-Agent": UA},
+            timeout=FETCH_TIMEOUT_S,
+            http2=FETCH_HTTP2,
+            limits=httpx.Limits(
+                max_connections=FETCH_MAX_CONNECTIONS,
+                max_keepalive_connections=FETCH_MAX_CONNECTIONS,
+                keepalive_expiry=FETCH_KEEPALIVE_S,
+            ),
+        )
+        _client_loop = loop
+        _host_slots = {}
+    return _client
+
+def _host_slot(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc.lower()
+    sem = _host_slots.get(host)
+    if sem is None:
+        sem = _host_slots[host] = asyncio.Semaphore(max(1, FETCH_MAX_PER_HOST))
+    return sem
+
+async def aclose_client() -> None:
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client, _client_loop = None, None
+
+# -------- page cache ----------
+def _cache_path(url: str) -> Optional[str]:
+    if not FETCH_CACHE_DIR:
+        return None
+    h = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(FETCH_CACHE_DIR, h[:2], h + ".json")
+
+# these do file I/O: call them through asyncio.to_thread, never on the event loop
+def _load_entry(url: str) -> Optional[Dict[str, Any]]:
+    p = _cache_path(url)
+    if not p or not os.path.exists(p):
+        return None
+    try:
+        if FETCH_CACHE_MAX_AGE_S > 0 and time.time() - os.path.getmtime(p) > FETCH_CACHE_MAX_AGE_S:
+            return None
+        with open(p, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        log.warning(f"page cache read failed for {url}: {e}")
+        return None
+
+def _save_entry(url: str, entry: Dict[str, Any]) -> None:
+    p = _cache_path(url)
+    if not p:
+        return
+    try:
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, p)   # atomic, so readers never see half a file
+    except Exception as e:
+        log.warning(f"page cache write failed for {url}: {e}")
+    _maybe_prune()
+
+_prune_lock = threading.Lock()
+_pruned_at = 0.0
+
+def _maybe_prune() -> None:
+    """start a prune pass in the background if the last one is old enough"""
+    global _pruned_at
+    now = time.monotonic()
+    with _prune_lock:
+        if now - _pruned_at < FETCH_CACHE_PRUNE_S:
+            return
+        _pruned_at = now
+    threading.Thread(target=prune_cache, name="page-cache-prune", daemon=True).start()
+
+def prune_cache() -> Dict[str, int]:
+    """drop entries older than FETCH_CACHE_MAX_AGE_S, then the oldest until under FETCH_CACHE_MAX_MB"""
+    if not FETCH_CACHE_DIR or not os.path.isdir(FETCH_CACHE_DIR):
+        return {"files": 0, "bytes": 0, "removed": 0}
+    now = time.time()
+    files: List[Tuple[float, int, str]] = []
+    removed = 0
+    for sub in os.scandir(FETCH_CACHE_DIR):
+        if not sub.is_dir():
+            continue
+        for e in os.scandir(sub.path):
+            try:
+                st = e.stat()
+                if FETCH_CACHE_MAX_AGE_S > 0 and now - st.st_mtime > FETCH_CACHE_MAX_AGE_S:
+                    os.unlink(e.path)
+                    removed += 1
+                else:
+                    files.append((st.st_mtime, st.st_size, e.path))
+            except FileNotFoundError:
+                pass   # another worker got there first
+    total = sum(size for _, size, _ in files)
+    kept = len(files)
+    cap = FETCH_CACHE_MAX_MB * 1024 * 1024
+    if FETCH_CACHE_MAX_MB > 0 and total > cap:
+        # least recently written first; a revalidation rewrites the entry, so this is close to LRU.
+        # stop at 90% so the next few writes don't trigger another pass straight away
+        files.sort()
+        for _, size, path in files:
+            if total <= 0.9 * cap:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            kept -= 1
+    return {"files": kept, "bytes": total, "removed": removed}
+
+async def _fetch(url: str, timeout: Optional[float] = None, save: bool = True) -> Tuple[str, Dict[str, Any], bool]:
+    """
+    (html, cache entry, changed). Fresh entries are served without a request;
+    stale ones are revalidated with If-None-Match / If-Modified-Since.
+    save=False leaves writing a changed entry to the caller
+    """
+    entry = await asyncio.to_thread(_load_entry, url)
+    now = time.time()
+    if entry and now - entry.get("fetched_at", 0) < FETCH_CACHE_FRESH_S:
+        return entry["html"], entry, False
+
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    c = get_client()
+    with metrics.timed("fetch"):
+        async with _host_slot(url):
+            # never wait on the network past the request's deadline
+            budget = admission.clamp(timeout or FETCH_TIMEOUT_S, "fetch")
+            try:
+                r = await c.get(url, headers=headers, timeout=budget)
+            except httpx.TimeoutException:
+                if admission.expired():
+                    raise admission.DeadlineExceeded("fetch")
+                raise
+
+    if entry and r.status_code == 304:
+        entry["fetched_at"] = now
+        await asyncio.to_thread(_save_entry, url, entry)
+        return entry["html"], entry, False
+
+    r.raise_for_status()
+    entry = {
+        "url": url,
+        "etag": r.headers.get("etag"),
+        "last_modified": r.headers.get("last-modified"),
+        "fetched_at": now,
+        "html": r.text,
+    }
+    if save:
+        await asyncio.to_thread(_save_entry, url, entry)
+    return entry["html"], entry, True
+
+async def fetch_html(url: str, timeout: float = FETCH_TIMEOUT_S) -> str:
+    html, _, _ = await _fetch(url, timeout)
+    return html
 
 def _clean(s: Optional[str]) -> str:
     if not s: return ""
@@ -19,9 +218,7 @@ def _domain(url: str) -> str:
     e = tldextract.extract(url)
     return ".".join([p for p in [e.domain, e.suffix] if p])
 
-async def extract_article(url: str) -> Dict[str, str]:
-    html = await fetch_html(url)
-
+def extract_from_html(url: str, html: str) -> Dict[str, str]:
     # try trafilatura
     meta = trafilatura.extract_metadata(html)
     body = trafilatura.extract(html, include_comments=False, include_tables=False, favor_precision=True)
@@ -38,3 +235,18 @@ async def extract_article(url: str) -> Dict[str, str]:
     title = _clean(doc.short_title())
     text = _clean(re.sub(r"<[^>]+>", " ", doc.summary(html_partial=True)))
     return {"url": url, "source": _domain(url), "title": title, "text": text}
+
+async def extract_article(url: str) -> Dict[str, str]:
+    html, entry, changed = await _fetch(url, save=False)
+
+    # unchanged page we've already parsed: reuse the extraction
+    if not changed and entry.get("article"):
+        return entry["article"]
+
+    # trafilatura/readability are CPU-bound; keep them off the event loop
+    admission.check("extract")
+    with metrics.timed("extract"):
+        art = await run_extraction(extract_from_html, url, html)
+    entry["article"] = art
+    await asyncio.to_thread(_save_entry, url, entry)
+    return art
@@ -1,22 +1,31 @@
+"""AllSides source priors, compiled into a cached lookup index that reloads when the CSV changes."""
 from __future__ import annotations
-import os, csv, re
-from typing import Dict, Optional
-
-try:
-    import tldextract
-except Exception:
-    tldextract = None
+import os, csv, re, json, time, threading, logging, unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 from .config import ALLSIDES_PRIORS_PATH
 
+log = logging.getLogger("uvicorn.error")
+
+# compiled index cache next to the CSV; empty disables it
+PRIORS_INDEX_PATH = os.getenv("PRIORS_INDEX_PATH", ALLSIDES_PRIORS_PATH + ".index.json" if ALLSIDES_PRIORS_PATH else "")
+# how often (seconds) a lookup may stat the CSV to pick up edits
+PRIORS_RELOAD_CHECK_S = float(os.getenv("PRIORS_RELOAD_CHECK_S", "5"))
+# trigram Dice similarity an outlet name needs to count as a fuzzy match; 0 disables fuzzy matching
+PRIORS_FUZZY_MIN = float(os.getenv("PRIORS_FUZZY_MIN", "0.6"))
+
+_INDEX_VERSION = 1
+
 # accept many header variants
 _NAME_KEYS   = ("source","outlet","name","publication","organization","site_name","brand","source_name")
-_DOMAIN_KEYS = ("domain","site","website","host","url","homepage") 
+_DOMAIN_KEYS = ("domain","site","website","host","url","homepage")
 _RATING_KEYS = ("rating","bias","allsides_rating","allsides_bias","allsides")
 _NOTES_KEYS  = ("notes","summary","desc","description","about")
 _LINK_KEYS   = ("link","source_url","allsides_url","ref","reference","page","page_url")
 
-# minimal domain to name fallback for common outlets 
+# minimal domain to name fallback for common outlets
 DOMAIN_TO_NAME = {
     "cnn.com": "CNN",
     "foxnews.com": "Fox News",
@@ -27,54 +36,72 @@ DOMAIN_TO_NAME = {
     "wsj.com": "Wall Street Journal",
 }
 
-_PRIORS_BY_DOMAIN: Dict[str, Dict[str,str]] = {}
-_PRIORS_BY_NAME: Dict[str, Dict[str,str]] = {}
-_LOADED = False
-
-def _norm_domain(x: str) -> str:
-    if not x: return ""
-    s = x.strip().lower()
-    s = re.sub(r"^https?://", "", s)
-    s = re.sub(r"^www\.", "", s)
-    s = s.split("/")[0]
-    if tldextract is not None and "." in s:
-        ext = tldextract.extract("http://" + s if not s.startswith("http") else s)
-        s = ".".join([p for p in (ext.domain, ext.suffix) if p])
-    return s
+# a host label must be this long to match an outlet's shorthand: "nytimes" does, "ab" or "wp" don't
+_MIN_HOST_ALIAS = 5
+
+_PUNCT = re.compile(r"[^\w\s]+")
+_WS = re.compile(r"\s+")
+
+def _norm_host(x: str) -> str:
+    """host of a URL or bare domain, lowercased, without www. or port"""
+    s = (x or "").strip().lower()
+    if "://" not in s:
+        s = "http://" + s
+    host = urlsplit(s).hostname or ""
+    return host[4:] if host.startswith("www.") else host
 
 def _norm_name(x: str) -> str:
-    return (x or "").strip().lower()
+    """"The New York Times" -> "new york times": folded, no punctuation or leading "the\""""
+    s = unicodedata.normalize("NFKD", x or "").encode("ascii", "ignore").decode().lower().replace("&", " and ")
+    s = _WS.sub(" ", _PUNCT.sub(" ", s)).strip()
+    return s[4:] if s.startswith("the ") else s
+
+def _aliases(name_key: str) -> List[str]:
+    """shorthands outlets go by: "newyorktimes", "nyt", "nytimes\""""
+    words = name_key.split()
+    out = ["".join(words)]
+    if len(words) > 1:
+        out.append("".join(w[0] for w in words))
+        out.append("".join(w[0] for w in words[:-1]) + words[-1])
+    return [a for a in out if len(a) > 1 and a != name_key]
+
+def _trigrams(key: str) -> set:
+    s = "^" + key.replace(" ", "") + "$"
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _host_suffixes(host: str) -> List[str]:
+    """edition.cnn.com -> [edition.cnn.com, cnn.com]; never a bare TLD"""
+    labels = host.split(".")
+    return [".".join(labels[i:]) for i in range(len(labels) - 1)]
+
+@lru_cache(maxsize=8192)
+def _parse(s: str) -> Tuple[str, str]:
+    """(host or "", name key) for whatever the caller passed: URL, domain or outlet name"""
+    s = (s or "").strip()
+    looks_like_host = "." in s and " " not in s
+    return (_norm_host(s) if looks_like_host else ""), _norm_name(s)
 
 def _first(d: dict, keys: tuple[str,...]) -> Optional[str]:
     for k in keys:
         if k in d and d[k]: return str(d[k])
-    lk = {k.lower(): k for k in d.keys()}
+    lk = {k.lower(): k for k in d.keys() if isinstance(k, str)}
     for want in keys:
         if want in lk and d[lk[want]]: return str(d[lk[want]])
     return None
 
-def _load() -> None:
-    global _LOADED, _PRIORS_BY_DOMAIN, _PRIORS_BY_NAME
-    if _LOADED: return
-    _LOADED = True
-
-    path = ALLSIDES_PRIORS_PATH
-    if not path or not os.path.exists(path):
-        return
-
+def _read_records(path: str) -> List[Dict[str, str]]:
+    records = []
     with open(path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
             name   = _first(row, _NAME_KEYS)   or ""
-            domain = _first(row, _DOMAIN_KEYS) or ""    
+            domain = _first(row, _DOMAIN_KEYS) or ""
             rating = _first(row, _RATING_KEYS) or ""
             notes  = _first(row, _NOTES_KEYS)  or ""
             link   = _first(row, _LINK_KEYS)   or ""
 
-            name_n   = _norm_name(name)
-            domain_n = _norm_domain(domain)
-
-            if not (name_n or domain_n or rating):
+            domain_n = _norm_host(domain) if domain else ""
+            if not (name.strip() or domain_n or rating):
                 continue
 
             record = {
@@ -85,49 +112,215 @@ def _load() -> None:
             }
             if notes: record["notes"] = notes
             if link:  record["url"]   = link
+            records.append(record)
+    return records
 
-            if domain_n:
-                _PRIORS_BY_DOMAIN[domain_n] = record
-            if name_n:
-                _PRIORS_BY_NAME[name_n] = record
+class PriorIndex:
+    """
+    Every way a prior can be looked up, compiled once per CSV version:
+    domains (matched on any parent of the host), normalized outlet names, their
+    shorthand aliases, and a trigram index for fuzzy name matching. Plain dicts
+    and lists throughout, so it round-trips through JSON for fast startup.
+    """
 
-def get_prior_for_source(source_or_domain: str) -> Optional[Dict[str,str]]:
-    _load()
-    s = source_or_domain or ""
-
-    # try domain directly
-    dom = _norm_domain(s)
-    if dom and dom in _PRIORS_BY_DOMAIN:
-        return _PRIORS_BY_DOMAIN[dom]
-
-    # if we got a domain, map it to an outlet name and try name lookup
-    if dom and dom in DOMAIN_TO_NAME:
-        nm = _norm_name(DOMAIN_TO_NAME[dom])
-        rec = _PRIORS_BY_NAME.get(nm)
-        if rec:
-            # fill in domain if missing
-            if not rec.get("domain"):
-                rec = dict(rec)
-                rec["domain"] = dom
-            return rec
-
-    # try name directly ("CNN")
-    nm = _norm_name(s)
-    if nm and nm in _PRIORS_BY_NAME:
-        return _PRIORS_BY_NAME[nm]
-
-    # if it was a full URL and we didn't catch it above
-    if s.startswith("http"):
-        dom2 = _norm_domain(s)
-        if dom2 in _PRIORS_BY_DOMAIN:
-            return _PRIORS_BY_DOMAIN[dom2]
-        if dom2 in DOMAIN_TO_NAME:
-            nm2 = _norm_name(DOMAIN_TO_NAME[dom2])
-            rec = _PRIORS_BY_NAME.get(nm2)
-            if rec:
-                if not rec.get("domain"):
-                    rec = dict(rec)
-                    rec["domain"] = dom2
-                return rec
+    def __init__(self, records: List[Dict[str, str]], domains: Dict[str, int], names: Dict[str, int],
+                 aliases: Dict[str, int], grams: Dict[str, List[int]], sig: Optional[dict] = None):
+        self.records = records
+        self.domains = domains
+        self.names = names
+        self.aliases = aliases
+        self.grams = grams
+        self.sig = sig or {}
+        self._gram_counts: Dict[int, int] = {}
+        for ids in grams.values():
+            for i in ids:
+                self._gram_counts[i] = self._gram_counts.get(i, 0) + 1
+        self._memo: Dict[str, Optional[Tuple[int, str, str]]] = {}
+        self._memo_lock = threading.Lock()
 
+    @classmethod
+    def build(cls, records: List[Dict[str, str]], sig: Optional[dict] = None) -> "PriorIndex":
+        domains: Dict[str, int] = {}
+        names: Dict[str, int] = {}
+        aliases: Dict[str, int] = {}
+        ambiguous = set()
+        grams: Dict[str, List[int]] = {}
+        for i, rec in enumerate(records):
+            if rec.get("domain"):
+                domains[rec["domain"]] = i
+            key = _norm_name(rec.get("source", ""))
+            if not key:
+                continue
+            names[key] = i
+            for a in _aliases(key):
+                if aliases.get(a, i) != i:
+                    ambiguous.add(a)
+                aliases[a] = i
+            for g in _trigrams(key):
+                grams.setdefault(g, []).append(i)
+        # the built-in domain map only fills gaps the CSV leaves
+        for dom, nm in DOMAIN_TO_NAME.items():
+            i = names.get(_norm_name(nm))
+            if i is not None:
+                domains.setdefault(dom, i)
+        for a in ambiguous:
+            aliases.pop(a, None)
+        return cls(records, domains, names, aliases, grams, sig)
+
+    def to_json(self) -> dict:
+        return {"version": _INDEX_VERSION, "sig": self.sig, "records": self.records, "domains": self.domains,
+                "names": self.names, "aliases": self.aliases, "grams": self.grams}
+
+    @classmethod
+    def from_json(cls, d: dict) -> "PriorIndex":
+        return cls(d["records"], d["domains"], d["names"], d["aliases"], d["grams"], d.get("sig"))
+
+    def _fuzzy(self, key: str) -> Optional[int]:
+        if PRIORS_FUZZY_MIN <= 0 or len(key) < 4:
+            return None
+        q = _trigrams(key)
+        hits: Dict[int, int] = {}
+        for g in q:
+            for i in self.grams.get(g, ()):
+                hits[i] = hits.get(i, 0) + 1
+        best, best_score = None, PRIORS_FUZZY_MIN
+        for i, n in hits.items():
+            dice = 2.0 * n / (len(q) + self._gram_counts[i])
+            if dice >= best_score:
+                best, best_score = i, dice
+        return best
+
+    def _find(self, s: str) -> Optional[Tuple[int, str, str]]:
+        """(record, how it matched, the domain it matched on or "")"""
+        host, key = _parse(s)
+        if host:
+            suffixes = _host_suffixes(host)
+            for h in suffixes:
+                if h in self.domains:
+                    return self.domains[h], "domain", h
+            # cnn.com / foxnews.com -> the outlet called "CNN" / "Fox News"; short labels
+            # only match a whole name, never an acronym that happens to spell them
+            for h in suffixes:
+                label = h.split(".")[0]
+                i = self.names.get(label)
+                if i is None and len(label) >= _MIN_HOST_ALIAS:
+                    i = self.aliases.get(label)
+                if i is not None:
+                    return i, "domain_name", h
+        if key:
+            if key in self.names:
+                return self.names[key], "name", ""
+            compact = key.replace(" ", "")
+            i = self.aliases.get(compact, self.aliases.get(key))
+            if i is not None:
+                return i, "alias", ""
+            if not host:
+                i = self._fuzzy(key)
+                if i is not None:
+                    return i, "fuzzy", ""
+        return None
+
+    def lookup(self, s: str) -> Optional[Dict[str, str]]:
+        hit = self._memo.get(s, False)
+        if hit is False:
+            hit = self._find(s)
+            with self._memo_lock:
+                if len(self._memo) >= 8192:
+                    self._memo.clear()
+                self._memo[s] = hit
+        if hit is None:
+            return None
+        i, how, dom = hit
+        out = dict(self.records[i], match=how)
+        if not out.get("domain") and dom:
+            out["domain"] = dom
+        return out
+
+# -------- loading / hot reload ----------
+_index: Optional[PriorIndex] = None
+_failed_sig: Optional[dict] = None   # CSV version that failed to build; not retried until it changes
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def _csv_sig(path: str) -> Optional[dict]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"path": os.path.abspath(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size, "version": _INDEX_VERSION}
+
+def _load_compiled(sig: dict) -> Optional[PriorIndex]:
+    if not PRIORS_INDEX_PATH or not os.path.exists(PRIORS_INDEX_PATH):
+        return None
+    try:
+        with open(PRIORS_INDEX_PATH, encoding="utf-8") as f:
+            d = json.load(f)
+        if d.get("version") == _INDEX_VERSION and d.get("sig") == sig:
+            return PriorIndex.from_json(d)
+    except Exception as e:
+        log.warning(f"priors index unreadable, rebuilding ({PRIORS_INDEX_PATH}): {e}")
     return None
+
+def _save_compiled(index: PriorIndex) -> None:
+    if not PRIORS_INDEX_PATH:
+        return
+    try:
+        tmp = f"{PRIORS_INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index.to_json(), f, separators=(",", ":"))
+        os.replace(tmp, PRIORS_INDEX_PATH)
+    except Exception as e:
+        log.warning(f"priors index write failed ({PRIORS_INDEX_PATH}): {e}")
+
+def _build(path: str, sig: Optional[dict]) -> PriorIndex:
+    if sig is None:
+        return PriorIndex.build([], sig)
+    index = _load_compiled(sig)
+    if index is None:
+        t0 = time.perf_counter()
+        index = PriorIndex.build(_read_records(path), sig)
+        _save_compiled(index)
+        log.info(f"priors index built from {path}: {len(index.records)} outlets in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return index
+
+def get_index() -> PriorIndex:
+    """
+    the current index; at most every PRIORS_RELOAD_CHECK_S the CSV is stat'ed and,
+    if it changed, a new index is built and swapped in. Lookups in flight keep
+    the index they started with
+    """
+    global _index, _failed_sig, _checked_at
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < PRIORS_RELOAD_CHECK_S:
+        return _index
+    if not _lock.acquire(blocking=_index is None):
+        return _index   # someone else is checking/rebuilding; keep serving the old one
+    try:
+        _checked_at = now
+        path = ALLSIDES_PRIORS_PATH
+        sig = _csv_sig(path) if path else None
+        if _index is None or (_index.sig != (sig or {}) and sig != _failed_sig):
+            try:
+                _index = _build(path, sig)
+            except Exception as e:
+                log.warning(f"priors load failed ({path}), keeping the previous index: {e}")
+                _failed_sig = sig
+                if _index is None:
+                    _index = PriorIndex.build([])
+        return _index
+    finally:
+        _lock.release()
+
+def get_prior_for_source(source_or_domain: str) -> Optional[Dict[str,str]]:
+    """
+    prior for a URL, domain ("edition.cnn.com" matches a cnn.com row) or outlet
+    name ("The New York Times", "NYTimes"); "match" says how it was found
+    """
+    if not source_or_domain:
+        return None
+    return get_index().lookup(source_or_domain)
+
+def stats() -> Dict[str, object]:
+    idx = get_index()
+    return {"path": ALLSIDES_PRIORS_PATH, "outlets": len(idx.records), "domains": len(idx.domains),
+            "aliases": len(idx.aliases), "compiled": PRIORS_INDEX_PATH or None, "memo": len(idx._memo)}
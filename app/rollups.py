@@ -0,0 +1,235 @@
+"""Per-outlet, per-model rollups of stored predictions, updated in the store's write transaction."""
+from __future__ import annotations
+import os, sys, math, time, json, sqlite3, argparse, logging
+from typing import Dict, Any, List, Optional, Tuple
+
+log = logging.getLogger("uvicorn.error")
+
+ROLLUPS_ENABLED = str(os.getenv("ROLLUPS_ENABLED", "1")).lower() in {"1", "true", "yes"}
+ROLLUP_BUCKET_S = int(os.getenv("ROLLUP_BUCKET_S", "86400"))
+# time buckets older than this many bucket widths are pruned; all-time totals are kept
+ROLLUP_KEEP_BUCKETS = int(os.getenv("ROLLUP_KEEP_BUCKETS", "90"))
+
+LABELS = ("Left", "Center", "Right")
+# where each label sits on a left-right axis; AllSides "Lean" ratings sit halfway
+_POSITION = {"Left": -1.0, "Center": 0.0, "Right": 1.0}
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS source_rollup ("
+    " source TEXT NOT NULL, model TEXT NOT NULL, bucket INTEGER NOT NULL, label TEXT NOT NULL,"
+    " hits INTEGER NOT NULL, p_sum REAL NOT NULL, p_sumsq REAL NOT NULL,"
+    " first_seen REAL NOT NULL, last_seen REAL NOT NULL,"
+    " PRIMARY KEY (source, model, bucket, label)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS source_rollup_bucket ON source_rollup (bucket, model)",
+)
+
+_UPSERT = (
+    "INSERT INTO source_rollup (source, model, bucket, label, hits, p_sum, p_sumsq, first_seen, last_seen)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    " ON CONFLICT (source, model, bucket, label) DO UPDATE SET"
+    " hits = hits + excluded.hits, p_sum = p_sum + excluded.p_sum, p_sumsq = p_sumsq + excluded.p_sumsq,"
+    " first_seen = MIN(first_seen, excluded.first_seen), last_seen = MAX(last_seen, excluded.last_seen)"
+)
+
+def bucket_of(ts: float) -> int:
+    return int(ts // ROLLUP_BUCKET_S) * ROLLUP_BUCKET_S
+
+def prior_position(rating: Optional[str]) -> Tuple[Optional[str], Optional[float]]:
+    """AllSides rating text -> (nearest model label, position on -1..1)"""
+    r = (rating or "").lower()
+    left, right, center = "left" in r, "right" in r, "center" in r or "centre" in r
+    if left == right:
+        return ("Center", 0.0) if center or (left and right) else (None, None)
+    side = "Left" if left else "Right"
+    lean = "lean" in r or center
+    return side, _POSITION[side] * (0.5 if lean else 1.0)
+
+def apply(db: sqlite3.Connection, rows: List[Tuple[float, Optional[str], str, str, str, Dict[str, float]]],
+          check_stored: bool = True) -> int:
+    """
+    fold (created, source, model, content_hash, label, probs) rows into the
+    rollups. Call inside the transaction that inserts them, before the insert,
+    so a text this model already stored for that source is recognised. Returns
+    rows counted
+    """
+    if not ROLLUPS_ENABLED:
+        return 0
+    acc: Dict[Tuple[str, str, int, str], List[float]] = {}
+    seen = set()
+    for created, source, model, chash, label, probs in rows:
+        if not source or (source, model, chash) in seen:
+            continue
+        seen.add((source, model, chash))
+        if check_stored and db.execute(
+                "SELECT 1 FROM predictions WHERE content_hash = ? AND source = ? AND model = ? LIMIT 1",
+                (chash, source, model)).fetchone():
+            continue
+        for bucket in (0, bucket_of(created)):
+            for lab in set(LABELS) | set(probs):
+                p = float(probs.get(lab, 0.0))
+                a = acc.get((source, model, bucket, lab))
+                if a is None:
+                    a = acc[(source, model, bucket, lab)] = [0, 0.0, 0.0, created, created]
+                a[0] += lab == label
+                a[1] += p
+                a[2] += p * p
+                a[3] = min(a[3], created)
+                a[4] = max(a[4], created)
+    if acc:
+        db.executemany(_UPSERT, [(s, m, b, l, *a) for (s, m, b, l), a in acc.items()])
+    return len(seen)
+
+def prune(db: sqlite3.Connection, now: Optional[float] = None) -> int:
+    if ROLLUP_KEEP_BUCKETS <= 0:
+        return 0
+    cutoff = bucket_of(now or time.time()) - ROLLUP_KEEP_BUCKETS * ROLLUP_BUCKET_S
+    return db.execute("DELETE FROM source_rollup WHERE bucket > 0 AND bucket < ?", (cutoff,)).rowcount
+
+def _rebuild(db: sqlite3.Connection, chunk: int = 5000) -> int:
+    db.execute("DELETE FROM source_rollup")
+    # the first prediction of each text per outlet and model, which is what apply() would have counted
+    cur = db.execute(
+        "SELECT created, source, model, content_hash, label, probs FROM predictions WHERE id IN"
+        " (SELECT MIN(id) FROM predictions WHERE source IS NOT NULL GROUP BY source, model, content_hash)")
+    n = 0
+    while True:
+        batch = [(c, s, m, h, l, json.loads(p)) for c, s, m, h, l, p in cur.fetchmany(chunk)]
+        if not batch:
+            break
+        n += apply(db, batch, check_stored=False)
+    prune(db)
+    return n
+
+def rebuild(db: sqlite3.Connection, chunk: int = 5000) -> int:
+    """recompute every rollup from the predictions table, oldest first"""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        n = _rebuild(db, chunk)
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    return n
+
+def ensure_schema(db: sqlite3.Connection) -> None:
+    """create the rollup tables; ones from before rollups were kept per model are rebuilt"""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        cols = {r[1] for r in db.execute("PRAGMA table_info(source_rollup)")}
+        stale = bool(cols) and "model" not in cols
+        if stale:
+            db.execute("DROP TABLE source_rollup")
+        for stmt in SCHEMA:
+            db.execute(stmt)
+        if stale:
+            log.info(f"rebuilt per-model rollups from {_rebuild(db)} predictions")
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+
+# -------- reads ----------
+def _summarise(source: str, rows: List[sqlite3.Row], prior: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    n = sum(r["hits"] for r in rows)
+    by_label = {r["label"]: r for r in rows}
+    order = [lab for lab in [*LABELS, *sorted(set(by_label) - set(LABELS))] if lab in by_label]
+    counts = {lab: by_label[lab]["hits"] for lab in order}
+    mean = {lab: by_label[lab]["p_sum"] / n for lab in order} if n else {}
+    # E[p^2] - E[p]^2 from the running sums; p is in [0, 1] so cancellation is harmless
+    std = {lab: math.sqrt(max(0.0, by_label[lab]["p_sumsq"] / n - mean[lab] ** 2)) for lab in order} if n else {}
+    position = mean.get("Right", 0.0) - mean.get("Left", 0.0) if n else None
+    out: Dict[str, Any] = {
+        "source": source, "n": n,
+        "label_counts": counts,
+        "mean_probs": {k: round(v, 4) for k, v in mean.items()},
+        "std_probs": {k: round(v, 4) for k, v in std.items()},
+        "position": None if position is None else round(position, 4),
+        "first_seen": min((r["first_seen"] for r in rows), default=None),
+        "last_seen": max((r["last_seen"] for r in rows), default=None),
+        "prior": None,
+    }
+    if prior:
+        plabel, ppos = prior_position(prior.get("rating"))
+        out["prior"] = {"rating": prior.get("rating"), "source": prior.get("source"), "label": plabel, "position": ppos}
+        if plabel and n:
+            # share of articles the model labelled differently from the outlet's rating
+            out["disagreement"] = round(1.0 - counts.get(plabel, 0) / n, 4)
+            out["drift"] = round(position - ppos, 4)
+    return out
+
+def _grouped(rows: List[sqlite3.Row]) -> Dict[str, List[sqlite3.Row]]:
+    out: Dict[str, List[sqlite3.Row]] = {}
+    for r in rows:
+        out.setdefault(r["source"], []).append(r)
+    return out
+
+def sources(db: sqlite3.Connection, lookup_prior, model: str, min_n: int = 1, sort: str = "n",
+            limit: int = 100) -> List[Dict[str, Any]]:
+    """one model's all-time rollup per outlet with its prior; sort by n, disagreement or |drift|"""
+    rows = db.execute("SELECT * FROM source_rollup WHERE bucket = 0 AND model = ?", (model,)).fetchall()
+    out = []
+    for source, rs in _grouped(rows).items():
+        s = _summarise(source, rs, lookup_prior(source))
+        s["model"] = model
+        if s["n"] >= min_n:
+            out.append(s)
+    keys = {
+        "n": lambda s: -s["n"],
+        "disagreement": lambda s: -(s.get("disagreement") if s.get("disagreement") is not None else -1),
+        "drift": lambda s: -abs(s["drift"]) if s.get("drift") is not None else 1,
+        "source": lambda s: s["source"],
+    }
+    if sort not in keys:
+        raise ValueError(f"sort must be one of {sorted(keys)}")
+    out.sort(key=keys[sort])
+    return out[:limit]
+
+def source_detail(db: sqlite3.Connection, source: str, lookup_prior, model: str, since: Optional[float] = None,
+                  until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """one outlet's all-time rollup for one model plus a per-bucket series for [since, until)"""
+    source = source.lower()
+    total = db.execute("SELECT * FROM source_rollup WHERE source = ? AND model = ? AND bucket = 0",
+                       (source, model)).fetchall()
+    if not total:
+        return None
+    prior = lookup_prior(source)
+    out = _summarise(source, total, prior)
+    out["model"] = model
+    q, args = "SELECT * FROM source_rollup WHERE source = ? AND model = ? AND bucket > 0", [source, model]
+    if since is not None:
+        q += " AND bucket >= ?"
+        args.append(bucket_of(since))
+    if until is not None:
+        q += " AND bucket < ?"
+        args.append(until)
+    by_bucket: Dict[int, List[sqlite3.Row]] = {}
+    for r in db.execute(q + " ORDER BY bucket", args).fetchall():
+        by_bucket.setdefault(r["bucket"], []).append(r)
+    series = []
+    for b, rs in by_bucket.items():
+        s = _summarise(source, rs, prior)
+        s.pop("source"); s.pop("prior")
+        series.append({"bucket": b, **s})
+    out["bucket_s"] = ROLLUP_BUCKET_S
+    out["buckets"] = series
+    return out
+
+def main(argv=None) -> int:
+    from .store import STORE_DB_PATH, _connect, _SCHEMA
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=["rebuild"])
+    ap.add_argument("--db", default=STORE_DB_PATH)
+    args = ap.parse_args(argv)
+    if not os.path.exists(args.db):
+        sys.exit(f"no prediction store at {args.db}")
+    db = _connect(args.db)
+    for stmt in _SCHEMA:
+        db.execute(stmt)
+    ensure_schema(db)
+    t0 = time.perf_counter()
+    n = rebuild(db)
+    print(f"rebuilt rollups from {n} predictions in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
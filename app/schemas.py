@@ -1,22 +1,27 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Any
 
 # what the user sends to /predict
 class PredictRequest(BaseModel):
     title: Optional[str] = None
     text: str
+    chunked: Optional[bool] = None   # sliding-window scoring for long articles; None = LONG_ARTICLE_MODE
+    url: Optional[str] = None   # where the text came from; stored with the prediction
 
 # model’s prediction about bias
 class BiasOut(BaseModel):
     label: str
     confidence: float
     probs: Optional[Dict[str, float]] = None
+    windows: Optional[List[Dict[str, Any]]] = None   # per-window {start,end,tokens,probs} in chunked mode
+    stage: Optional[str] = None   # which cascade stage answered: "linear" or "bert"
 
 # span/keywords to show the user
 class RationaleSpan(BaseModel):
     start: int
     end: int
     text: str
+    score: Optional[float] = None   # lexicon weight of the matched term
 
 # container for all spans to highlight
 class ExplainOut(BaseModel):
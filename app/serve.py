@@ -0,0 +1,48 @@
+"""Multi-worker launcher: uvicorn --workers sharing one memory-mapped copy of the weights."""
+from __future__ import annotations
+import os, sys, argparse, multiprocessing
+
+def _export(ckpt: str) -> None:
+    from pathlib import Path
+    from . import weights
+    weights.export(ckpt, local_files_only=Path(ckpt).is_dir())
+
+def worker_env(workers: int, cpus: int) -> dict:
+    """defaults that keep N workers from oversubscribing the cores; explicit env wins"""
+    threads = max(1, cpus // max(1, workers))
+    return {
+        "BIAS_SHARED_WEIGHTS": "1",
+        "TORCH_THREADS": str(threads),
+        "INFERENCE_WORKERS": "1",
+        "EXTRACT_WORKERS": str(max(1, (cpus - workers * threads) // max(1, workers))),
+    }
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--log-level", default="info")
+    ap.add_argument("--app", default="app.api:app")
+    args = ap.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    for k, v in worker_env(args.workers, os.cpu_count() or 2).items():
+        os.environ.setdefault(k, v)
+
+    # the supervisor never imports torch; only the export process and the workers do
+    backend = os.getenv("BIAS_BACKEND", "torch").lower()
+    if os.environ["BIAS_SHARED_WEIGHTS"].lower() in {"1", "true", "yes"} and backend == "torch":
+        ckpt = os.getenv("BIAS_MODEL_NAME", "Halfbendy/qbias_model")
+        p = multiprocessing.get_context("spawn").Process(target=_export, args=(ckpt,), name="weights-export")
+        p.start()
+        p.join()
+        if p.exitcode != 0:
+            sys.exit(f"couldn't prepare shared weights for {ckpt} (exit {p.exitcode})")
+
+    import uvicorn
+    uvicorn.run(args.app, host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+
+if __name__ == "__main__":
+    main()
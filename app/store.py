@@ -0,0 +1,356 @@
+"""Prediction store: every label the API hands out, kept in SQLite and written by one background thread."""
+from __future__ import annotations
+import os, json, time, queue, sqlite3, hashlib, threading, logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from .config import DATA_DIR
+from .cache import normalize_text
+from . import metrics, rollups, embeddings
+
+log = logging.getLogger("uvicorn.error")
+
+STORE_ENABLED = str(os.getenv("STORE_ENABLED", "1")).lower() in {"1", "true", "yes"}
+STORE_DB_PATH = os.getenv("STORE_DB_PATH", os.path.join(DATA_DIR, "predictions.db"))
+# writer commits once this many rows are waiting or STORE_FLUSH_MS has passed
+STORE_BATCH_SIZE = int(os.getenv("STORE_BATCH_SIZE", "256"))
+STORE_FLUSH_MS = float(os.getenv("STORE_FLUSH_MS", "500"))
+# rows waiting for the writer; past this they're dropped
+STORE_QUEUE_MAX = int(os.getenv("STORE_QUEUE_MAX", "10000"))
+STORE_MAX_PAGE = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS predictions ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " created REAL NOT NULL,"
+    " endpoint TEXT NOT NULL,"
+    " url TEXT,"
+    " content_hash TEXT NOT NULL,"
+    " source TEXT,"
+    " title TEXT,"
+    " model TEXT NOT NULL,"
+    " stage TEXT,"
+    " chunked INTEGER NOT NULL DEFAULT 0,"
+    " label TEXT NOT NULL,"
+    " confidence REAL NOT NULL,"
+    " probs TEXT NOT NULL,"
+    " spans TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS predictions_url ON predictions (url, created)",
+    "CREATE INDEX IF NOT EXISTS predictions_hash ON predictions (content_hash, created)",
+    "CREATE INDEX IF NOT EXISTS predictions_source ON predictions (source, created)",
+    "CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)",
+    "CREATE INDEX IF NOT EXISTS predictions_label ON predictions (label, created)",
+    "CREATE INDEX IF NOT EXISTS predictions_model ON predictions (model, created)",
+    # running totals kept in the write transaction, so /store never counts the table
+    "CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+_COLUMNS = ("created", "endpoint", "url", "content_hash", "source", "title", "model", "stage",
+            "chunked", "label", "confidence", "probs", "spans")
+_COL = {c: i for i, c in enumerate(_COLUMNS)}
+
+def content_hash(text: str) -> str:
+    """sha256 of the normalized text that was classified"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+def _connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA busy_timeout=30000")
+    return db
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """epoch seconds from epoch seconds or ISO-8601 ("2024-05-01", "2024-05-01T12:00:00Z")"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _row_out(row: sqlite3.Row) -> Dict[str, Any]:
+    out = dict(row)
+    out["probs"] = json.loads(out["probs"])
+    out["spans"] = json.loads(out["spans"])
+    out["chunked"] = bool(out["chunked"])
+    out["created_at"] = datetime.fromtimestamp(out["created"], timezone.utc).isoformat().replace("+00:00", "Z")
+    return out
+
+class PredictionStore:
+    def __init__(self, path: str = STORE_DB_PATH, batch_size: int = STORE_BATCH_SIZE,
+                 flush_ms: float = STORE_FLUSH_MS, queue_max: int = STORE_QUEUE_MAX):
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_s = max(0.0, float(flush_ms)) / 1000.0
+        self._q: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max(1, int(queue_max)))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self._ready = False
+        self._flushed = threading.Condition()
+        self._pending = 0   # enqueued, not yet committed (or dropped by a failed batch)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def _ensure_schema(self) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = _connect(self.path)
+            try:
+                for stmt in _SCHEMA:
+                    db.execute(stmt)
+                # a store written before the counter existed is counted once
+                db.execute("INSERT OR IGNORE INTO store_meta (key, value)"
+                           " SELECT 'rows', COUNT(*) FROM predictions")
+                rollups.ensure_schema(db)
+            finally:
+                db.close()
+            self._ready = True
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="prediction-store", daemon=True)
+                self._thread.start()
+
+    # -------- writes ----------
+    def record(self, *, endpoint: str, text: str, res: Dict[str, Any], model: str,
+               url: Optional[str] = None, source: Optional[str] = None, title: Optional[str] = None,
+               chunked: bool = False) -> None:
+        """queue one prediction for the writer; never blocks the caller"""
+        row = (
+            time.time(), endpoint, url or None, content_hash(text), (source or "").lower() or None,
+            title or None, model, res.get("stage", "bert"), int(bool(chunked)),
+            res["label"], float(res["confidence"]),
+            json.dumps({k: round(float(v), 4) for k, v in (res.get("probs") or {}).items()}),
+            json.dumps(res.get("rationale_spans") or []),
+        )
+        self._ensure_started()
+        with self._flushed:
+            self._pending += 1
+        try:
+            self._q.put_nowait((row, res.get("embedding") if embeddings.EMBED_ENABLED else None))
+        except queue.Full:
+            with self._flushed:
+                self._pending -= 1
+                self.dropped += 1
+                self._flushed.notify_all()
+            metrics.inc("store_rows_total", result="dropped")
+
+    def _collect(self, first: tuple) -> List[tuple]:
+        batch = [first]
+        deadline = time.monotonic() + self.flush_s
+        while len(batch) < self.batch_size:
+            left = deadline - time.monotonic()
+            try:
+                item = self._q.get(timeout=left) if left > 0 else self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._q.put(None)   # let _run see the stop marker after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _rollup_rows(self, rows: List[tuple]) -> List[tuple]:
+        return [(r[_COL["created"]], r[_COL["source"]], r[_COL["model"]], r[_COL["content_hash"]], r[_COL["label"]],
+                 json.loads(r[_COL["probs"]])) for r in rows if r[_COL["source"]]]
+
+    def _to_embed(self, db: sqlite3.Connection, batch: List[tuple]) -> List[int]:
+        """positions in batch whose vector should be indexed: first time this model stores this text"""
+        out, seen = [], set()
+        for i, (row, emb) in enumerate(batch):
+            key = (row[_COL["content_hash"]], row[_COL["model"]])
+            if emb is None or key in seen:
+                continue
+            seen.add(key)
+            # vectors are indexed per model, so another model's row doesn't count
+            if not db.execute("SELECT 1 FROM predictions WHERE content_hash = ? AND model = ? LIMIT 1", key).fetchone():
+                out.append(i)
+        return out
+
+    def _run(self) -> None:
+        db = None
+        pruned_at = float("-inf")
+        while True:
+            first = self._q.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            try:
+                if db is None:
+                    self._ensure_schema()
+                    db = _connect(self.path)
+                t0 = time.perf_counter()
+                rows = [row for row, _ in batch]
+                db.execute("BEGIN IMMEDIATE")
+                # before the insert, so rollups and the vector index can tell texts already stored
+                rollups.apply(db, self._rollup_rows(rows))
+                to_embed = self._to_embed(db, batch)
+                if time.monotonic() - pruned_at > 3600:
+                    rollups.prune(db)
+                    pruned_at = time.monotonic()
+                db.executemany(f"INSERT INTO predictions ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                               rows)
+                # ids are consecutive inside one write transaction
+                first_id = db.execute("SELECT last_insert_rowid()").fetchone()[0] - len(rows) + 1
+                db.execute("UPDATE store_meta SET value = value + ? WHERE key = 'rows'", (len(rows),))
+                db.execute("COMMIT")
+                self._index_vectors(batch, to_embed, first_id)
+                metrics.observe("stage_seconds", time.perf_counter() - t0, stage="store_write")
+                metrics.inc("store_rows_total", len(batch), result="written")
+                with self._flushed:
+                    self.written += len(batch)
+                    self.batches += 1
+            except Exception as e:
+                log.warning(f"prediction store write of {len(batch)} rows failed: {e}")
+                metrics.inc("store_rows_total", len(batch), result="failed")
+                try:
+                    db is not None and db.execute("ROLLBACK")
+                except Exception:
+                    pass
+                with self._flushed:
+                    self.failed += len(batch)
+            finally:
+                with self._flushed:
+                    self._pending -= len(batch)
+                    self._flushed.notify_all()
+        if db is not None:
+            db.close()
+
+    def _index_vectors(self, batch: List[tuple], positions: List[int], first_id: int) -> None:
+        by_model: Dict[str, tuple] = {}
+        for i in positions:
+            ids, vecs = by_model.setdefault(batch[i][0][_COL["model"]], ([], []))
+            ids.append(first_id + i)
+            vecs.append(batch[i][1])
+        for model, (ids, vecs) in by_model.items():
+            try:
+                embeddings.append(model, ids, vecs)
+            except Exception as e:
+                log.warning(f"embedding index append of {len(ids)} rows failed: {e}")
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """wait until everything queued so far is committed; False on timeout"""
+        end = time.monotonic() + timeout
+        with self._flushed:
+            while self._pending > 0:
+                left = end - time.monotonic()
+                if left <= 0:
+                    return False
+                self._flushed.wait(left)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._q.put(None)
+        self._thread.join(timeout)
+
+    # -------- reads ----------
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self._ensure_schema()
+            db = self._local.db = _connect(self.path)
+            db.row_factory = sqlite3.Row
+        return db
+
+    def get(self, pred_id: int) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute("SELECT * FROM predictions WHERE id=?", (pred_id,)).fetchone()
+        return _row_out(row) if row else None
+
+    def query(self, *, url: Optional[str] = None, content_hash: Optional[str] = None,
+              source: Optional[str] = None, label: Optional[str] = None, model: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        newest first. Every filter is an equality on an indexed column plus a
+        range on created; `cursor` is the next_cursor of the previous page
+        """
+        where: List[str] = []
+        args: List[Any] = []
+        for col, val in (("url", url), ("content_hash", content_hash), ("source", source and source.lower()),
+                         ("label", label), ("model", model)):
+            if val:
+                where.append(f"{col} = ?")
+                args.append(val)
+        if since is not None:
+            where.append("created >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created < ?")
+            args.append(until)
+        if cursor:
+            c_created, c_id = _parse_cursor(cursor)
+            where.append("(created < ? OR (created = ? AND id < ?))")
+            args += [c_created, c_created, c_id]
+        limit = max(1, min(int(limit), STORE_MAX_PAGE))
+        sql = "SELECT * FROM predictions"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created DESC, id DESC LIMIT ?"
+        rows = self._reader().execute(sql, args + [limit + 1]).fetchall()
+        items = [_row_out(r) for r in rows[:limit]]
+        nxt = f"{items[-1]['created']!r}:{items[-1]['id']}" if len(rows) > limit else None
+        return {"items": items, "next_cursor": nxt}
+
+    def get_many(self, pred_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not pred_ids:
+            return {}
+        rows = self._reader().execute(
+            f"SELECT * FROM predictions WHERE id IN ({', '.join('?' * len(pred_ids))})", list(pred_ids)).fetchall()
+        return {r["id"]: _row_out(r) for r in rows}
+
+    def sources(self, lookup_prior, **kw: Any) -> List[Dict[str, Any]]:
+        return rollups.sources(self._reader(), lookup_prior, **kw)
+
+    def source(self, source: str, lookup_prior, **kw: Any) -> Optional[Dict[str, Any]]:
+        return rollups.source_detail(self._reader(), source, lookup_prior, **kw)
+
+    def stats(self) -> Dict[str, Any]:
+        out = {"path": self.path, "queued": self._q.qsize(), "written": self.written,
+               "dropped": self.dropped, "failed": self.failed, "batches": self.batches}
+        if os.path.exists(self.path):
+            row = self._reader().execute("SELECT value FROM store_meta WHERE key = 'rows'").fetchone()
+            out["rows"] = row[0] if row else 0
+        return out
+
+def _parse_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        created, pred_id = cursor.rsplit(":", 1)
+        return float(created), int(pred_id)
+    except ValueError:
+        raise ValueError(f"bad cursor {cursor!r}")
+
+store = PredictionStore()
+
+def record(**kw: Any) -> None:
+    if not STORE_ENABLED:
+        return
+    try:
+        store.record(**kw)
+    except Exception as e:
+        log.warning(f"prediction store record failed: {e}")
+
+def stats() -> Dict[str, Any]:
+    if not STORE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **store.stats()}
+
+def shutdown() -> None:
+    if STORE_ENABLED:
+        store.flush()
+        store.close()
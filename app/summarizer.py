@@ -1,6 +1,8 @@
 from __future__ import annotations
-import os, re, logging
-from typing import Dict
+import os, re, time, asyncio, logging
+from typing import Dict, Optional
+
+from . import metrics, admission
 
 log = logging.getLogger("uvicorn.error")
 
@@ -9,10 +11,23 @@ USE_LLM = str(os.getenv("SUMMARY_ENABLED", "0")).lower() in {"1", "true", "yes"}
 
 SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4o-mini")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# any OpenAI-compatible endpoint (a local mock, a proxy, vLLM...)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# total budget per summary, queueing included; past it we return the extractive fallback
+SUMMARY_TIMEOUT_S = float(os.getenv("SUMMARY_TIMEOUT_S", "8"))
+# LLM calls in flight at once; the rest wait (within their budget) for a slot
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "8"))
 
 _MAX_INPUT_CHARS = 12000   # trim very long articles to keep latency/cost low
 _DEFAULT_MAX_WORDS = 100   # target summary length
 
+_SYSTEM_MSG = (
+    "You are a neutral news assistant. Write a concise, faithful summary in third person. "
+    "Avoid opinionated adjectives, speculation, or instructions; no bullet points unless asked. "
+    "Include who/what/when/where, and key context if essential. Keep it objective."
+)
+
 def _extractive_fallback(text: str, max_words: int = _DEFAULT_MAX_WORDS) -> str:
     """
     Lightweight summary: take first few sentences until ~N words
@@ -31,47 +46,104 @@ def _extractive_fallback(text: str, max_words: int = _DEFAULT_MAX_WORDS) -> str:
             break
     return " ".join(out).strip()
 
-def summarize(text: str, max_words: int = _DEFAULT_MAX_WORDS) -> Dict[str, str]:
+# imported up front so the first request's deadline doesn't pay for it
+AsyncOpenAI = None
+if USE_LLM and OPENAI_API_KEY:
+    try:
+        from openai import AsyncOpenAI
+    except Exception as e:
+        log.warning(f"openai import failed; summaries will be extractive: {e}")
+
+def llm_enabled() -> bool:
+    return bool(USE_LLM and OPENAI_API_KEY and AsyncOpenAI is not None)
+
+def _messages(text: str, max_words: int):
+    # keep prompt short; pass article as the main content
+    user_msg = (
+        f"Summarize the following article in ~{max_words} words.\n\n"
+        f"--- ARTICLE START ---\n{ text[:_MAX_INPUT_CHARS] }\n--- ARTICLE END ---"
+    )
+    return [
+        {"role": "system", "content": _SYSTEM_MSG},
+        {"role": "user", "content": user_msg},
+    ]
+
+def _clean(resp) -> str:
+    return re.sub(r"\s+", " ", (resp.choices[0].message.content or "").strip())
+
+def _fallback(text: str, max_words: int, stage: str, err: object) -> Dict[str, str]:
+    log.warning(f"LLM summarization failed; falling back. Error: {err}")
+    metrics.inc("errors_total", stage=stage)
+    # flagged so callers don't cache a fallback under the LLM settings
+    return {"text": _extractive_fallback(text, max_words), "fallback": True}
+
+# -------- pooled async client ----------
+# like the fetch client: one connection pool per event loop, rebuilt if the loop changes
+_aclient = None
+_aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+def get_async_client():
+    global _aclient, _aclient_loop, _slots
+    loop = asyncio.get_running_loop()
+    if _aclient is None or _aclient_loop is not loop:
+        # retries would blow through the deadline; the fallback is our retry
+        _aclient = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL,
+                               timeout=SUMMARY_TIMEOUT_S, max_retries=0)
+        _aclient_loop = loop
+        _slots = asyncio.Semaphore(max(1, SUMMARY_CONCURRENCY))
+    return _aclient
+
+async def aclose_client() -> None:
+    global _aclient, _aclient_loop, _slots
+    if _aclient is not None:
+        try:
+            await _aclient.close()
+        except Exception:
+            pass
+    _aclient, _aclient_loop, _slots = None, None, None
+
+async def asummarize(text: str, max_words: int = _DEFAULT_MAX_WORDS,
+                     timeout: Optional[float] = None) -> Dict[str, str]:
     """
-    Returns {"text": "<summary>"}.
-    Uses OpenAI when SUMMARY_ENABLED=1 and OPENAI_API_KEY is set
+    Returns {"text": "<summary>"}, from the LLM when SUMMARY_ENABLED=1 and
+    OPENAI_API_KEY is set. Shares one pooled client, caps concurrent LLM calls
+    and gives up after `timeout` seconds (default SUMMARY_TIMEOUT_S), returning
+    the extractive summary flagged as a fallback.
     """
-    text = (text or "").strip()
-    if not text:
-        return {"text": ""}
-
-    # if LLM disabled or no key, use fallback
-    if not USE_LLM or not OPENAI_API_KEY:
-        return {"text": _extractive_fallback(text, max_words)}
+    with metrics.timed("summarize"):
+        text = (text or "").strip()
+        if not text:
+            return {"text": ""}
+        if not llm_enabled():
+            return {"text": _extractive_fallback(text, max_words)}
 
-    # try OpenAI; on any error, fall back 
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # keep prompt short; pass article as the main content
-        system_msg = (
-            "You are a neutral news assistant. Write a concise, faithful summary in third person. "
-            "Avoid opinionated adjectives, speculation, or instructions; no bullet points unless asked. "
-            "Include who/what/when/where, and key context if essential. Keep it objective."
-        )
-        user_msg = (
-            f"Summarize the following article in ~{max_words} words.\n\n"
-            f"--- ARTICLE START ---\n{ text[:_MAX_INPUT_CHARS] }\n--- ARTICLE END ---"
-        )
-
-        resp = client.chat.completions.create(
-            model=SUMMARY_MODEL,
-            temperature=0.2,
-            max_tokens=300,            
-            messages=[
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg},
-            ],
-        )
-        summary = (resp.choices[0].message.content or "").strip()
-        summary = re.sub(r"\s+", " ", summary)
-        return {"text": summary}
-    except Exception as e:
-        log.warning(f"LLM summarization failed; falling back. Error: {e}")
-        return {"text": _extractive_fallback(text, max_words)}
+        budget = SUMMARY_TIMEOUT_S if timeout is None else timeout
+        # the request's own deadline wins; past it the extractive summary goes out right away
+        left = admission.remaining()
+        if left is not None:
+            budget = max(0.0, min(budget, left))
+        deadline = time.monotonic() + budget
+        client = get_async_client()
+        slots = _slots
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=max(0.0, budget))
+        except asyncio.TimeoutError:
+            return _fallback(text, max_words, "summarize_timeout", f"no free slot within {budget:.1f}s")
+        try:
+            resp = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=SUMMARY_MODEL,
+                    temperature=0.2,
+                    max_tokens=300,
+                    messages=_messages(text, max_words),
+                ),
+                timeout=max(0.0, deadline - time.monotonic()),
+            )
+            return {"text": _clean(resp)}
+        except asyncio.TimeoutError:
+            return _fallback(text, max_words, "summarize_timeout", f"deadline of {budget:.1f}s exceeded")
+        except Exception as e:
+            return _fallback(text, max_words, "summarize_llm", e)
+        finally:
+            slots.release()
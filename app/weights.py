@@ -0,0 +1,78 @@
+"""Memory-mapped checkpoint weights, so several server processes share one copy."""
+from __future__ import annotations
+import os, time, logging
+from pathlib import Path
+from typing import Dict, Any
+
+import torch
+from transformers.modeling_utils import no_init_weights
+
+from .backends import _artifact_dir, _fingerprint
+
+log = logging.getLogger("uvicorn.error")
+
+# BIAS_SHARED_WEIGHTS=1 maps the weights file instead of reading the checkpoint into private memory
+SHARED_WEIGHTS = str(os.getenv("BIAS_SHARED_WEIGHTS", "0")).lower() in {"1", "true", "yes"}
+
+def weights_path(ckpt: str, config) -> Path:
+    return _artifact_dir(ckpt, "mmap") / f"weights-{_fingerprint(ckpt, config)}.pt"
+
+def _tensors(model: torch.nn.Module) -> Dict[str, torch.Tensor]:
+    """every parameter and buffer by name, including tied aliases and non-persistent buffers"""
+    out = {n: p.detach().contiguous() for n, p in model.named_parameters(remove_duplicate=False)}
+    out.update((n, b.detach().contiguous()) for n, b in model.named_buffers(remove_duplicate=False))
+    return out
+
+def export(ckpt: str, local_files_only: bool = False) -> Path:
+    """write the mapped weights file for ckpt unless it's already there; safe to race"""
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    config = AutoConfig.from_pretrained(ckpt, local_files_only=local_files_only)
+    path = weights_path(ckpt, config)
+    if path.exists():
+        return path
+    t0 = time.perf_counter()
+    model = AutoModelForSequenceClassification.from_pretrained(ckpt, local_files_only=local_files_only)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    torch.save(_tensors(model), tmp)
+    os.replace(tmp, path)
+    log.info(f"wrote shared weights for {ckpt} to {path} in {time.perf_counter() - t0:.1f}s")
+    return path
+
+def _assign(model: torch.nn.Module, tensors: Dict[str, torch.Tensor]) -> None:
+    for name, t in tensors.items():
+        mod_name, _, attr = name.rpartition(".")
+        mod = model.get_submodule(mod_name) if mod_name else model
+        if attr in mod._parameters:
+            mod._parameters[attr] = torch.nn.Parameter(t, requires_grad=False)
+        elif attr in mod._buffers:
+            mod._buffers[attr] = t
+    names = [n for n, _ in model.named_parameters(remove_duplicate=False)]
+    names += [n for n, _ in model.named_buffers(remove_duplicate=False)]
+    left = [n for n in names if n not in tensors]
+    if left:
+        raise RuntimeError(f"shared weights file is missing {len(left)} tensors, e.g. {left[:3]}")
+
+def load(ckpt: str, local_files_only: bool = False) -> torch.nn.Module:
+    """the checkpoint as a module whose tensors are views of the mapped weights file"""
+    import transformers
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    path = export(ckpt, local_files_only=local_files_only)
+    config = AutoConfig.from_pretrained(ckpt, local_files_only=local_files_only)
+    # skeleton with uninitialised storage: large torch.empty buffers are never touched, so
+    # they cost no resident memory before _assign swaps them out. (the meta device would
+    # do too, but it drags in sympy; from_config pulls in accelerate)
+    arch = next(iter(getattr(config, "architectures", None) or []), None)
+    model_cls = getattr(transformers, arch, None) if arch else None
+    with no_init_weights():
+        model = model_cls(config) if model_cls else AutoModelForSequenceClassification.from_config(config)
+    # MAP_PRIVATE pages stay shared in the page cache until written, and inference never writes them
+    tensors = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+    _assign(model, tensors)
+    return model.eval()
+
+def info(ckpt: str, config) -> Dict[str, Any]:
+    path = weights_path(ckpt, config)
+    return {"shared_weights": str(path), "size_mb": round(path.stat().st_size / 2 ** 20, 1) if path.exists() else None}
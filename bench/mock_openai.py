@@ -0,0 +1,102 @@
+"""Minimal OpenAI-compatible chat completions server for exercising the summarizer offline."""
+from __future__ import annotations
+import re, json, time, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class _Handler(BaseHTTPRequestHandler):
+    delay_s = 0.0
+    status = 200
+    calls = 0
+    inflight = 0
+    max_inflight = 0   # most requests seen at once, to check client-side concurrency caps
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        cls = type(self)
+        with cls.lock:
+            cls.calls += 1
+            cls.inflight += 1
+            cls.max_inflight = max(cls.max_inflight, cls.inflight)
+        try:
+            time.sleep(self.delay_s)
+            self._answer(body)
+        finally:
+            with cls.lock:
+                cls.inflight -= 1
+
+    def _answer(self, body: dict) -> None:
+        if self.status != 200:
+            out = json.dumps({"error": {"message": "mock failure", "type": "server_error"}}).encode()
+            self.send_response(self.status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+            return
+        user = next((m["content"] for m in body.get("messages", []) if m.get("role") == "user"), "")
+        article = user.split("--- ARTICLE START ---")[-1].split("--- ARTICLE END ---")[0].strip()
+        summary = re.split(r"(?<=[.!?])\s+", article, maxsplit=1)[0]
+        out = json.dumps({
+            "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": summary}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        try:
+            self.wfile.write(out)
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # the client gave up (deadline); that's the point of the exercise
+
+class MockOpenAI:
+    """context manager running the mock on a free localhost port"""
+
+    def __init__(self, delay_ms: float = 0.0, port: int = 0, status: int = 200):
+        handler = type("Handler", (_Handler,), {"delay_s": delay_ms / 1000.0, "status": status, "calls": 0,
+                                                "inflight": 0, "max_inflight": 0, "lock": threading.Lock()})
+        self.handler = handler
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}/v1"
+
+    @property
+    def calls(self) -> int:
+        return self.handler.calls
+
+    @property
+    def max_inflight(self) -> int:
+        return self.handler.max_inflight
+
+    def __enter__(self) -> "MockOpenAI":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--delay-ms", type=float, default=300.0)
+    args = ap.parse_args()
+    with MockOpenAI(args.delay_ms, args.port) as mock:
+        print(f"mock OpenAI at {mock.base_url} (delay {args.delay_ms:.0f} ms)")
+        try:
+            mock.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Offline benchmarks for the model and API against a tiny random BERT and local fixture pages."""
+from __future__ import annotations
+import os, sys, json, time, asyncio, argparse, platform, tempfile, threading, subprocess
+from datetime import datetime, timezone
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from typing import Dict, Any, List, Callable, Optional
+
+from .tiny_model import FIXTURES, build as build_tiny_model
+from .mock_openai import MockOpenAI
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUITES = ("micro", "endpoints", "sweep")
+
+# -------- helpers ----------
+def _pct(sorted_xs: List[float], q: float) -> float:
+    if not sorted_xs:
+        return 0.0
+    return sorted_xs[min(len(sorted_xs) - 1, int(round(q * (len(sorted_xs) - 1))))]
+
+def summarize_ms(samples_s: List[float]) -> Dict[str, float]:
+    xs = sorted(s * 1000.0 for s in samples_s)
+    return {
+        "n": len(xs),
+        "mean_ms": round(sum(xs) / len(xs), 3) if xs else 0.0,
+        "p50_ms": round(_pct(xs, 0.50), 3),
+        "p95_ms": round(_pct(xs, 0.95), 3),
+        "p99_ms": round(_pct(xs, 0.99), 3),
+    }
+
+def time_calls(fn: Callable[[], Any], repeat: int, warmup: int = 2) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    out = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class FixtureServer:
+    """serves bench/fixtures over HTTP on a free localhost port"""
+
+    def __init__(self, root: str = FIXTURES):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(_QuietHandler, directory=root))
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self) -> "FixtureServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def _fixture_names() -> List[str]:
+    return sorted(f for f in os.listdir(FIXTURES) if f.endswith(".html"))
+
+def _fixture_articles() -> Dict[str, Dict[str, str]]:
+    from app.news_fetch import extract_from_html
+    out = {}
+    for name in _fixture_names():
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            out[name] = extract_from_html(f"http://bench.local/{name}", f.read())
+    return out
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+# -------- suites ----------
+def run_micro(args) -> Dict[str, Any]:
+    import torch
+    from app import bias_model
+    from app.bias_model import get_model, _pad, _spans
+
+    m = get_model()
+    texts = [a["title"] + "\n\n" + a["text"] for a in _fixture_articles().values()]
+    batch32 = (texts * 32)[:32]
+    out: Dict[str, Any] = {}
+
+    out["tokenize_1"] = summarize_ms(time_calls(
+        lambda: m.tokenizer(texts[0], truncation=True, max_length=512), args.repeat))
+    out["tokenize_32"] = summarize_ms(time_calls(
+        lambda: m.tokenizer(batch32, truncation=True, max_length=512), args.repeat))
+
+    for length in (64, 128, 512):
+        for bs in (1, 16):
+            ids = [[m.tokenizer.cls_token_id] + [m.tokenizer.unk_token_id] * (length - 2) + [m.tokenizer.sep_token_id]] * bs
+            batch = _pad(m, {"input_ids": ids, "attention_mask": [[1] * length] * bs})
+            with torch.no_grad():
+                out[f"forward_len{length}_bs{bs}"] = summarize_ms(
+                    time_calls(lambda: m.backend(batch), max(3, args.repeat // (4 if length == 512 else 1))))
+
+    for name, text in zip(_fixture_names(), texts):
+        out[f"spans_{name[:-5]}"] = summarize_ms(time_calls(lambda: _spans(text), args.repeat * 5))
+
+    out["classify_batch_32"] = summarize_ms(time_calls(lambda: bias_model.classify_batch(batch32), max(3, args.repeat // 4)))
+    return out
+
+async def _drive(client, method: str, path: str, payloads: List[Any], concurrency: int) -> Dict[str, Any]:
+    """send every payload with at most `concurrency` in flight; latency per request + throughput"""
+    lat: List[float] = []
+    errors = 0
+    it = iter(payloads)
+    lock = asyncio.Lock()
+
+    async def worker():
+        nonlocal errors
+        while True:
+            async with lock:
+                body = next(it, None)
+            if body is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, path, json=body)
+                ok = r.status_code == 200
+            except Exception:
+                ok = False
+            lat.append(time.perf_counter() - t0)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    wall = time.perf_counter() - t0
+    res = summarize_ms(lat)
+    res.update(concurrency=concurrency, errors=errors,
+               throughput_rps=round(len(lat) / wall, 2) if wall else 0.0, wall_s=round(wall, 3))
+    return res
+
+def _client():
+    import httpx
+    from app.api import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+def run_endpoints(args, server: FixtureServer) -> Dict[str, Any]:
+    articles = list(_fixture_articles().values())
+    predict = [{"title": a["title"], "text": a["text"]} for a in articles]
+    n = args.requests
+
+    async def go():
+        async with _client() as c:
+            out = {}
+            out["predict"] = await _drive(c, "POST", "/predict",
+                                          [predict[i % len(predict)] for i in range(n)], args.endpoint_concurrency)
+            out["predict_chunked"] = await _drive(c, "POST", "/predict",
+                                                  [dict(predict[-1], chunked=True)] * max(1, n // 4), args.endpoint_concurrency)
+            batch = [predict[i % len(predict)] for i in range(args.batch_items)]
+            out["batch_predict"] = await _drive(c, "POST", "/batch_predict",
+                                                [batch] * max(1, n // 10), max(1, args.endpoint_concurrency // 4))
+            out["batch_predict"]["items_per_request"] = args.batch_items
+            urls = [{"url": f"{server.base_url}/{name}"} for name in _fixture_names()]
+            out["predict_url"] = await _drive(c, "POST", "/predict_url",
+                                              [urls[i % len(urls)] for i in range(n)], args.endpoint_concurrency)
+            return out
+    return asyncio.run(go())
+
+def run_sweep(args) -> Dict[str, Any]:
+    articles = list(_fixture_articles().values())
+    predict = [{"title": a["title"], "text": a["text"]} for a in articles]
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+
+    async def go():
+        async with _client() as c:
+            out = {}
+            for level in levels:
+                total = max(args.requests, level * 4)
+                out[str(level)] = await _drive(c, "POST", "/predict",
+                                               [predict[i % len(predict)] for i in range(total)], level)
+                print(f"  c={level}: {out[str(level)]['throughput_rps']} rps, p99 {out[str(level)]['p99_ms']} ms",
+                      file=sys.stderr)
+            return out
+    return asyncio.run(go())
+
+# -------- compare ----------
+def _flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(_flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """relative change for latency percentiles and throughput present in both runs"""
+    a, b = _flatten(old.get("results", {})), _flatten(new.get("results", {}))
+    lines = []
+    for key in sorted(set(a) & set(b)):
+        if not key.endswith(("p50_ms", "p95_ms", "p99_ms", "throughput_rps")) or not a[key]:
+            continue
+        change = (b[key] - a[key]) / a[key] * 100.0
+        better = change < 0 if key.endswith("_ms") else change > 0
+        lines.append(f"{key:60s} {a[key]:10.3f} -> {b[key]:10.3f}  {change:+7.1f}% {'better' if better else 'worse'}")
+    return lines
+
+# -------- main ----------
+def _configure_env(args) -> None:
+    """must run before anything under app/ is imported"""
+    if args.model:
+        os.environ["BIAS_MODEL_NAME"] = args.model
+        os.environ["BIAS_TOKENIZER_NAME"] = args.tokenizer or args.model
+    else:
+        d = build_tiny_model(args.tiny_dir)
+        os.environ["BIAS_MODEL_NAME"] = d
+        os.environ["BIAS_TOKENIZER_NAME"] = d
+    if args.mock_llm_ms is not None:
+        # LLM summaries against the local mock, to see summary/classify overlap
+        os.environ.update(SUMMARY_ENABLED="1", OPENAI_API_KEY="bench", OPENAI_BASE_URL=args.mock_base_url)
+    else:
+        os.environ["SUMMARY_ENABLED"] = "0"      # no paid API calls in benchmarks
+    os.environ.setdefault("BIAS_EAGER_LOAD", "0")
+    # high-concurrency sweeps would otherwise measure 429s
+    os.environ.setdefault("ADMISSION_ENABLED", "0")
+    # don't fill data/predictions.db with benchmark traffic
+    os.environ.setdefault("STORE_ENABLED", "0")
+    os.environ.setdefault("WARMUP_LENGTHS", "32,128,512")
+    if not args.with_cache:
+        # measure the work itself, not cache hits
+        os.environ["CACHE_ENABLED"] = "0"
+        os.environ["FETCH_CACHE_DIR"] = ""
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--suites", default=",".join(SUITES))
+    ap.add_argument("--model", help="checkpoint dir or hub id (default: tiny random BERT)")
+    ap.add_argument("--tokenizer")
+    ap.add_argument("--tiny-dir", default=os.path.join(tempfile.gettempdir(), "newsbias-bench-tiny"))
+    ap.add_argument("--repeat", type=int, default=20, help="timed repetitions per microbenchmark")
+    ap.add_argument("--requests", type=int, default=64, help="requests per endpoint load test")
+    ap.add_argument("--endpoint-concurrency", type=int, default=8)
+    ap.add_argument("--batch-items", type=int, default=32, help="items per /batch_predict request")
+    ap.add_argument("--concurrency", default="1,4,16,32", help="levels for the sweep")
+    ap.add_argument("--with-cache", action="store_true", help="leave result and page caches on")
+    ap.add_argument("--mock-llm-ms", type=float, help="summarize via a local mock LLM with this latency")
+    ap.add_argument("--out", help="result JSON (default bench/results/<time>-<commit>.json)")
+    ap.add_argument("--compare", help="older result JSON to diff against")
+    args = ap.parse_args(argv)
+
+    mock = MockOpenAI(args.mock_llm_ms).__enter__() if args.mock_llm_ms is not None else None
+    args.mock_base_url = mock.base_url if mock else None
+    _configure_env(args)
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise SystemExit(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    import torch
+    from app import bias_model, executors
+    from app.config import TORCH_THREADS
+
+    t0 = time.perf_counter()
+    bias_model.get_model()
+    load_s = time.perf_counter() - t0
+
+    commit = _git_commit()
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": commit,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "torch_threads": TORCH_THREADS,
+            "model": os.environ["BIAS_MODEL_NAME"] if args.model else "tiny-random-bert",
+            "model_load_s": round(load_s, 3),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    try:
+        with FixtureServer() as server:
+            for suite in suites:
+                print(f"[{suite}]", file=sys.stderr)
+                if suite == "micro":
+                    report["results"]["micro"] = run_micro(args)
+                elif suite == "endpoints":
+                    report["results"]["endpoints"] = run_endpoints(args, server)
+                elif suite == "sweep":
+                    report["results"]["sweep"] = run_sweep(args)
+    finally:
+        executors.shutdown()
+        if mock:
+            mock.__exit__(None, None, None)
+
+    out = args.out or os.path.join(HERE, "results",
+                                   f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), report):
+                print(line)
+    return report
+
+if __name__ == "__main__":
+    main()
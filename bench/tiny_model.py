@@ -0,0 +1,42 @@
+"""Tiny randomly initialised BERT stand-in so benchmarks and tests run offline."""
+from __future__ import annotations
+import os, re, json, glob
+from typing import Optional
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def _vocab_from_fixtures() -> list:
+    words = set()
+    for path in glob.glob(os.path.join(FIXTURES, "*.html")):
+        text = re.sub(r"<[^>]+>", " ", open(path, encoding="utf-8").read())
+        words.update(w.lower() for w in re.findall(r"[A-Za-z]+", text))
+    chars = list("abcdefghijklmnopqrstuvwxyz0123456789.,;:!?'\"-()")
+    return (["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted(words) + chars
+            + ["##" + c for c in "abcdefghijklmnopqrstuvwxyz0123456789"])
+
+def build(out_dir: str, hidden: int = 64, layers: int = 2, heads: int = 2, seed: int = 0,
+          temperature: Optional[float] = 1.0) -> str:
+    """write tokenizer + config + random weights to out_dir (skipped if already there)"""
+    if os.path.exists(os.path.join(out_dir, "config.json")):
+        return out_dir
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    os.makedirs(out_dir, exist_ok=True)
+    vocab_path = os.path.join(out_dir, "vocab.txt")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(dict.fromkeys(_vocab_from_fixtures())))
+    BertTokenizerFast(vocab_path, do_lower_case=True).save_pretrained(out_dir)
+
+    cfg = BertConfig(
+        vocab_size=sum(1 for _ in open(vocab_path, encoding="utf-8")),
+        hidden_size=hidden, num_hidden_layers=layers, num_attention_heads=heads,
+        intermediate_size=hidden * 4, max_position_embeddings=512, num_labels=3,
+        id2label={0: "left", 1: "center", 2: "right"}, label2id={"left": 0, "center": 1, "right": 2},
+    )
+    torch.manual_seed(seed)
+    BertForSequenceClassification(cfg).save_pretrained(out_dir)
+    if temperature is not None:
+        with open(os.path.join(out_dir, "temperature.json"), "w") as f:
+            json.dump({"temperature": temperature}, f)
+    return out_dir
@@ -0,0 +1,159 @@
+"""Measure per-worker memory of app.serve with and without shared weights."""
+from __future__ import annotations
+import os, sys, json, time, socket, argparse, subprocess
+from typing import Dict, Any, List
+
+import httpx
+
+from .tiny_model import build
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TEXT = ("Lawmakers returned to the capitol on Tuesday to debate the border funding bill, "
+         "with critics saying the tax provisions favour large corporations. ") * 8
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _workers(supervisor_pid: int) -> List[int]:
+    """direct children started by multiprocessing spawn (uvicorn workers)"""
+    out = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmd = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if ppid == supervisor_pid and "spawn_main" in cmd:
+            out.append(int(entry))
+    return sorted(out)
+
+def _is_weights(header: str) -> bool:
+    path = header.split()[-1] if len(header.split()) >= 6 else ""
+    return "/mmap/weights-" in path or path.endswith((".safetensors", ".bin"))
+
+def smaps(pid: int) -> Dict[str, float]:
+    """rss/pss/uss for the whole process plus the same for mapped checkpoint files, in MB"""
+    tot = {"rss": 0, "pss": 0, "uss": 0, "weights_rss": 0, "weights_pss": 0, "weights_private": 0}
+    in_weights = False
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            parts = line.split()
+            if not parts[0].endswith(":"):
+                # mapping header: "addr perms offset dev inode [path]"
+                in_weights = _is_weights(line)
+                continue
+            kb = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+            field = {"Rss:": "rss", "Pss:": "pss", "Private_Clean:": "uss", "Private_Dirty:": "uss"}.get(parts[0])
+            if field is None:
+                continue
+            tot[field] += kb
+            if in_weights:
+                tot["weights_private" if field == "uss" else "weights_" + field] += kb
+    return {k: round(v / 1024, 1) for k, v in tot.items()}
+
+def run_mode(shared: bool, model: str, workers: int, requests: int, timeout_s: float) -> Dict[str, Any]:
+    port = _free_port()
+    # the /readyz wait below needs the model loaded at startup, whatever the caller's env says
+    env = dict(os.environ, BIAS_MODEL_NAME=model, BIAS_SHARED_WEIGHTS="1" if shared else "0", BIAS_EAGER_LOAD="1",
+               SUMMARY_ENABLED="0", OPENAI_API_KEY="", CACHE_ENABLED="0", DEDUP_ENABLED="0",
+               CACHE_DB_PATH="", PYTHONPATH=ROOT)
+    proc = subprocess.Popen([sys.executable, "-m", "app.serve", "--workers", str(workers),
+                             "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, env=env)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        deadline = time.time() + timeout_s
+        ready_streak = 0
+        with httpx.Client(timeout=30) as client:
+            # a worker only answers /readyz 200 once loaded; require a long streak so every worker is in
+            while ready_streak < 6 * workers:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError(f"server didn't become ready (exit={proc.poll()})")
+                try:
+                    ok = client.get(base + "/readyz").status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                ready_streak = ready_streak + 1 if ok else 0
+                time.sleep(0.05 if ok else 0.5)
+            for _ in range(requests):
+                client.post(base + "/predict", json={"title": "Border bill", "text": _TEXT}).raise_for_status()
+        pids = _workers(proc.pid)
+        if len(pids) != workers:
+            raise RuntimeError(f"expected {workers} workers, found {pids}")
+        per = [dict(pid=p, **smaps(p)) for p in pids]
+        return {
+            "shared_weights": shared,
+            "workers": per,
+            "mean_uss_mb": round(sum(w["uss"] for w in per) / len(per), 1),
+            "total_pss_mb": round(sum(w["pss"] for w in per), 1),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", help="checkpoint to serve (default: a random BERT built under --tiny-dir)")
+    ap.add_argument("--tiny-dir", default=os.path.join(ROOT, "bench", ".cache", "memory-model"))
+    ap.add_argument("--hidden", type=int, default=512, help="size of the generated model")
+    ap.add_argument("--layers", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=3)
+    ap.add_argument("--requests", type=int, default=20, help="/predict calls before measuring")
+    ap.add_argument("--timeout-s", type=float, default=300)
+    ap.add_argument("--min-shared", type=float, default=0.9,
+                    help="share of each worker's resident weights that must be shared pages")
+    ap.add_argument("--max-uss-mb", type=float, help="fail if any shared-mode worker's USS is above this")
+    ap.add_argument("--out", help="write the report here as JSON")
+    args = ap.parse_args(argv)
+    if not os.path.exists("/proc/self/smaps"):
+        sys.exit("needs Linux /proc/<pid>/smaps")
+
+    model = args.model or build(args.tiny_dir, hidden=args.hidden, layers=args.layers, heads=8)
+    private = run_mode(False, model, args.workers, args.requests, args.timeout_s)
+    shared = run_mode(True, model, args.workers, args.requests, args.timeout_s)
+    weights_mb = max(w["weights_rss"] for w in shared["workers"])
+
+    failures = []
+    if weights_mb == 0:
+        failures.append("shared mode has no checkpoint weights mapped")
+    # a mapped page counts as private while only one process has it; with N workers
+    # every weights page should be shared
+    unshared = [w for w in shared["workers"] if w["weights_private"] > (1 - args.min_shared) * w["weights_rss"]]
+    if unshared:
+        failures.append(f"{len(unshared)} worker(s) hold over {1 - args.min_shared:.0%} of the weights privately")
+    if args.max_uss_mb is not None:
+        over = [w for w in shared["workers"] if w["uss"] > args.max_uss_mb]
+        if over:
+            failures.append(f"{len(over)} worker(s) above {args.max_uss_mb} MB USS")
+    saving = private["mean_uss_mb"] - shared["mean_uss_mb"]
+
+    report = {
+        "model": model, "workers": args.workers, "weights_mb": weights_mb,
+        "private": private, "shared": shared,
+        "uss_saving_per_worker_mb": round(saving, 1),
+        "total_pss_saving_mb": round(private["total_pss_mb"] - shared["total_pss_mb"], 1),
+        "passed": not failures, "failures": failures,
+    }
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out)
+    print(out)
+    for mode in ("private", "shared"):
+        r = report[mode]
+        print(f"{mode:>8}: mean USS {r['mean_uss_mb']:>7.1f} MB/worker, total PSS {r['total_pss_mb']:>7.1f} MB",
+              file=sys.stderr)
+    print("PASS" if not failures else "FAIL: " + "; ".join(failures), file=sys.stderr)
+    return 0 if not failures else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
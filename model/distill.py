@@ -0,0 +1,273 @@
+"""Distil the fine-tuned classifier into a smaller student and compare the two."""
+import os, re, sys, json, time, copy, hashlib, subprocess
+
+from model import (LABELS, build_parser, setup_env, load_or_build_dataset, splits, training_arguments,
+                   save_calibrated, compute_metrics, expected_calibration_error)
+
+def parse_args(argv=None):
+    ap = build_parser(__doc__)
+    ap.add_argument("--teacher", default="qbias_model", help="fine-tuned checkpoint dir or hub id")
+    ap.add_argument("--student-layers", type=int, default=4)
+    ap.add_argument("--student-hidden", type=int, help="narrower hidden size (random init)")
+    ap.add_argument("--student-init", help="start from this checkpoint instead of teacher layers")
+    ap.add_argument("--alpha", type=float, default=0.7, help="weight of the distillation term")
+    ap.add_argument("--kd-temp", type=float, default=2.0, help="softening temperature tau")
+    ap.add_argument("--bench-n", type=int, default=100, help="eval rows timed one at a time in the report")
+    ap.set_defaults(out="qbias_student", tokenizer=None, lr=5e-5)
+    return ap.parse_args(argv)
+
+# -------- student ----------
+def layer_map(n_teacher, n_student):
+    """evenly spaced teacher layers, always keeping the top one (12 -> 4: 2, 5, 8, 11)"""
+    return [(i + 1) * n_teacher // n_student - 1 for i in range(n_student)]
+
+def make_student(teacher, args):
+    from transformers import AutoModelForSequenceClassification
+    labels = dict(id2label=dict(enumerate(LABELS)), label2id={l: i for i, l in enumerate(LABELS)})
+    if args.student_init:
+        student = AutoModelForSequenceClassification.from_pretrained(
+            args.student_init, num_labels=3, ignore_mismatched_sizes=True, **labels)
+        if student.config.vocab_size != teacher.config.vocab_size:
+            raise SystemExit("--student-init must use the teacher's vocabulary (vocab sizes differ)")
+        return student, "init:" + args.student_init
+
+    cfg = copy.deepcopy(teacher.config)
+    cfg.num_hidden_layers = args.student_layers
+    cfg.id2label, cfg.label2id = labels["id2label"], labels["label2id"]
+    narrower = args.student_hidden and args.student_hidden != teacher.config.hidden_size
+    if narrower:
+        cfg.hidden_size = args.student_hidden
+        cfg.num_attention_heads = max(1, args.student_hidden // 64)
+        cfg.intermediate_size = 4 * args.student_hidden
+    student = AutoModelForSequenceClassification.from_config(cfg)
+    if narrower:
+        return student, f"random:{args.student_layers}x{args.student_hidden}"
+
+    # copy embeddings, pooler, classifier and the mapped encoder layers
+    picks = layer_map(teacher.config.num_hidden_layers, args.student_layers)
+    t_sd, s_sd = teacher.state_dict(), student.state_dict()
+    copied = 0
+    for key in s_sd:
+        m = re.search(r"\.layer\.(\d+)\.", key)
+        src = key.replace(m.group(0), f".layer.{picks[int(m.group(1))]}.", 1) if m else key
+        if src in t_sd and t_sd[src].shape == s_sd[key].shape:
+            s_sd[key] = t_sd[src].clone()
+            copied += 1
+    student.load_state_dict(s_sd)
+    print(f"student: {copied}/{len(s_sd)} tensors from teacher layers {picks}", file=sys.stderr)
+    return student, f"teacher-layers:{picks}"
+
+# -------- teacher soft labels ----------
+def _teacher_temperature(path):
+    try:
+        with open(os.path.join(path, "temperature.json")) as f:
+            return float(json.load(f).get("temperature", 1.0))
+    except (OSError, ValueError):
+        return 1.0
+
+def _model_fingerprint(path):
+    files = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith((".safetensors", ".bin")):
+                st = os.stat(os.path.join(path, name))
+                files.append((name, st.st_size, int(st.st_mtime)))
+    return hashlib.sha256(json.dumps([path, files]).encode("utf-8")).hexdigest()[:16]
+
+def predict_logits(model, tokenizer, ds, batch_size=64):
+    """logits for every row of a tokenized dataset, length-sorted batches, original order"""
+    import numpy as np, torch
+    from transformers import DataCollatorWithPadding
+    collate = DataCollatorWithPadding(tokenizer)
+    names = [c for c in ("input_ids", "attention_mask", "token_type_ids") if c in ds.column_names]
+    rows = ds.select_columns(names)
+    order = np.argsort(ds["length"]) if "length" in ds.column_names else np.arange(len(ds))
+    out = np.zeros((len(ds), model.config.num_labels), dtype=np.float32)
+    model.eval()
+    with torch.no_grad():
+        for i in range(0, len(order), batch_size):
+            idx = order[i:i + batch_size]
+            batch = collate([rows[int(j)] for j in idx])
+            out[idx] = model(**batch).logits.float().numpy()
+    return out
+
+def teacher_logits(teacher, tokenizer, train_ds, args):
+    import numpy as np
+    key = hashlib.sha256(f"{train_ds._fingerprint}|{_model_fingerprint(args.teacher)}".encode()).hexdigest()[:16]
+    path = os.path.join(args.cache_dir, f"teacher-logits-{key}.npy")
+    if not args.no_cache and os.path.exists(path):
+        print(f"teacher logits: cache hit {path}", file=sys.stderr)
+        return np.load(path)
+    t0 = time.perf_counter()
+    logits = predict_logits(teacher, tokenizer, train_ds, args.eval_batch_size)
+    print(f"teacher logits: {len(logits)} rows in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    if not args.no_cache:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        np.save(path + ".tmp.npy", logits)
+        os.replace(path + ".tmp.npy", path)
+    return logits
+
+def distill_trainer_class():
+    import torch.nn.functional as F
+    from transformers import Trainer
+
+    class DistillTrainer(Trainer):
+        def __init__(self, *a, alpha=0.7, kd_temp=2.0, teacher_T=1.0, **kw):
+            super().__init__(*a, **kw)
+            self.alpha, self.kd_temp, self.teacher_T = alpha, kd_temp, teacher_T
+
+        def compute_loss(self, model, inputs, return_outputs=False, **kw):
+            inputs = dict(inputs)
+            inputs.pop("length", None)
+            t_logits = inputs.pop("teacher_logits", None)
+            labels = inputs.pop("labels")
+            outputs = model(**inputs)
+            loss = F.cross_entropy(outputs.logits, labels)
+            if t_logits is not None:
+                tau = self.kd_temp
+                soft = F.softmax(t_logits.float() / (self.teacher_T * tau), dim=-1)
+                kd = F.kl_div(F.log_softmax(outputs.logits / tau, dim=-1), soft, reduction="batchmean")
+                loss = self.alpha * tau * tau * kd + (1.0 - self.alpha) * loss
+            return (loss, outputs) if return_outputs else loss
+
+    return DistillTrainer
+
+# -------- report ----------
+_RSS_PROBE = r"""
+import sys, json, resource, torch
+from transformers import AutoModelForSequenceClassification
+torch.set_num_threads(1)
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+m = AutoModelForSequenceClassification.from_pretrained(sys.argv[1]).eval()
+with torch.no_grad():
+    m(input_ids=torch.ones(8, 512, dtype=torch.long))
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"peak_rss_mb": round(peak / 1024, 1), "model_rss_mb": round((peak - base) / 1024, 1)}))
+"""
+
+def _memory(path):
+    """peak RSS of a fresh process that loads the model and runs one 8x512 batch"""
+    try:
+        out = subprocess.run([sys.executable, "-c", _RSS_PROBE, path], capture_output=True, text=True,
+                             timeout=600, env={**os.environ, "TRANSFORMERS_VERBOSITY": "error"})
+        return json.loads(out.stdout.strip().splitlines()[-1])
+    except Exception as e:
+        return {"error": str(e)}
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))] if xs else 0.0
+
+def profile(name, model, path, tokenizer, eval_ds, T, args):
+    import numpy as np, torch
+    from transformers import DataCollatorWithPadding
+
+    logits = predict_logits(model, tokenizer, eval_ds, args.eval_batch_size)
+    labels = np.asarray(eval_ds["label"])
+    probs = torch.softmax(torch.from_numpy(logits) / T, dim=-1)
+    metrics = compute_metrics((logits, labels))
+
+    # one article per forward pass, like a lone /predict
+    collate = DataCollatorWithPadding(tokenizer)
+    names = [c for c in ("input_ids", "attention_mask", "token_type_ids") if c in eval_ds.column_names]
+    rows = eval_ds.select_columns(names)
+    lat = []
+    with torch.no_grad():
+        for i in range(min(args.bench_n, len(rows))):
+            batch = collate([rows[i]])
+            t0 = time.perf_counter()
+            model(**batch)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+    t0 = time.perf_counter()
+    predict_logits(model, tokenizer, eval_ds, 32)
+    batched_s = time.perf_counter() - t0
+
+    weights = sum(p.numel() * p.element_size() for p in model.parameters())
+    return logits, {
+        "name": name,
+        "layers": model.config.num_hidden_layers,
+        "hidden": model.config.hidden_size,
+        "params_m": round(sum(p.numel() for p in model.parameters()) / 1e6, 2),
+        "weights_mb": round(weights / 2 ** 20, 1),
+        "accuracy": round(metrics["accuracy"], 4),
+        "macro_f1": round(metrics["macro_f1"], 4),
+        "ece": round(expected_calibration_error(probs, torch.from_numpy(labels)), 4),
+        "temperature": round(T, 4),
+        "latency_ms_p50": round(_pct(lat, 0.50), 2),
+        "latency_ms_p95": round(_pct(lat, 0.95), 2),
+        "throughput_items_s": round(len(eval_ds) / batched_s, 1) if batched_s else None,
+        **_memory(path),
+    }
+
+# -------- main ----------
+def main(argv=None):
+    args = parse_args(argv)
+    setup_env(args)
+
+    import numpy as np, torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, DataCollatorWithPadding
+
+    args.tokenizer = args.tokenizer or args.teacher
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    t0 = time.perf_counter()
+    dataset_mapped = load_or_build_dataset(args, tokenizer)
+    prep_s = time.perf_counter() - t0
+    train_ds, eval_ds = splits(args, dataset_mapped)
+
+    teacher = AutoModelForSequenceClassification.from_pretrained(args.teacher).eval()
+    teacher_T = _teacher_temperature(args.teacher)
+    train_ds = train_ds.add_column("teacher_logits", teacher_logits(teacher, tokenizer, train_ds, args).tolist())
+
+    student, init = make_student(teacher, args)
+    DistillTrainer = distill_trainer_class()
+    trainer = DistillTrainer(
+        model=student,
+        # keep teacher_logits/length in the batch; compute_loss strips them
+        args=training_arguments(args, remove_unused_columns=False),
+        train_dataset=train_ds,
+        eval_dataset=eval_ds,
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=args.pad_to_multiple_of),
+        compute_metrics=compute_metrics,
+        alpha=args.alpha, kd_temp=args.kd_temp, teacher_T=teacher_T,
+    )
+    train_out = trainer.train()
+    summary = save_calibrated(trainer, args, train_ds, eval_ds, train_out, prep_s, args.teacher, extra={
+        "distilled_from": args.teacher, "student_init": init,
+        "alpha": args.alpha, "kd_temp": args.kd_temp,
+    })
+
+    # teacher vs student on the eval split
+    student = trainer.model.eval()
+    student_T = _teacher_temperature(args.out)
+    t_logits, t_row = profile("teacher", teacher, args.teacher, tokenizer, eval_ds, teacher_T, args)
+    s_logits, s_row = profile("student", student, args.out, tokenizer, eval_ds, student_T, args)
+    report = {
+        "teacher": t_row,
+        "student": s_row,
+        "agreement": round(float((t_logits.argmax(-1) == s_logits.argmax(-1)).mean()), 4),
+        "accuracy_delta": round(s_row["accuracy"] - t_row["accuracy"], 4),
+        "latency_speedup": round(t_row["latency_ms_p50"] / s_row["latency_ms_p50"], 2) if s_row["latency_ms_p50"] else None,
+        "throughput_speedup": round(s_row["throughput_items_s"] / t_row["throughput_items_s"], 2)
+                              if t_row["throughput_items_s"] else None,
+        "n_eval": len(eval_ds),
+        "torch_threads": torch.get_num_threads(),
+        "student_summary": summary,
+    }
+    with open(os.path.join(args.out, "distill_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    cols = ("params_m", "accuracy", "macro_f1", "ece", "latency_ms_p50", "latency_ms_p95",
+            "throughput_items_s", "peak_rss_mb")
+    print(f"{'':10s}" + "".join(f"{c:>20s}" for c in cols))
+    for row in (t_row, s_row):
+        print(f"{row['name']:10s}" + "".join(f"{str(row.get(c, '-')):>20s}" for c in cols))
+    print(f"agreement {report['agreement']}  latency x{report['latency_speedup']}  "
+          f"throughput x{report['throughput_speedup']}")
+
+    if args.push_to_hub:
+        trainer.push_to_hub()
+    return report
+
+if __name__ == "__main__":
+    main()
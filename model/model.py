@@ -1,79 +1,283 @@
-#Based on https://huggingface.co/docs/transformers/en/training instructions
-
-from huggingface_hub import login
-from datasets import load_dataset
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer
-import numpy as np
-import evaluate
-import pandas as pd
-
-
-login()
-
-label2id = {'left': 0, 'center': 1, 'right': 2}
-
-dataset = load_dataset("csv", data_files="allsides_balanced_news_headlines-texts.csv")
-
-#qbias_df = pd.DataFrame(dataset)
-#print(qbias_df)
-
-dataset = dataset.rename_column("bias_rating", "label")
-dataset_filtered = dataset.filter(lambda example: example['text'] is not None and example['text'] != "")
-dataset_shuffled = dataset_filtered['train'].shuffle(seed=42)
-#dataset_labeled = dataset_filtered['train'].align_labels_with_mapping(label2id, "label")
-
-dataset_split = dataset_shuffled.train_test_split(test_size=0.15)
-
-#print(dataset_split['train'].num_rows)
-#print(dataset_split['test'].num_rows)
-
-def map_label(example):
-    if example['label'] == 'right':
-        example['label'] = 2
-    elif example['label'] == 'center':
-        example['label'] = 1
-    elif example['label'] == 'left':
-        example['label'] = 0
-    return example
-
-dataset_mapped = dataset_split.map(map_label)
-
-tokenizer = AutoTokenizer.from_pretrained("bert-base-cased")
-
-def tokenize(examples):
-    return tokenizer(examples["text"], padding="max_length", truncation=True)
-
-dataset_mapped = dataset_mapped.map(tokenize, batched=True)
-
-
-#small_train = dataset_mapped["train"].shuffle(seed=42).select(range(100))
-#small_eval = dataset_mapped["test"].shuffle(seed=42).select(range(100))
-
-
-model = AutoModelForSequenceClassification.from_pretrained("bucketresearch/politicalBiasBERT", num_labels=3)
-
-metric = evaluate.load("accuracy")
-
-def compute_metrics(eval_pred):
-    logits, labels = eval_pred
-    # convert the logits to their predicted class
-    predictions = np.argmax(logits, axis=-1)
-    return metric.compute(predictions=predictions, references=labels)
-
-training_args = TrainingArguments(
-    eval_strategy="epoch",
-    push_to_hub=True,
-    output_dir="qbias_model",
-)
-
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=dataset_mapped["train"],
-    eval_dataset=dataset_mapped["test"],
-    compute_metrics=compute_metrics,
-)
-trainer.train()
-trainer.evaluate()
-
-trainer.push_to_hub("Halfbendy/QbiasBERT")
\ No newline at end of file
+#Based on https://huggingface.co/docs/transformers/en/training instructions
+"""Fine-tune the bias classifier from a labelled CSV, with calibration and an eval summary."""
+import os, sys, json, time, hashlib, argparse
+
+LABELS = ["Left", "Center", "Right"]
+label2id = {'left': 0, 'center': 1, 'right': 2}
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def build_parser(doc=__doc__):
+    ap = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--csv", default="allsides_balanced_news_headlines-texts.csv")
+    ap.add_argument("--text-col", default="text")
+    ap.add_argument("--label-col", default="bias_rating")
+    ap.add_argument("--base-model", default="bucketresearch/politicalBiasBERT")
+    ap.add_argument("--tokenizer", default="bert-base-cased")
+    ap.add_argument("--out", default="qbias_model", help="output dir for checkpoints and the final model")
+    ap.add_argument("--max-len", type=int, default=512, help="truncate to this many tokens")
+    ap.add_argument("--epochs", type=float, default=3)
+    ap.add_argument("--batch-size", type=int, default=16)
+    ap.add_argument("--eval-batch-size", type=int, default=64)
+    ap.add_argument("--lr", type=float, default=2e-5)
+    ap.add_argument("--weight-decay", type=float, default=0.01)
+    ap.add_argument("--warmup-ratio", type=float, default=0.06)
+    ap.add_argument("--test-size", type=float, default=0.15)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--max-train-samples", type=int, help="subsample the train split (quick runs)")
+    ap.add_argument("--max-eval-samples", type=int)
+    ap.add_argument("--no-group-by-length", action="store_true")
+    ap.add_argument("--pad-to-multiple-of", type=int, help="e.g. 8 for tensor cores on GPU")
+    ap.add_argument("--fp16", action="store_true", help="mixed precision (GPU only)")
+    ap.add_argument("--num-workers", type=int, default=0, help="dataloader workers")
+    ap.add_argument("--cache-dir", default=os.path.join(HERE, ".cache"), help="tokenized dataset cache")
+    ap.add_argument("--no-cache", action="store_true", help="always re-tokenize")
+    ap.add_argument("--offline", action="store_true", help="never touch the network (HF_HUB_OFFLINE)")
+    ap.add_argument("--push-to-hub", metavar="REPO_ID", help="push the final model here")
+    return ap
+
+def parse_args(argv=None):
+    return build_parser().parse_args(argv)
+
+# -------- tokenized dataset cache ----------
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _tokenizer_sha256(tokenizer):
+    if getattr(tokenizer, "is_fast", False):
+        return hashlib.sha256(tokenizer.backend_tokenizer.to_str().encode("utf-8")).hexdigest()
+    return hashlib.sha256(json.dumps(sorted(tokenizer.get_vocab().items())).encode("utf-8")).hexdigest()
+
+def fingerprint(args, tokenizer):
+    import datasets, transformers
+    parts = {
+        "csv": _file_sha256(args.csv),
+        "text_col": args.text_col, "label_col": args.label_col,
+        "tokenizer": _tokenizer_sha256(tokenizer), "max_len": args.max_len,
+        "test_size": args.test_size, "seed": args.seed,
+        "datasets": datasets.__version__, "transformers": transformers.__version__,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def build_dataset(args, tokenizer):
+    """load, clean, split and tokenize the CSV (unpadded, with a `length` column)"""
+    from datasets import load_dataset
+
+    dataset = load_dataset("csv", data_files=args.csv)["train"]
+    if args.label_col != "label":
+        dataset = dataset.rename_column(args.label_col, "label")
+    text_col = args.text_col
+
+    def keep(example):
+        return bool(example[text_col]) and str(example["label"]).strip().lower() in label2id
+    dataset = dataset.filter(keep)
+
+    # new column rather than overwriting in place, or the string dtype sticks
+    def map_label(example):
+        return {"label_id": label2id[str(example['label']).strip().lower()]}
+    dataset = dataset.map(map_label, remove_columns=["label"]).rename_column("label_id", "label")
+
+    dataset_split = dataset.shuffle(seed=args.seed).train_test_split(test_size=args.test_size, seed=args.seed)
+
+    # no padding here: the collator pads each batch to its own longest row
+    def tokenize(examples):
+        enc = tokenizer(examples[text_col], truncation=True, max_length=args.max_len)
+        enc["length"] = [len(ids) for ids in enc["input_ids"]]
+        return enc
+
+    keep_cols = {"label"}
+    drop = [c for c in dataset_split["train"].column_names if c not in keep_cols]
+    return dataset_split.map(tokenize, batched=True, remove_columns=drop)
+
+def load_or_build_dataset(args, tokenizer):
+    from datasets import load_from_disk
+    if args.no_cache:
+        return build_dataset(args, tokenizer)
+    path = os.path.join(args.cache_dir, f"tokenized-{fingerprint(args, tokenizer)}")
+    if os.path.isdir(path):
+        print(f"tokenized dataset: cache hit {path}", file=sys.stderr)
+        return load_from_disk(path)
+    ds = build_dataset(args, tokenizer)
+    tmp = path + ".tmp"
+    ds.save_to_disk(tmp)
+    os.replace(tmp, path)
+    print(f"tokenized dataset: cached at {path}", file=sys.stderr)
+    return ds
+
+# -------- metrics + calibration ----------
+def compute_metrics(eval_pred):
+    import numpy as np
+    logits, labels = eval_pred
+    # convert the logits to their predicted class
+    predictions = np.argmax(logits, axis=-1)
+    out = {"accuracy": float((predictions == labels).mean())}
+    f1s = []
+    for k, name in enumerate(LABELS):
+        tp = int(((predictions == k) & (labels == k)).sum())
+        fp = int(((predictions == k) & (labels != k)).sum())
+        fn = int(((predictions != k) & (labels == k)).sum())
+        f1 = 2 * tp / (2 * tp + fp + fn) if tp + fp + fn else 0.0
+        out[f"f1_{name.lower()}"] = f1
+        f1s.append(f1)
+    out["macro_f1"] = sum(f1s) / len(f1s)
+    return out
+
+def expected_calibration_error(probs, labels, bins=15):
+    import torch
+    conf, pred = probs.max(dim=-1)
+    correct = (pred == labels).float()
+    ece = torch.zeros(())
+    edges = torch.linspace(0, 1, bins + 1)
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        mask = (conf > lo) & (conf <= hi)
+        if mask.any():
+            ece += mask.float().mean() * (conf[mask].mean() - correct[mask].mean()).abs()
+    return float(ece)
+
+def fit_temperature(logits, labels):
+    """single temperature minimizing NLL on held-out logits (LBFGS on log T)"""
+    import torch
+    logits = torch.as_tensor(logits, dtype=torch.float32)
+    labels = torch.as_tensor(labels, dtype=torch.long)
+    nll = torch.nn.CrossEntropyLoss()
+    log_t = torch.zeros(1, requires_grad=True)
+    opt = torch.optim.LBFGS([log_t], lr=0.1, max_iter=200)
+
+    def closure():
+        opt.zero_grad()
+        loss = nll(logits / log_t.exp(), labels)
+        loss.backward()
+        return loss
+    opt.step(closure)
+
+    T = float(log_t.detach().exp())
+    before, after = torch.softmax(logits, -1), torch.softmax(logits / T, -1)
+    return T, {
+        "nll_before": round(float(nll(logits, labels)), 4),
+        "nll_after": round(float(nll(logits / T, labels)), 4),
+        "ece_before": round(expected_calibration_error(before, labels), 4),
+        "ece_after": round(expected_calibration_error(after, labels), 4),
+    }
+
+# -------- shared training plumbing (also used by distill.py) ----------
+def setup_env(args):
+    if args.offline:
+        # must be set before transformers/datasets are imported
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["HF_DATASETS_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    if args.offline and args.push_to_hub:
+        raise SystemExit("--push-to-hub needs the network; drop --offline")
+
+def splits(args, dataset_mapped):
+    train_ds, eval_ds = dataset_mapped["train"], dataset_mapped["test"]
+    if args.max_train_samples:
+        train_ds = train_ds.select(range(min(args.max_train_samples, len(train_ds))))
+    if args.max_eval_samples:
+        eval_ds = eval_ds.select(range(min(args.max_eval_samples, len(eval_ds))))
+    return train_ds, eval_ds
+
+def training_arguments(args, **overrides):
+    from transformers import TrainingArguments
+    kw = dict(
+        output_dir=args.out,
+        eval_strategy="epoch",
+        save_strategy="epoch",
+        save_total_limit=2,
+        load_best_model_at_end=True,
+        metric_for_best_model="accuracy",
+        num_train_epochs=args.epochs,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.eval_batch_size,
+        learning_rate=args.lr,
+        weight_decay=args.weight_decay,
+        warmup_ratio=args.warmup_ratio,
+        group_by_length=not args.no_group_by_length,
+        length_column_name="length",
+        dataloader_num_workers=args.num_workers,
+        fp16=args.fp16,
+        seed=args.seed,
+        logging_steps=50,
+        report_to="none",
+        push_to_hub=bool(args.push_to_hub),
+        hub_model_id=args.push_to_hub,
+    )
+    kw.update(overrides)
+    return TrainingArguments(**kw)
+
+def save_calibrated(trainer, args, train_ds, eval_ds, train_out, prep_s, base_model, extra=None):
+    """
+    calibrate on the eval split, then save the model with the temperature.json
+    and eval_summary.json the API reads next to the weights
+    """
+    pred = trainer.predict(eval_ds)
+    T, calib = fit_temperature(pred.predictions, pred.label_ids)
+    metrics = {k.replace("test_", ""): v for k, v in pred.metrics.items()}
+
+    trainer.save_model(args.out)
+    with open(os.path.join(args.out, "temperature.json"), "w") as f:
+        json.dump({"temperature": round(T, 4), **calib}, f, indent=2)
+    summary = {
+        "accuracy": round(metrics.get("accuracy", 0.0), 4),
+        "macro_f1": round(metrics.get("macro_f1", 0.0), 4),
+        **{f"f1_{l.lower()}": round(metrics.get(f"f1_{l.lower()}", 0.0), 4) for l in LABELS},
+        "eval_loss": round(metrics.get("loss", 0.0), 4),
+        "ece": calib["ece_after"],
+        "n_train": len(train_ds),
+        "n_eval": len(eval_ds),
+        "max_len": args.max_len,
+        "epochs": args.epochs,
+        "base_model": base_model,
+        "train_runtime_s": round(train_out.metrics.get("train_runtime", 0.0), 1),
+        "train_samples_per_s": round(train_out.metrics.get("train_samples_per_second", 0.0), 2),
+        "data_prep_s": round(prep_s, 2),
+        **(extra or {}),
+    }
+    with open(os.path.join(args.out, "eval_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+# -------- main ----------
+def main(argv=None):
+    args = parse_args(argv)
+    setup_env(args)
+
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, DataCollatorWithPadding
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    t0 = time.perf_counter()
+    dataset_mapped = load_or_build_dataset(args, tokenizer)
+    prep_s = time.perf_counter() - t0
+    train_ds, eval_ds = splits(args, dataset_mapped)
+
+    model = AutoModelForSequenceClassification.from_pretrained(
+        args.base_model, num_labels=3,
+        id2label=dict(enumerate(LABELS)), label2id={l: i for i, l in enumerate(LABELS)},
+        ignore_mismatched_sizes=True,
+    )
+
+    trainer = Trainer(
+        model=model,
+        args=training_arguments(args),
+        train_dataset=train_ds,
+        eval_dataset=eval_ds,
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=args.pad_to_multiple_of),
+        compute_metrics=compute_metrics,
+    )
+    train_out = trainer.train()
+
+    summary = save_calibrated(trainer, args, train_ds, eval_ds, train_out, prep_s, args.base_model)
+    print(json.dumps(summary, indent=2))
+
+    if args.push_to_hub:
+        # uploads the output dir, temperature.json and eval_summary.json included
+        trainer.push_to_hub()
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os, sys, time, tempfile, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app/ reads its settings at import time, so the environment is fixed here, before any test imports it
+from bench.tiny_model import build as build_tiny_model, FIXTURES  # noqa: E402
+
+_TMP = tempfile.mkdtemp(prefix="newsbias-tests-")
+_TINY = build_tiny_model(os.path.join(tempfile.gettempdir(), "newsbias-bench-tiny"))
+os.environ.update(
+    DATA_DIR=os.path.join(_TMP, "data"),
+    BIAS_MODEL_NAME=_TINY,
+    BIAS_TOKENIZER_NAME=_TINY,
+    BIAS_EAGER_LOAD="0",
+    WARMUP_LENGTHS="32",
+    SUMMARY_ENABLED="0",
+    STORE_ENABLED="0",
+    CACHE_ENABLED="0",
+    ADMISSION_ENABLED="0",
+    EXTRACT_PROCESSES="0",
+    FETCH_HTTP2="0",
+)
+
+def fixture_html(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+class Site:
+    """
+    localhost HTTP server with pages set per test. Pages that have an etag or
+    last_modified answer matching conditional GETs with 304; every request is
+    logged as (path, headers, status)
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                page = site.pages.get(self.path.split("?", 1)[0])
+                status = 200
+                if page is None:
+                    status = 404
+                elif (page.get("etag") and self.headers.get("If-None-Match") == page["etag"]) or \
+                        (page.get("last_modified") and self.headers.get("If-Modified-Since") == page["last_modified"]):
+                    status = 304
+                else:
+                    status = page.get("status", 200)
+                site.requests.append((self.path, dict(self.headers), status))
+                if page and page.get("delay"):
+                    time.sleep(page["delay"])
+                body = b"" if status == 304 else (page or {}).get("body", b"not found")
+                self.send_response(status)
+                if page:
+                    if page.get("etag"):
+                        self.send_header("ETag", page["etag"])
+                    if page.get("last_modified"):
+                        self.send_header("Last-Modified", page["last_modified"])
+                    self.send_header("Content-Type", page.get("content_type", "text/html; charset=utf-8"))
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass   # the client timed out
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def hits(self, path: str):
+        return [r for r in self.requests if r[0] == path]
+
+@pytest.fixture
+def site():
+    s = Site()
+    s.thread.start()
+    yield s
+    s.httpd.shutdown()
+    s.httpd.server_close()
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import admission
+from app.api import app
+
+TEXT = "The council approved the budget on Monday after a long debate."
+
+@pytest.fixture
+def gated(monkeypatch):
+    """admission on, with fresh gates; returns a function installing a rate limiter"""
+    monkeypatch.setattr(admission, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission, "REQUEST_DEADLINE_S", 0.0)
+    for path, gate in list(admission.gates.items()):
+        monkeypatch.setitem(admission.gates, path, admission.EndpointGate(path, gate.concurrency, gate.queue))
+
+    def limit(rate: float, burst: float) -> admission.RateLimiter:
+        limiter = admission.RateLimiter(rate=rate, burst=burst)
+        monkeypatch.setattr(admission, "limiter", limiter)
+        return limiter
+
+    return limit
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def post(client, path, body, who="a", **headers):
+    return client.post(path, json=body, headers={"X-Client-Id": who, **headers})
+
+def test_rate_limit_answers_429_with_retry_after(gated, client):
+    limiter = gated(rate=0.5, burst=1)
+    assert post(client, "/predict", {"text": "short"}).status_code == 400   # admitted, then refused by the handler
+    r = post(client, "/predict", {"text": "short"})
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "2"
+    assert "rate_limited" in r.json()["detail"]
+    # clients have separate buckets
+    assert post(client, "/predict", {"text": "short"}, who="b").status_code == 400
+    assert limiter.stats()["limited"] == 1 and limiter.stats()["clients"] == 2
+
+def test_oversized_batch_is_413(gated, client, monkeypatch):
+    monkeypatch.setattr(admission, "BATCH_PREDICT_MAX_ITEMS", 2)
+    r = post(client, "/batch_predict", [{"text": TEXT}] * 3)
+    assert r.status_code == 413
+    assert "at most 2 items" in r.json()["detail"]
+
+def test_batch_pays_a_token_per_item(gated, client):
+    gated(rate=0.01, burst=3)
+    r = post(client, "/batch_predict", [{"text": TEXT}] * 4)
+    # one token on admission, three more for the rest of the batch: more than the bucket holds
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    gated(rate=0.01, burst=3)
+    r = post(client, "/batch_predict", [{"text": TEXT}] * 3)
+    assert r.status_code == 200 and len(r.json()) == 3
+    assert post(client, "/predict", {"text": TEXT}).status_code == 429
+
+def test_spent_deadline_is_504(gated, client):
+    r = post(client, "/predict", {"text": TEXT}, **{"X-Deadline-Ms": "0"})
+    assert r.status_code == 504
+    assert r.json()["stage"]
+
+def test_endpoints_without_a_gate_are_not_limited(gated, client):
+    gated(rate=0.01, burst=1)
+    for _ in range(3):
+        assert client.get("/healthz").status_code == 200
+
+def test_gate_queues_in_order_then_rejects_and_expires():
+    async def go():
+        gate = admission.EndpointGate("/x", concurrency=1, queue=1)
+        first = await gate.acquire(1.0)
+        waiter = asyncio.ensure_future(gate.acquire(1.0))
+        await asyncio.sleep(0)
+        with pytest.raises(admission.Rejected) as rejected:
+            await gate.acquire(1.0)
+        assert rejected.value.reason == "queue_full" and rejected.value.retry_after >= 1
+        gate.release(first)
+        second = await waiter
+        assert gate.inflight == 1
+        with pytest.raises(admission.DeadlineExceeded) as exceeded:
+            await gate.acquire(0.05)
+        assert exceeded.value.stage == "admission"
+        gate.release(second)
+        return gate.stats()
+
+    st = asyncio.run(go())
+    assert st["inflight"] == 0 and st["waiting"] == 0
+    assert (st["admitted"], st["rejected"], st["expired_in_queue"]) == (2, 1, 1)
@@ -0,0 +1,118 @@
+import time, threading
+
+import pytest
+
+from app import admission
+from app.batching import MicroBatcher
+
+class Model:
+    """stand-in for classify_batch: records batch sizes, can be held or made to fail"""
+
+    def __init__(self):
+        self.sizes = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+        self.fail = False
+
+    def __call__(self, texts):
+        self.sizes.append(len(texts))
+        self.entered.set()
+        self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("boom")
+        return [{"label": t.upper()} for t in texts]
+
+@pytest.fixture
+def model():
+    return Model()
+
+def hold(model, batcher):
+    """get one lone item into fn and keep it there, so later submits queue up behind it"""
+    model.gate.clear()
+    model.entered.clear()
+    fut = batcher.submit("first")
+    assert model.entered.wait(5)
+    return fut
+
+def test_each_caller_gets_its_own_result_in_order(model):
+    b = MicroBatcher(model, max_batch_size=8, max_wait_ms=50)
+    try:
+        first = hold(model, b)
+        futs = [b.submit(f"t{i}") for i in range(5)]
+        model.gate.set()
+        assert first.result(5) == {"label": "FIRST"}
+        assert [f.result(5) for f in futs] == [{"label": f"T{i}"} for i in range(5)]
+        assert model.sizes == [1, 5]
+        st = b.stats()
+        assert (st["submitted"], st["completed"], st["batches"], st["errors"]) == (6, 6, 2, 0)
+        assert st["batch_size_hist"] == {"1": 1, "5": 1}
+    finally:
+        b.close()
+
+def test_batches_are_capped_at_max_size(model):
+    b = MicroBatcher(model, max_batch_size=4, max_wait_ms=20)
+    try:
+        first = hold(model, b)
+        futs = [b.submit(f"t{i}") for i in range(6)]
+        model.gate.set()
+        first.result(5)
+        [f.result(5) for f in futs]
+        assert model.sizes == [1, 4, 2]
+        assert b.stats()["max_batch_size_seen"] == 4
+    finally:
+        b.close()
+
+def test_lone_request_is_not_held_but_overlapping_traffic_waits_to_fill(model):
+    b = MicroBatcher(model, max_batch_size=8, max_wait_ms=300)
+    try:
+        t0 = time.monotonic()
+        b.classify("alone")
+        assert time.monotonic() - t0 < 0.2          # last batch was a lone request: no wait
+        first = hold(model, b)
+        b.submit("a"), b.submit("b")
+        model.gate.set()
+        first.result(5)
+        time.sleep(0.05)
+        # the last batch had two items, so the next one waits up to max_wait for company
+        t0 = time.monotonic()
+        b.classify("c")
+        assert 0.25 < time.monotonic() - t0 < 1.0
+        assert model.sizes == [1, 1, 2, 1]
+    finally:
+        b.close()
+
+def test_failure_reaches_every_caller_in_the_batch(model):
+    b = MicroBatcher(model, max_batch_size=8, max_wait_ms=50)
+    try:
+        first = hold(model, b)
+        futs = [b.submit(f"t{i}") for i in range(3)]
+        model.fail = True
+        model.gate.set()
+        for f in [first] + futs:
+            with pytest.raises(RuntimeError, match="boom"):
+                f.result(5)
+        st = b.stats()
+        assert st["errors"] == 4 and st["batches"] == 2
+    finally:
+        b.close()
+
+def test_expired_and_cancelled_items_are_not_counted(model):
+    b = MicroBatcher(model, max_batch_size=8, max_wait_ms=50)
+    try:
+        first = hold(model, b)
+        expired = b.submit("late", deadline=time.monotonic())
+        cancelled = b.submit("gone")
+        cancelled.cancel()
+        model.gate.set()
+        first.result(5)
+        with pytest.raises(admission.DeadlineExceeded):
+            expired.result(5)
+        time.sleep(0.05)
+        # the second batch had nothing live: fn wasn't called and no batch was recorded
+        assert model.sizes == [1]
+        st = b.stats()
+        assert (st["completed"], st["batches"], st["dropped_expired"]) == (1, 1, 1)
+        assert st["mean_batch_size"] == 1.0
+    finally:
+        b.close()
@@ -0,0 +1,49 @@
+import os, sys, subprocess
+
+import pytest
+
+from app import bias_model
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LONG = " ".join(f"The council met on day {i} and argued over the transit budget once more." for i in range(120))
+
+@pytest.mark.parametrize("how", bias_model.AGGREGATES)
+def test_classify_long_reports_the_aggregate_it_used(how):
+    out = bias_model.classify_long(LONG, aggregate=how, max_windows=4)
+    assert out["aggregate"] == how
+    assert out["n_windows"] > 1 and len(out["windows"]) <= 4
+    assert abs(sum(out["probs"].values()) - 1.0) < 1e-3
+
+def test_unknown_aggregate_is_rejected():
+    with pytest.raises(ValueError, match="unknown aggregate 'median'"):
+        bias_model.classify_long(LONG, aggregate="median")
+
+def test_unknown_long_aggregate_env_fails_at_import():
+    env = dict(os.environ, LONG_AGGREGATE="median", PYTHONPATH=ROOT)
+    proc = subprocess.run([sys.executable, "-c", "import app.bias_model"], env=env, cwd=ROOT,
+                          capture_output=True, text=True)
+    assert proc.returncode != 0
+    assert "unknown LONG_AGGREGATE 'median'" in proc.stderr
+
+def test_classify_batch_keeps_input_order_under_a_small_token_budget(monkeypatch):
+    words = "the council approved the transit budget after critics said the plan cut too deep".split()
+    texts = [" ".join(words[:n] * r) for n, r in [(14, 3), (3, 1), (8, 2), (14, 1), (5, 4), (2, 1)]]
+    texts.insert(3, "   ")
+    shapes = []
+    real = bias_model._forward
+
+    def spy(m, batch):
+        shapes.append(tuple(batch["input_ids"].shape))
+        return real(m, batch)
+
+    monkeypatch.setattr(bias_model, "_forward", spy)
+    batched = bias_model.classify_batch(texts, max_batch_tokens=64)
+    # length-sorted chunks, each padded block within the budget (a lone over-budget row aside)
+    assert len(shapes) > 1 and all(rows * width <= 64 or rows == 1 for rows, width in shapes)
+    assert batched[3] == bias_model._empty_result()
+    # every text scores differently, so a result handed to the wrong caller would show
+    assert len({tuple(sorted(r["probs"].items())) for r in batched}) == len(texts)
+    for text, got in zip(texts, batched):
+        one = bias_model.classify(text)
+        assert got["label"] == one["label"]
+        assert got["probs"] == pytest.approx(one["probs"], abs=1e-4)
@@ -0,0 +1,86 @@
+import time, asyncio, threading
+
+import pytest
+
+from app import cache
+
+@pytest.fixture
+def disk(tmp_path, monkeypatch):
+    """path for a fresh sqlite tier (the tier is a process-wide singleton)"""
+    monkeypatch.setattr(cache, "_disk", None)
+    return str(tmp_path / "cache.db")
+
+def test_key_ignores_whitespace_and_unicode_form_but_not_settings():
+    a = cache.make_key("Café  budget\n vote", model="m", chunked=False)
+    assert a == cache.make_key("Café budget vote ", chunked=False, model="m")
+    assert a != cache.make_key("Café budget vote", model="m", chunked=True)
+    assert a != cache.make_key("Café budget votes", model="m", chunked=False)
+
+def test_lru_evicts_least_recently_used():
+    c = cache.ResultCache("t", max_items=2, db_path="")
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1          # a is now the most recent
+    c.set("c", 3)
+    assert c.get("b") is None and c.get("a") == 1 and c.get("c") == 3
+    st = c.stats()
+    assert (st["size"], st["evictions"], st["hits"], st["misses"]) == (2, 1, 3, 1)
+
+def test_entries_expire_after_ttl():
+    c = cache.ResultCache("t", ttl_s=0.05, db_path="")
+    c.set("a", {"label": "Left"})
+    assert c.get("a") == {"label": "Left"}
+    time.sleep(0.08)
+    assert c.get("a") is None
+    assert c.stats()["expirations"] == 1
+
+def test_disk_tier_survives_a_new_cache_and_is_promoted(disk):
+    cache.ResultCache("classify", db_path=disk).set("k", {"label": "Right"})
+    fresh = cache.ResultCache("classify", db_path=disk)
+    assert fresh.get("k") == {"label": "Right"}
+    assert fresh.get("k") == {"label": "Right"}
+    st = fresh.stats()
+    assert (st["disk_hits"], st["hits"], st["disk_size"]) == (1, 1, 1)
+    # namespaces don't see each other's entries
+    assert cache.ResultCache("summary", db_path=disk).get("k") is None
+
+def test_expired_disk_entries_are_dropped(disk):
+    cache.ResultCache("classify", ttl_s=0.05, db_path=disk).set("k", "v")
+    time.sleep(0.08)
+    fresh = cache.ResultCache("classify", db_path=disk)
+    assert fresh.get("k") is None and fresh.stats()["disk_size"] == 0
+
+def test_async_access_keeps_the_disk_tier_off_the_event_loop(disk, monkeypatch):
+    threads = []
+    real_get, real_set = cache._DiskTier.get, cache._DiskTier.set
+
+    def get(self, *a):
+        threads.append(threading.current_thread())
+        return real_get(self, *a)
+
+    def set_(self, *a):
+        threads.append(threading.current_thread())
+        return real_set(self, *a)
+
+    monkeypatch.setattr(cache._DiskTier, "get", get)
+    monkeypatch.setattr(cache._DiskTier, "set", set_)
+
+    async def go():
+        await cache.ResultCache("classify", db_path=disk).aset("k", [1, 2])
+        fresh = cache.ResultCache("classify", db_path=disk)
+        got = await fresh.aget("k"), await fresh.aget("k"), await fresh.aget("missing")
+        return got, threading.current_thread()
+
+    got, loop_thread = asyncio.run(go())
+    assert got == ([1, 2], [1, 2], None)
+    assert len(threads) == 3                  # set, the first get, the miss; the second get was a memory hit
+    assert loop_thread not in threads
+
+def test_cached_classify_results_drop_the_embedding(monkeypatch):
+    from app import api
+    c = cache.ResultCache("classify", db_path="")
+    monkeypatch.setattr(cache, "classify_cache", c)
+    res = {"label": "Center", "probs": {"Center": 1.0}, "embedding": "AAAA"}
+    asyncio.run(api._remember_classify("k", None, False, res))
+    assert c.get("k") == {"label": "Center", "probs": {"Center": 1.0}}
+    assert "embedding" in res
@@ -0,0 +1,82 @@
+import csv, random
+
+import numpy as np
+import pytest
+
+from app import cascade
+
+VOCAB = {
+    0: "union wages climate equity healthcare workers public transit renters".split(),
+    1: "council report budget committee schedule agency figures review".split(),
+    2: "taxes border security deregulation business liberty police defense".split(),
+}
+FILLER = "the a of and to in on for said today".split()
+
+def article(rng, label, n=40):
+    words = [rng.choice(VOCAB[label]) if rng.random() < 0.5 else rng.choice(FILLER) for _ in range(n)]
+    return " ".join(words)
+
+def corpus(n, seed):
+    rng = random.Random(seed)
+    labels = [rng.randrange(3) for _ in range(n)]
+    return [article(rng, y) for y in labels], labels
+
+@pytest.fixture(scope="module")
+def model():
+    texts, labels = corpus(600, seed=0)
+    m = cascade.train(texts, labels, bits=12, epochs=4)
+    val_texts, val_labels = corpus(200, seed=1)
+    m.T = cascade.fit_temperature(m.logits(val_texts), val_labels)
+    return m
+
+@pytest.fixture
+def serving(model, monkeypatch):
+    monkeypatch.setattr(cascade, "CASCADE_ENABLED", True)
+    monkeypatch.setattr(cascade, "_model", model)
+    return model
+
+def test_trained_model_separates_the_classes(model):
+    texts, labels = corpus(200, seed=2)
+    acc = (model.predict_proba(texts).argmax(1) == np.asarray(labels)).mean()
+    assert acc > 0.95
+
+def test_gate_answers_confident_texts_and_escalates_the_rest(serving):
+    rng = random.Random(3)
+    clear = [article(rng, 0), article(rng, 2)]
+    vague = " ".join(FILLER * 3)
+    out = cascade.gate(clear + [vague, "   "], threshold=0.9)
+    assert [r["label"] for r in out[:2]] == ["Left", "Right"]
+    assert all(r["stage"] == "linear" and r["confidence"] >= 0.9 for r in out[:2])
+    assert abs(sum(out[0]["probs"].values()) - 1.0) < 1e-5
+    assert out[2] is None and out[3] is None
+    # the threshold decides how much the linear stage takes
+    assert cascade.gate(clear, threshold=1.01) == [None, None]
+    assert all(r is not None for r in cascade.gate(clear + [vague], threshold=0.0))
+
+def test_gate_is_a_no_op_when_disabled(model, monkeypatch):
+    monkeypatch.setattr(cascade, "CASCADE_ENABLED", False)
+    monkeypatch.setattr(cascade, "_model", model)
+    assert cascade.gate(["anything at all"]) == [None]
+    assert cascade.signature() is None
+
+def test_temperature_cools_an_overconfident_model():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 3, 500)
+    logits = rng.normal(size=(500, 3))
+    logits[np.arange(500), y] += 1.0
+    assert cascade.fit_temperature(logits * 10, y) > 5
+
+def test_train_cli_writes_a_loadable_model(tmp_path):
+    texts, labels = corpus(300, seed=4)
+    path = tmp_path / "train.csv"
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["title", "text", "bias_rating"])
+        for t, y in zip(texts, labels):
+            w.writerow(["", t, cascade.LABELS[y].lower()])
+    out = tmp_path / "cascade.npz"
+    report = cascade.main(["train", "--csv", str(path), "--out", str(out), "--bits", "12", "--epochs", "4"])
+    assert report["n_train"] + report["n_val"] == 300 and report["val_accuracy"] > 0.9
+    loaded = cascade.LinearModel.load(str(out))
+    assert loaded.bits == 12 and loaded.T == pytest.approx(report["temperature"], rel=1e-3)
+    assert loaded.meta["n_train"] == report["n_train"]
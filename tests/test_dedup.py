@@ -0,0 +1,58 @@
+import time, random
+
+from app.dedup import NearDupIndex, _band_shape
+
+def article(seed, n=300):
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(2000)}" for _ in range(n))
+
+def wire_copy(text):
+    """the same story re-run with a new dateline and a different last line"""
+    words = text.split()
+    return " ".join(["LONDON", "(Reuters)", "-"] + words[:-6] + ["reporting", "by", "staff", "editing", "by", "desk"])
+
+def test_near_duplicate_hits_and_distinct_text_misses():
+    idx = NearDupIndex("t", threshold=0.8)
+    text = article(1)
+    sig, value = idx.lookup(text, model="m")
+    assert value is None and sig is not None
+    idx.add(sig, {"label": "Left"}, model="m")
+
+    _, value = idx.lookup(wire_copy(text), model="m")
+    assert value == {"label": "Left"}
+    _, value = idx.lookup(article(2), model="m")
+    assert value is None
+    st = idx.stats()
+    assert (st["hits"], st["misses"], st["size"]) == (1, 2, 1)
+
+def test_results_are_not_shared_across_settings():
+    idx = NearDupIndex("t", threshold=0.8)
+    text = article(3)
+    sig, _ = idx.lookup(text, model="m1")
+    idx.add(sig, "m1 result", model="m1")
+    assert idx.lookup(text, model="m2")[1] is None
+    assert idx.lookup(text, model="m1")[1] == "m1 result"
+
+def test_entries_expire_after_ttl():
+    idx = NearDupIndex("t", threshold=0.8, ttl_s=0.05)
+    text = article(4)
+    sig, _ = idx.lookup(text)
+    idx.add(sig, "fresh")
+    assert idx.lookup(text)[1] == "fresh"
+    time.sleep(0.08)
+    assert idx.lookup(text)[1] is None
+
+def test_short_texts_are_not_indexed_and_old_entries_are_evicted():
+    idx = NearDupIndex("t", threshold=0.8, max_items=2, min_words=50)
+    assert idx.lookup("a few words only") == (None, None)
+    assert idx.stats()["skipped_short"] == 1
+    for seed in (5, 6, 7):
+        sig, _ = idx.lookup(article(seed))
+        idx.add(sig, seed)
+    assert idx.lookup(article(5))[1] is None and idx.lookup(article(7))[1] == 7
+    assert idx.stats()["evictions"] == 1
+
+def test_band_shape_puts_the_s_curve_below_the_threshold():
+    for threshold in (0.5, 0.8, 0.9):
+        b, r = _band_shape(128, threshold)
+        assert b * r == 128 and (1 / b) ** (1 / r) <= threshold
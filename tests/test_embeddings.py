@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app import embeddings
+from app.embeddings import VectorIndex
+
+def unit(rng, n, dim=16):
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_vector_by_id_with_ids_appended_out_of_order(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    vecs = unit(rng, 6)
+    idx = VectorIndex("m", root=str(tmp_path), dtype=dtype)
+    # two workers committing 10-12 and 13-15 can append in either order
+    idx.append([13, 14, 15], vecs[3:])
+    idx.append([10, 11, 12], vecs[:3])
+    tol = 1e-2 if dtype == "int8" else 1e-3
+    assert np.allclose(idx.vector([12]), vecs[2], atol=tol)
+    assert np.allclose(idx.vector([99, 14, 10]), vecs[4], atol=tol)    # the first id that has a vector
+    assert idx.vector([1, 2, 99]) is None and idx.vector([]) is None
+    # rows appended after the first lookup are found too
+    extra = unit(rng, 2)
+    idx.append([17, 16], extra)
+    assert np.allclose(idx.vector([16]), extra[1], atol=tol)
+    assert np.allclose(idx.vector([11]), vecs[1], atol=tol)
+
+def test_another_process_sees_appended_rows(tmp_path):
+    rng = np.random.default_rng(1)
+    writer, reader = VectorIndex("m", root=str(tmp_path)), VectorIndex("m", root=str(tmp_path))
+    writer.append([1, 2], unit(rng, 2))
+    assert reader.vector([2]) is not None
+    v = unit(rng, 1)
+    writer.append([3], v)
+    assert np.allclose(reader.vector([3]), v[0], atol=1e-3)
+
+def test_exact_search_ranks_by_cosine(tmp_path):
+    rng = np.random.default_rng(2)
+    vecs = unit(rng, 50)
+    idx = VectorIndex("m", root=str(tmp_path))
+    idx.append(list(range(100, 150)), vecs)
+    hits = idx.search(vecs[7], k=3, exact=True)
+    assert hits[0][0] == 107 and hits[0][1] == pytest.approx(1.0, abs=1e-3)
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+    with pytest.raises(ValueError):
+        idx.search(vecs[7], k=3, exact=False)
+
+def test_dimension_change_is_refused(tmp_path):
+    rng = np.random.default_rng(3)
+    VectorIndex("m", root=str(tmp_path)).append([1], unit(rng, 1, dim=16))
+    with pytest.raises(ValueError, match="dim=16"):
+        VectorIndex("m", root=str(tmp_path)).append([2], unit(rng, 1, dim=8))
+
+def test_encode_round_trip():
+    v = np.arange(1, 9, dtype=np.float32)
+    out = embeddings.decode(embeddings.encode(v))
+    assert np.allclose(out, v / np.linalg.norm(v), atol=1e-3)
@@ -0,0 +1,133 @@
+import os, time, asyncio
+
+import pytest
+
+from app import ingest, news_fetch, store
+from conftest import fixture_html
+
+FEEDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "feeds")
+FEED_PATHS = ["/feeds/rss.xml", "/feeds/atom.xml", "/feeds/sitemap_index.xml"]
+ARTICLES = {
+    "/news/budget.html": "medium.html",
+    "/news/transit.html": "long.html",
+    "/news/schools.html": "medium.html",
+    "/news/harbour.html": "long.html",
+    "/news/election.html": "medium.html",
+}
+
+def _feed(name: str, etag: str) -> dict:
+    with open(os.path.join(FEEDS, name), "rb") as f:
+        return {"body": f.read(), "etag": etag, "content_type": "application/xml"}
+
+@pytest.fixture
+def corpus(site, tmp_path, monkeypatch):
+    """fixture feeds and articles on the local server, plus a fresh store and state file"""
+    for name in ("rss.xml", "atom.xml", "sitemap_index.xml", "news_sitemap.xml"):
+        site.pages["/feeds/" + name] = _feed(name, f'"{name}-1"')
+    for path, html in ARTICLES.items():
+        site.pages[path] = {"body": fixture_html(html)}
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_DIR", str(tmp_path / "page_cache"))
+    monkeypatch.setattr(ingest, "INGEST_MAX_AGE_H", 0.0)     # the fixtures are dated 2024
+    monkeypatch.setattr(ingest, "INGEST_BATCH_WAIT_MS", 50.0)
+    monkeypatch.setattr(store, "STORE_ENABLED", True)
+    monkeypatch.setattr(store, "store", store.PredictionStore(str(tmp_path / "predictions.db")))
+    state = ingest.State(str(tmp_path / "ingest.db"))
+    yield site, state
+    state.close()
+
+def poll_once(site, state, **kw):
+    async def go():
+        try:
+            ing = ingest.Ingester([site.url(p) for p in FEED_PATHS], state, interval=0, domain_delay=0.0, **kw)
+            return await ing.run(once=True)
+        finally:
+            await news_fetch.aclose_client()
+    report = asyncio.run(go())
+    store.store.flush()
+    return report
+
+def article_hits(site):
+    return {p: len(site.hits(p)) for p in ARTICLES}
+
+def test_parse_feed_kinds():
+    with open(os.path.join(FEEDS, "rss.xml"), "rb") as f:
+        kind, items, children = ingest.parse_feed(f.read(), "http://x.test/feeds/rss.xml")
+    assert kind == "rss" and not children
+    assert [i["url"] for i in items] == ["http://x.test/news/budget.html", "http://x.test/news/transit.html#comments",
+                                        "http://x.test/news/schools.html", "http://x.test/news/gone.html"]
+    assert items[0]["published"] == 1714557600.0 and items[0]["title"] == "Budget vote"
+    with open(os.path.join(FEEDS, "atom.xml"), "rb") as f:
+        _, items, _ = ingest.parse_feed(f.read(), "http://x.test/feeds/atom.xml")
+    assert items[1]["url"] == "http://x.test/news/harbour.html"
+    with open(os.path.join(FEEDS, "sitemap_index.xml"), "rb") as f:
+        kind, items, children = ingest.parse_feed(f.read(), "http://x.test/feeds/sitemap_index.xml")
+    assert kind == "sitemapindex" and not items
+    assert children[0]["url"] == "http://x.test/feeds/news_sitemap.xml"
+    with open(os.path.join(FEEDS, "news_sitemap.xml"), "rb") as f:
+        _, items, _ = ingest.parse_feed(f.read(), "http://x.test/feeds/news_sitemap.xml")
+    assert items[0]["title"] == "Election results" and items[0]["published"] == 1714546800.0
+
+def test_discovers_scores_and_stores_every_article(corpus):
+    site, state = corpus
+    report = poll_once(site, state)
+    # budget is in the RSS and Atom feeds, transit in the RSS feed (with a fragment) and the sitemap
+    assert report["queued"] == 6
+    assert report["scored"] == 5 and report["extract_error"] == 1
+    assert article_hits(site) == {p: 1 for p in ARTICLES}
+    assert site.hits("/feeds/news_sitemap.xml")
+
+    rows = store.store.query(limit=50)["items"]
+    assert {r["url"] for r in rows} == {site.url(p) for p in ARTICLES}
+    assert {r["endpoint"] for r in rows} == {"ingest"}
+    assert all(r["label"] in ("Left", "Center", "Right") and r["source"] for r in rows)
+    assert state.counts() == {"done": 5, "error": 1}
+
+def test_unchanged_feeds_are_revalidated_not_refetched(corpus):
+    site, state = corpus
+    poll_once(site, state)
+    before = len(site.requests)
+    report = poll_once(site, state)
+    again = site.requests[before:]
+    feed_requests = [r for r in again if r[0].startswith("/feeds/")]
+    # every feed, the sitemap behind the unchanged index included, is asked with its ETag and answers 304
+    assert sorted(r[0] for r in feed_requests) == sorted(FEED_PATHS + ["/feeds/news_sitemap.xml"])
+    assert all(r[2] == 304 and r[1].get("If-None-Match") for r in feed_requests)
+    assert report.get("feed_not_modified") == 4 and not report.get("scored")
+    assert article_hits(site) == {p: 1 for p in ARTICLES}
+
+def test_changed_feed_only_queues_new_items(corpus):
+    site, state = corpus
+    poll_once(site, state)
+    site.pages["/news/port.html"] = {"body": fixture_html("medium.html")}
+    rss = site.pages["/feeds/rss.xml"]
+    site.pages["/feeds/rss.xml"] = dict(rss, etag='"rss.xml-2"', body=rss["body"].replace(
+        b"<item>", b"<item><title>Port</title><link>/news/port.html</link></item>\n    <item>", 1))
+    report = poll_once(site, state)
+    assert report["scored"] == 1
+    assert len(site.hits("/news/port.html")) == 1
+    assert article_hits(site) == {p: 1 for p in ARTICLES}
+    assert len(store.store.query(limit=50)["items"]) == 6
+
+def test_failed_urls_are_retried_up_to_the_limit(corpus, monkeypatch):
+    site, state = corpus
+    monkeypatch.setattr(ingest, "INGEST_MAX_ATTEMPTS", 2)
+    for _ in range(3):
+        poll_once(site, state)
+    assert len(site.hits("/news/gone.html")) == 2
+
+def test_frontier_spaces_requests_per_host_without_blocking_others():
+    async def go():
+        f = ingest.Frontier(delay=0.2, maxsize=10)
+        for i in range(3):
+            await f.put((f"http://a.test/{i}", "feed", None))
+        await f.put(("http://b.test/0", "feed", None))
+        t0, got = time.monotonic(), []
+        for _ in range(4):
+            url, _, _ = await f.get()
+            got.append((url, time.monotonic() - t0))
+        return got
+
+    got = asyncio.run(go())
+    assert [u for u, _ in got] == ["http://a.test/0", "http://b.test/0", "http://a.test/1", "http://a.test/2"]
+    assert got[1][1] < 0.1                      # the other host doesn't wait behind a.test
+    assert 0.18 < got[2][1] and 0.38 < got[3][1]
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from app.lexicon import Lexicon, load_entries
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRIES = load_entries(os.path.join(ROOT, "data", "lexicon.csv"))
+SCORES = {term: score for term, score, _ in ENTRIES}
+
+@pytest.fixture(scope="module")
+def lex():
+    return Lexicon(ENTRIES)
+
+def spans(lex, text):
+    return [(m["text"], m["score"]) for m in lex.find(text)]
+
+def test_the_shipped_lexicon_loads():
+    assert len(ENTRIES) == 28 and SCORES["witch hunt"] == 0.65
+    assert not any(term.startswith("#") for term in SCORES)
+
+def test_longest_phrase_wins_and_scores_come_from_the_csv(lex):
+    text = "A tax-and-spend plan on taxation, not a tax, drew a Right  Wing witch hunt."
+    assert spans(lex, text) == [
+        ("tax-and-spend", SCORES["tax-and-spend"]),
+        ("taxation", SCORES["taxation"]),
+        ("tax", SCORES["tax"]),
+        ("Right  Wing", SCORES["right wing"]),
+        ("witch hunt", SCORES["witch hunt"]),
+    ]
+
+def test_only_whole_words_match(lex):
+    assert spans(lex, "taxis flooded the liberalized surges") == []
+    m = lex.find("Open borders!")[0]
+    assert (m["start"], m["end"], m["score"]) == (0, 12, SCORES["open borders"])
+
+def test_wildcards_match_one_word(lex):
+    assert spans(lex, "the war on drugs and the war on 2020") == [("war on drugs", SCORES["war on *"])]
+
+def test_case_sensitive_terms_and_k():
+    lex = Lexicon([("GOP", 0.3, True), ("gop", 0.9, False), ("climate change", 0.4, False), ("climate", 0.1, False)])
+    assert [(m["text"], m["score"]) for m in lex.find("GOP, Gop and climate change")] == [
+        ("GOP", 0.3), ("Gop", 0.9), ("climate change", 0.4)]
+    assert len(lex.find("climate climate climate", k=2)) == 2
@@ -0,0 +1,127 @@
+import os, time, asyncio
+
+import httpx
+import pytest
+
+from app import news_fetch, admission
+from conftest import fixture_html
+
+@pytest.fixture(autouse=True)
+def page_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_DIR", str(tmp_path / "page_cache"))
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_FRESH_S", 0.0)
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_PRUNE_S", 1e9)
+    return tmp_path / "page_cache"
+
+def run(coro):
+    async def go():
+        try:
+            return await coro
+        finally:
+            await news_fetch.aclose_client()
+    return asyncio.run(go())
+
+def test_etag_revalidation_returns_cached_page(site):
+    site.pages["/a"] = {"body": b"<html>v1</html>", "etag": '"v1"'}
+    html, _, changed = run(news_fetch._fetch(site.url("/a")))
+    assert (html, changed) == ("<html>v1</html>", True)
+    html, entry, changed = run(news_fetch._fetch(site.url("/a")))
+    assert (html, changed) == ("<html>v1</html>", False)
+    assert entry["etag"] == '"v1"'
+    first, second = site.hits("/a")
+    assert "If-None-Match" not in first[1] and first[2] == 200
+    assert second[1]["If-None-Match"] == '"v1"' and second[2] == 304
+
+def test_last_modified_revalidation_and_change(site):
+    lm = "Wed, 01 May 2024 10:00:00 GMT"
+    site.pages["/b"] = {"body": b"old", "last_modified": lm}
+    run(news_fetch._fetch(site.url("/b")))
+    _, _, changed = run(news_fetch._fetch(site.url("/b")))
+    assert not changed and site.hits("/b")[-1][1]["If-Modified-Since"] == lm
+    site.pages["/b"] = {"body": b"new", "last_modified": "Thu, 02 May 2024 10:00:00 GMT"}
+    html, _, changed = run(news_fetch._fetch(site.url("/b")))
+    assert (html, changed) == ("new", True)
+
+def test_fresh_entry_skips_the_network(site, monkeypatch):
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_FRESH_S", 300.0)
+    site.pages["/c"] = {"body": b"page", "etag": '"c"'}
+    run(news_fetch._fetch(site.url("/c")))
+    html, _, changed = run(news_fetch._fetch(site.url("/c")))
+    assert (html, changed) == ("page", False)
+    assert len(site.hits("/c")) == 1
+
+def test_timeout_raises(site):
+    site.pages["/slow"] = {"body": b"late", "delay": 1.0}
+    with pytest.raises(httpx.TimeoutException):
+        run(news_fetch._fetch(site.url("/slow"), timeout=0.2))
+
+def test_request_deadline_caps_the_fetch(site):
+    site.pages["/slow"] = {"body": b"late", "delay": 1.0}
+
+    async def go():
+        token = admission.set_deadline(time.monotonic() + 0.2)
+        try:
+            return await news_fetch._fetch(site.url("/slow"), timeout=30)
+        finally:
+            admission.reset_deadline(token)
+
+    t0 = time.monotonic()
+    with pytest.raises(admission.DeadlineExceeded):
+        run(go())
+    assert time.monotonic() - t0 < 0.9
+
+def test_http_error_raises_and_is_not_cached(site, page_cache):
+    with pytest.raises(httpx.HTTPStatusError):
+        run(news_fetch._fetch(site.url("/missing")))
+    assert not page_cache.exists() or not any(page_cache.rglob("*.json"))
+
+def test_extract_article_reuses_extraction_of_unchanged_page(site, monkeypatch):
+    site.pages["/article"] = {"body": fixture_html("medium.html"), "etag": '"m"'}
+    calls = []
+    real = news_fetch.extract_from_html
+
+    def counting(url, html):
+        calls.append(url)
+        return real(url, html)
+
+    monkeypatch.setattr(news_fetch, "extract_from_html", counting)
+    art = run(news_fetch.extract_article(site.url("/article")))
+    assert art["url"] == site.url("/article")
+    assert len(art["text"]) > 200 and art["title"]
+    again = run(news_fetch.extract_article(site.url("/article")))
+    assert again == art
+    assert len(calls) == 1 and site.hits("/article")[-1][2] == 304
+
+def _entry(root, name: str, size: int, age_s: float) -> str:
+    p = root / name[:2] / f"{name}.json"
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(b"x" * size)
+    t = time.time() - age_s
+    os.utime(p, (t, t))
+    return str(p)
+
+def test_prune_drops_old_entries_then_oldest_over_size(page_cache, monkeypatch):
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_MAX_AGE_S", 3600.0)
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_MAX_MB", 2 / 1024)   # 2 KiB
+    expired = _entry(page_cache, "aa01", 100, 7200)
+    oldest = _entry(page_cache, "bb01", 1024, 300)
+    older = _entry(page_cache, "bb02", 1024, 200)
+    newer = _entry(page_cache, "cc01", 1024, 100)
+    newest = _entry(page_cache, "cc02", 512, 10)
+    out = news_fetch.prune_cache()
+    assert not os.path.exists(expired)
+    # 3.5 KiB left after the age pass; the oldest go until it is under 90% of 2 KiB
+    assert not os.path.exists(oldest) and not os.path.exists(older)
+    assert os.path.exists(newer) and os.path.exists(newest)
+    assert out == {"files": 2, "bytes": 1536, "removed": 3}
+
+def test_expired_entry_is_refetched(site, monkeypatch, page_cache):
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_FRESH_S", 300.0)
+    monkeypatch.setattr(news_fetch, "FETCH_CACHE_MAX_AGE_S", 3600.0)
+    site.pages["/d"] = {"body": b"page"}
+    run(news_fetch._fetch(site.url("/d")))
+    for p in page_cache.rglob("*.json"):
+        t = time.time() - 7200
+        os.utime(p, (t, t))
+    run(news_fetch._fetch(site.url("/d")))
+    assert len(site.hits("/d")) == 2
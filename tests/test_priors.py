@@ -0,0 +1,76 @@
+import csv, json
+
+import pytest
+
+from app import priors
+
+ROWS = [
+    ("CNN", "", "Left"),
+    ("The New York Times", "", "Lean Left"),
+    ("Associated Press", "apnews.com", "Center"),
+    ("The Washington Post", "", "Lean Left"),
+    ("Fox News", "", "Right"),
+]
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["source_name", "domain", "allsides_bias"])
+        w.writerows(rows)
+
+@pytest.fixture
+def priors_csv(tmp_path, monkeypatch):
+    path = tmp_path / "priors.csv"
+    write_csv(path, ROWS)
+    monkeypatch.setattr(priors, "ALLSIDES_PRIORS_PATH", str(path))
+    monkeypatch.setattr(priors, "PRIORS_INDEX_PATH", str(path) + ".index.json")
+    monkeypatch.setattr(priors, "PRIORS_RELOAD_CHECK_S", 0.0)
+    monkeypatch.setattr(priors, "_index", None)
+    monkeypatch.setattr(priors, "_failed_sig", None)
+    return path
+
+def match(s):
+    hit = priors.get_prior_for_source(s)
+    return hit and (hit["source"], hit["match"])
+
+@pytest.mark.parametrize("query,expected", [
+    ("https://apnews.com/article/x", ("Associated Press", "domain")),
+    ("edition.cnn.com", ("CNN", "domain")),
+    ("cnn.co.uk", ("CNN", "domain_name")),
+    ("foxnews.com", ("Fox News", "domain")),
+    ("https://www.washingtonpost.com/politics", ("The Washington Post", "domain_name")),
+    ("the new york times", ("The New York Times", "name")),
+    ("NYT", ("The New York Times", "alias")),
+    ("Asociated Press", ("Associated Press", "fuzzy")),
+    ("Washingtn Post", ("The Washington Post", "fuzzy")),
+    ("Breitbart", None),
+])
+def test_lookup(priors_csv, query, expected):
+    assert match(query) == expected
+
+@pytest.mark.parametrize("host", ["wp.pl", "nyt.example.org", "fn.com"])
+def test_short_host_labels_do_not_match_acronyms(priors_csv, host):
+    assert match(host) is None
+
+def test_edited_csv_is_picked_up_and_cached(priors_csv, monkeypatch):
+    assert priors.get_prior_for_source("CNN")["rating"] == "Left"
+    with open(priors.PRIORS_INDEX_PATH, encoding="utf-8") as f:
+        assert len(json.load(f)["records"]) == len(ROWS)
+
+    write_csv(priors_csv, [("CNN", "", "Lean Left"), ("Reuters", "reuters.com", "Center")])
+    assert priors.get_prior_for_source("CNN")["rating"] == "Lean Left"
+    assert match("reuters.com") == ("Reuters", "domain")
+    assert match("Fox News") is None
+
+    # a later process with the same CSV loads the compiled index instead of parsing
+    monkeypatch.setattr(priors, "_index", None)
+    monkeypatch.setattr(priors, "_read_records", lambda path: pytest.fail("CSV parsed again"))
+    loaded = priors.get_index()
+    assert loaded.sig == priors._csv_sig(str(priors_csv)) and len(loaded.records) == 2
+
+def test_unparseable_csv_keeps_the_previous_index(priors_csv, monkeypatch):
+    assert match("CNN") == ("CNN", "name")
+    write_csv(priors_csv, ROWS + [("Reuters", "", "Center")])
+    monkeypatch.setattr(priors, "_read_records", lambda path: 1 / 0)
+    assert match("CNN") == ("CNN", "name")
+    assert priors._failed_sig == priors._csv_sig(str(priors_csv))
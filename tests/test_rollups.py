@@ -0,0 +1,90 @@
+import pytest
+
+from app import rollups, store as store_mod
+from app.store import PredictionStore, _connect
+
+DAY = 86400
+T0 = 1717200000.0   # 2024-06-01T00:00:00Z
+
+def prior(source):
+    return {"rating": "Left", "source": "A News"} if source == "a.test" else None
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """a store with duplicates, two models and three daily buckets; the clock is fixed per row"""
+    clock = {"t": T0}
+    monkeypatch.setattr(store_mod.time, "time", lambda: clock["t"])
+    s = PredictionStore(str(tmp_path / "predictions.db"), flush_ms=20)
+
+    def add(day, text, source, model, label, probs):
+        clock["t"] = T0 + day * DAY + 60
+        s.record(endpoint="/predict", text=text, model=model, source=source,
+                 res={"label": label, "confidence": max(probs.values()), "probs": probs})
+
+    add(0, "one", "a.test", "m1", "Left", {"Left": 0.7, "Center": 0.2, "Right": 0.1})
+    add(0, "one ", "a.test", "m1", "Right", {"Left": 0.1, "Center": 0.2, "Right": 0.7})   # same text again
+    add(1, "two", "a.test", "m1", "Center", {"Left": 0.2, "Center": 0.6, "Right": 0.2})
+    add(1, "one", "a.test", "m2", "Right", {"Left": 0.1, "Center": 0.2, "Right": 0.7})
+    add(1, "one", "b.test", "m1", "Left", {"Left": 0.9, "Center": 0.05, "Right": 0.05})
+    add(1, "no source", None, "m1", "Left", {"Left": 0.9, "Center": 0.05, "Right": 0.05})
+    assert s.flush()
+    add(2, "two", "a.test", "m1", "Right", {"Left": 0.1, "Center": 0.1, "Right": 0.8})    # repeat, later batch
+    add(2, "three", "a.test", "m1", "Right", {"Left": 0.1, "Center": 0.1, "Right": 0.8})
+    assert s.flush()
+    clock["t"] = T0 + 2 * DAY + 120
+    yield s
+    s.close()
+
+def snapshot(s):
+    return (s.sources(prior, model="m1"), s.sources(prior, model="m2"),
+            s.source("a.test", prior, model="m1"), s.source("b.test", prior, model="m1"))
+
+def test_sums_count_each_text_once_per_source_and_model(corpus):
+    by_source = {r["source"]: r for r in corpus.sources(prior, model="m1")}
+    a = by_source["a.test"]
+    assert a["n"] == 3 and a["label_counts"] == {"Left": 1, "Center": 1, "Right": 1}
+    assert a["mean_probs"] == {"Left": 0.3333, "Center": 0.3, "Right": 0.3667}
+    assert a["position"] == 0.0333
+    assert a["prior"]["label"] == "Left" and a["disagreement"] == 0.6667 and a["drift"] == 1.0333
+    assert by_source["b.test"]["n"] == 1 and by_source["b.test"]["prior"] is None
+    assert [r["n"] for r in corpus.sources(prior, model="m2")] == [1]
+
+    detail = corpus.source("a.test", prior, model="m1")
+    assert [(b["bucket"], b["n"]) for b in detail["buckets"]] == [(T0, 1), (T0 + DAY, 1), (T0 + 2 * DAY, 1)]
+    assert corpus.source("a.test", prior, model="m3") is None
+
+def test_incremental_rollups_match_a_rebuild(corpus):
+    before = snapshot(corpus)
+    db = _connect(corpus.path)
+    assert rollups.rebuild(db) == 5
+    db.close()
+    assert snapshot(corpus) == before
+
+def test_rollups_from_before_per_model_keys_are_rebuilt(corpus):
+    before = snapshot(corpus)
+    db = _connect(corpus.path)
+    db.execute("DROP TABLE source_rollup")
+    db.execute("CREATE TABLE source_rollup (source TEXT NOT NULL, bucket INTEGER NOT NULL, label TEXT NOT NULL,"
+               " hits INTEGER NOT NULL, p_sum REAL NOT NULL, p_sumsq REAL NOT NULL,"
+               " first_seen REAL NOT NULL, last_seen REAL NOT NULL, PRIMARY KEY (source, bucket, label))")
+    db.execute("INSERT INTO source_rollup VALUES ('a.test', 0, 'Left', 99, 99.0, 99.0, 0, 0)")
+    rollups.ensure_schema(db)
+    assert "model" in {r[1] for r in db.execute("PRAGMA table_info(source_rollup)")}
+    db.close()
+    assert snapshot(corpus) == before
+
+def test_prune_drops_old_buckets_but_keeps_all_time(corpus, monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUP_KEEP_BUCKETS", 1)
+    db = _connect(corpus.path)
+    assert rollups.prune(db, now=T0 + 2 * DAY) > 0
+    db.close()
+    detail = corpus.source("a.test", prior, model="m1")
+    assert [b["bucket"] for b in detail["buckets"]] == [T0 + DAY, T0 + 2 * DAY]
+    assert detail["n"] == 3
+
+@pytest.mark.parametrize("rating,expected", [
+    ("Left", ("Left", -1.0)), ("Lean Right", ("Right", 0.5)), ("Center", ("Center", 0.0)),
+    ("Mixed", (None, None)), (None, (None, None)),
+])
+def test_prior_position(rating, expected):
+    assert rollups.prior_position(rating) == expected
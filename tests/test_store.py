@@ -0,0 +1,90 @@
+import time, sqlite3
+
+import pytest
+
+from app import store as store_mod
+from app.store import PredictionStore, content_hash
+
+def res(label="Left", conf=0.8):
+    return {"label": label, "confidence": conf, "probs": {label: conf}, "rationale_spans": []}
+
+@pytest.fixture
+def db(tmp_path):
+    s = PredictionStore(str(tmp_path / "predictions.db"), flush_ms=5)
+    yield s
+    s.close()
+
+def test_rows_are_written_and_found_by_each_key(db):
+    db.record(endpoint="/predict", text="Budget  vote\ntoday", res=res("Left"), model="m1",
+              url="http://a.test/1", source="A.test", title="Budget")
+    db.record(endpoint="/predict", text="Transit plan", res=res("Right"), model="m2", url="http://b.test/2")
+    db.record(endpoint="/batch_predict", text="Budget vote today", res=res("Center"), model="m1", source="a.test")
+    assert db.flush()
+
+    assert [r["endpoint"] for r in db.query(url="http://a.test/1")["items"]] == ["/predict"]
+    # the hash is of the normalized text, so the reformatted copy matches too
+    assert len(db.query(content_hash=content_hash("Budget vote today"))["items"]) == 2
+    assert len(db.query(source="A.TEST")["items"]) == 2
+    assert [r["label"] for r in db.query(label="Right")["items"]] == ["Right"]
+    assert [r["label"] for r in db.query(model="m1")["items"]] == ["Center", "Left"]
+
+    row = db.query(url="http://a.test/1")["items"][0]
+    assert row["source"] == "a.test" and row["probs"] == {"Left": 0.8} and row["chunked"] is False
+    assert db.get(row["id"])["title"] == "Budget"
+    assert set(db.get_many([row["id"], 999])) == {row["id"]}
+    st = db.stats()
+    assert (st["rows"], st["written"], st["dropped"]) == (3, 3, 0)
+
+def test_keyset_paging_walks_ties_on_created(db, monkeypatch):
+    monkeypatch.setattr(store_mod.time, "time", lambda: 1000.0)
+    for i in range(7):
+        db.record(endpoint="/predict", text=f"story {i}", res=res(), model="m")
+    assert db.flush()
+    seen, cursor = [], None
+    while True:
+        page = db.query(limit=3, cursor=cursor)
+        seen += [r["id"] for r in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == sorted(seen, reverse=True) and len(set(seen)) == 7
+    with pytest.raises(ValueError):
+        db.query(cursor="nonsense")
+
+def test_full_queue_drops_rows_without_blocking(tmp_path):
+    s = PredictionStore(str(tmp_path / "p.db"), batch_size=1, flush_ms=0, queue_max=1)
+    s._ensure_started()
+    with s._lock:
+        # the writer takes one row and then waits on the schema lock; the queue holds one more
+        s.record(endpoint="/predict", text="story 0", res=res(), model="m")
+        while s._q.qsize():
+            time.sleep(0.01)
+        for i in range(1, 5):
+            s.record(endpoint="/predict", text=f"story {i}", res=res(), model="m")
+    assert s.flush()
+    st = s.stats()
+    assert (st["written"], st["dropped"], st["rows"]) == (2, 3, 2)
+    s.close()
+
+def test_row_count_is_kept_by_the_writer_and_seeded_for_old_stores(db):
+    for i in range(3):
+        db.record(endpoint="/predict", text=f"story {i}", res=res(), model="m")
+    assert db.flush()
+    conn = sqlite3.connect(db.path)
+    conn.execute("DROP TABLE store_meta")     # a store from before the counter
+    conn.commit()
+    conn.close()
+    again = PredictionStore(db.path, flush_ms=5)
+    assert again.stats()["rows"] == 3
+    again.record(endpoint="/predict", text="story 3", res=res(), model="m")
+    assert again.flush() and again.stats()["rows"] == 4
+    again.close()
+
+@pytest.mark.parametrize("col", ["url", "content_hash", "source", "label", "model"])
+def test_every_filter_uses_an_index(db, col):
+    db.record(endpoint="/predict", text="story", res=res(), model="m")
+    assert db.flush()
+    plan = db._reader().execute(
+        f"EXPLAIN QUERY PLAN SELECT * FROM predictions WHERE {col} = ? ORDER BY created DESC, id DESC LIMIT 5",
+        ("x",)).fetchall()
+    assert any(f"predictions_{col.split('_')[-1]}" in row[-1] for row in plan)
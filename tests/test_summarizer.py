@@ -0,0 +1,100 @@
+import time, asyncio
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from app import summarizer, admission
+from bench.mock_openai import MockOpenAI
+
+ARTICLE = "The council approved the budget on Monday. Critics said it cut too deep. Supporters disagreed."
+
+@pytest.fixture
+def llm(monkeypatch):
+    """summarizer pointed at an in-process mock; yields a factory taking the mock's options"""
+    mocks = []
+
+    def start(delay_ms: float = 0.0, status: int = 200, timeout_s: float = 5.0, concurrency: int = 8) -> MockOpenAI:
+        mock = MockOpenAI(delay_ms=delay_ms, status=status).__enter__()
+        mocks.append(mock)
+        monkeypatch.setattr(summarizer, "USE_LLM", True)
+        monkeypatch.setattr(summarizer, "OPENAI_API_KEY", "test")
+        monkeypatch.setattr(summarizer, "OPENAI_BASE_URL", mock.base_url)
+        monkeypatch.setattr(summarizer, "AsyncOpenAI", openai.AsyncOpenAI)
+        monkeypatch.setattr(summarizer, "SUMMARY_TIMEOUT_S", timeout_s)
+        monkeypatch.setattr(summarizer, "SUMMARY_CONCURRENCY", concurrency)
+        return mock
+
+    yield start
+    for mock in mocks:
+        mock.__exit__(None, None, None)
+
+def run(coro):
+    async def go():
+        try:
+            return await coro
+        finally:
+            await summarizer.aclose_client()
+    return asyncio.run(go())
+
+def test_summary_comes_from_the_endpoint(llm):
+    mock = llm()
+    out = run(summarizer.asummarize(ARTICLE))
+    assert out == {"text": "The council approved the budget on Monday."}
+    assert mock.calls == 1
+
+def test_timeout_returns_flagged_fallback(llm):
+    llm(delay_ms=1000)
+    t0 = time.monotonic()
+    out = run(summarizer.asummarize(ARTICLE, timeout=0.2))
+    assert out["fallback"] is True
+    assert out["text"].startswith("The council approved the budget")
+    assert time.monotonic() - t0 < 0.9
+
+def test_request_deadline_clamps_the_call(llm):
+    llm(delay_ms=1000, timeout_s=30)
+
+    async def go():
+        token = admission.set_deadline(time.monotonic() + 0.2)
+        try:
+            return await summarizer.asummarize(ARTICLE)
+        finally:
+            admission.reset_deadline(token)
+
+    t0 = time.monotonic()
+    out = run(go())
+    assert out["fallback"] is True
+    assert time.monotonic() - t0 < 0.9
+
+def test_endpoint_error_returns_flagged_fallback(llm):
+    mock = llm(status=500)
+    out = run(summarizer.asummarize(ARTICLE))
+    assert out["fallback"] is True and out["text"]
+    assert mock.calls == 1   # max_retries=0: the fallback is the retry
+
+def test_concurrent_calls_are_capped(llm):
+    mock = llm(delay_ms=200, concurrency=2)
+
+    async def go():
+        return await asyncio.gather(*(summarizer.asummarize(f"Story {i}. More.") for i in range(6)))
+
+    outs = run(go())
+    assert [o.get("fallback") for o in outs] == [None] * 6
+    assert mock.calls == 6 and mock.max_inflight == 2
+
+def test_client_is_reused_within_a_loop(llm):
+    llm()
+
+    async def go():
+        await summarizer.asummarize(ARTICLE)
+        first = summarizer.get_async_client()
+        await summarizer.asummarize(ARTICLE)
+        return first, summarizer.get_async_client()
+
+    first, second = asyncio.run(go())
+    assert first is second
+    # a new event loop gets its own client (connection pools belong to one loop)
+    assert run(_client_now()) is not first
+
+async def _client_now():
+    return summarizer.get_async_client()
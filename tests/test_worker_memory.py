@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from bench import worker_memory
+from bench.tiny_model import build
+
+pytestmark = pytest.mark.skipif(not os.path.exists("/proc/self/smaps_rollup"),
+                                reason="needs Linux /proc/<pid>/smaps_rollup")
+
+def test_workers_share_one_copy_of_the_weights(tmp_path):
+    # ~40 MB of weights, so the mapped file stands out from the rest of the process
+    model = build(str(tmp_path / "model"), hidden=384, layers=6, heads=6)
+    report = worker_memory.run_mode(True, model, workers=2, requests=4, timeout_s=240)
+
+    weights_mb = os.path.getsize(next((tmp_path / "model" / "mmap").glob("weights-*.pt"))) / 2 ** 20
+    assert len(report["workers"]) == 2
+    for w in report["workers"]:
+        # each worker has the weights resident, nearly all of them as pages shared with the other
+        assert w["weights_rss"] > 0.5 * weights_mb
+        assert w["weights_private"] <= 0.1 * w["weights_rss"], w
+        # so they only count half towards each worker's proportional share
+        assert w["weights_pss"] < 0.6 * w["weights_rss"], w